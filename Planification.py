@@ -2,18 +2,25 @@ import streamlit as st
 from dateutil.relativedelta import relativedelta as rd
 from datetime import date
 
+from model.leave import LeaveCalendar
+from model.scenarios import run_scenarios
 from model.scheduler import ScheduleAllocator
+from utils.generation import GenerationCancelled, start_generation
+from utils.profiling import finish_rerun_profile, profile_section, start_rerun_profile
+from utils.storage.result_cache import ResultCache
 from utils.storage.storage import ScheduleStorage
 from utils.storage.github_sync import GitHubSync
 
-from utils.create_calendar import create_calendar_editor, create_visual_calendar, get_start_date, \
+from utils.create_calendar import create_calendar_editor, render_visual_calendar, get_start_date, \
     create_date_dropdown_list
+from utils.schedule_views import ScheduleViews
 from utils.tools import (
     load_config, get_working_days,
-    schedule_to_dataframe, daterange, schedule_summary
+    schedule_to_dataframe
 )
 import copy
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 
 
 # Stockage init
@@ -22,7 +29,32 @@ def get_storage():
     return ScheduleStorage()
 
 
+@st.cache_resource
+def get_result_cache():
+    return ResultCache()
+
+
+# Shared by every session of the server: generations run outside the script threads
+@st.cache_resource
+def get_generation_executor():
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="generation")
+
+
+# Per quarter: the working days are computed once, for the pre-check and every generation
+@st.cache_data
+def working_days_of(start_date, end_date):
+    return get_working_days(start_date, end_date)
+
+
+@st.cache_data
+def feasibility_warnings(config, start_date, end_date):
+    """Messages of the max-flow pre-check of the quotas, none when they can all be placed"""
+    working_days, _ = working_days_of(start_date, end_date)
+    return ScheduleAllocator(config, working_days).check_feasibility().warnings()
+
+
 storage = get_storage()
+result_cache = get_result_cache()
 
 st.set_page_config(
     page_title="Planning Radiologues",
@@ -30,12 +62,20 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# No-op unless AGENDA_PROFILE or ?profile=1 is set, see utils/profiling.py
+start_rerun_profile("planification")
+
 # Init session_state
 for k, v in {
     "df_schedule": None,
     "df_schedule_simple": None,
     "generated_for": None,
     "holidays_config": {},
+    "generation_job": None,
+    "generation_summary": None,
+    "scenario_results": None,
+    "schedule_views": None,
+    "feasibility_warnings": [],
 }.items():
     st.session_state.setdefault(k, v)
 
@@ -45,6 +85,9 @@ def reset_planning():
     st.session_state.df_schedule_simple = None
     st.session_state.generated_for = None
     st.session_state.holidays_config = {}
+    st.session_state.generation_summary = None
+    st.session_state.schedule_views = None
+    st.session_state.feasibility_warnings = []
 
 
 st.title("Planning radiologues")
@@ -86,121 +129,222 @@ with st.expander("Ajouter des congés (plages ou dates)", expanded=False):
                     'manual_days': ""
                 }
 
-    for place_key, place_cfg in config.items():
-        if place_cfg.get("advanced_split"):
-            st.markdown(f"**{place_cfg['name']}**")
-
-            place_cfg['holidays'] = []
-
-            col1, col2 = st.columns(2)
-            with col1:
-                start_vac1 = st.date_input(
-                    f"Début congé",
-                    value=st.session_state.holidays_config[place_key]['start_vac1'],
-                    min_value=default_start_date,
-                    max_value=end_date,
-                    key=f"start_{place_key}_1"
-                )
-                start_vac2 = st.date_input(
-                    f"Début congé",
-                    value=st.session_state.holidays_config[place_key]['start_vac2'],
-                    min_value=default_start_date,
-                    max_value=end_date,
-                    key=f"start_{place_key}_2"
-                )
-                start_vac3 = st.date_input(
-                    f"Début congé",
-                    value=st.session_state.holidays_config[place_key]['start_vac3'],
-                    min_value=default_start_date,
-                    max_value=end_date,
-                    key=f"start_{place_key}_3"
-                )
-            with col2:
-                end_vac1 = st.date_input(
-                    f"Fin congé",
-                    value=st.session_state.holidays_config[place_key]['end_vac1'],
-                    min_value=start_vac1 if start_vac1 else default_start_date,
-                    max_value=end_date,
-                    key=f"end_{place_key}_1"
-                )
-                end_vac2 = st.date_input(
-                    f"Fin congé",
-                    value=st.session_state.holidays_config[place_key]['end_vac2'],
-                    min_value=start_vac2 if start_vac2 else default_start_date,
-                    max_value=end_date,
-                    key=f"end_{place_key}_2"
-                )
-                end_vac3 = st.date_input(
-                    f"Fin congé",
-                    value=st.session_state.holidays_config[place_key]['end_vac3'],
-                    min_value=start_vac3 if start_vac3 else default_start_date,
-                    max_value=end_date,
-                    key=f"end_{place_key}_3"
+    # A form batches the edits: the page reruns once on "Appliquer", not on every date picked.
+    # Until then the widgets return the last applied values, so the config below stays consistent
+    with st.form("holidays_form", border=False):
+        for place_key, place_cfg in config.items():
+            if place_cfg.get("advanced_split"):
+                st.markdown(f"**{place_cfg['name']}**")
+
+                place_cfg['holidays'] = []
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    start_vac1 = st.date_input(
+                        f"Début congé",
+                        value=st.session_state.holidays_config[place_key]['start_vac1'],
+                        min_value=default_start_date,
+                        max_value=end_date,
+                        key=f"start_{place_key}_1"
+                    )
+                    start_vac2 = st.date_input(
+                        f"Début congé",
+                        value=st.session_state.holidays_config[place_key]['start_vac2'],
+                        min_value=default_start_date,
+                        max_value=end_date,
+                        key=f"start_{place_key}_2"
+                    )
+                    start_vac3 = st.date_input(
+                        f"Début congé",
+                        value=st.session_state.holidays_config[place_key]['start_vac3'],
+                        min_value=default_start_date,
+                        max_value=end_date,
+                        key=f"start_{place_key}_3"
+                    )
+                with col2:
+                    end_vac1 = st.date_input(
+                        f"Fin congé",
+                        value=st.session_state.holidays_config[place_key]['end_vac1'],
+                        min_value=default_start_date,
+                        max_value=end_date,
+                        key=f"end_{place_key}_1"
+                    )
+                    end_vac2 = st.date_input(
+                        f"Fin congé",
+                        value=st.session_state.holidays_config[place_key]['end_vac2'],
+                        min_value=default_start_date,
+                        max_value=end_date,
+                        key=f"end_{place_key}_2"
+                    )
+                    end_vac3 = st.date_input(
+                        f"Fin congé",
+                        value=st.session_state.holidays_config[place_key]['end_vac3'],
+                        min_value=default_start_date,
+                        max_value=end_date,
+                        key=f"end_{place_key}_3"
+                    )
+
+                # Update session state
+                st.session_state.holidays_config[place_key]['start_vac1'] = start_vac1
+                st.session_state.holidays_config[place_key]['end_vac1'] = end_vac1
+                st.session_state.holidays_config[place_key]['start_vac2'] = start_vac2
+                st.session_state.holidays_config[place_key]['end_vac2'] = end_vac2
+                st.session_state.holidays_config[place_key]['start_vac3'] = start_vac3
+                st.session_state.holidays_config[place_key]['end_vac3'] = end_vac3
+
+                # Process date ranges, kept as intervals
+                holidays_list = []
+                for start_vac, end_vac in zip([start_vac1, start_vac2, start_vac3], [end_vac1, end_vac2, end_vac3]):
+                    if start_vac and end_vac:
+                        if end_vac < start_vac:
+                            st.warning(f"{place_cfg['name']} : congé du {start_vac.strftime('%d/%m/%Y')} "
+                                       f"ignoré, la fin est avant le début")
+                            continue
+                        holidays_list.append((start_vac, end_vac))
+
+                manual_days = st.text_input(
+                    f"Autres jours (AAAA-MM-JJ séparés par ,)",
+                    value=st.session_state.holidays_config[place_key]['manual_days'],
+                    key=f"manual_days_{place_key}"
                 )
 
-            # Update session state
-            st.session_state.holidays_config[place_key]['start_vac1'] = start_vac1
-            st.session_state.holidays_config[place_key]['end_vac1'] = end_vac1
-            st.session_state.holidays_config[place_key]['start_vac2'] = start_vac2
-            st.session_state.holidays_config[place_key]['end_vac2'] = end_vac2
-            st.session_state.holidays_config[place_key]['start_vac3'] = start_vac3
-            st.session_state.holidays_config[place_key]['end_vac3'] = end_vac3
-
-            # Process date ranges
-            holidays_list = []
-            for start_vac, end_vac in zip([start_vac1, start_vac2, start_vac3], [end_vac1, end_vac2, end_vac3]):
-                if start_vac and end_vac:
-                    days = [str(d) for d in daterange(start_vac, end_vac)]
-                    holidays_list.extend(days)
-
-            manual_days = st.text_input(
-                f"Autres jours (AAAA-MM-JJ séparés par ,)",
-                value=st.session_state.holidays_config[place_key]['manual_days'],
-                key=f"manual_days_{place_key}"
-            )
+                # Update session state
+                st.session_state.holidays_config[place_key]['manual_days'] = manual_days
 
-            # Update session state
-            st.session_state.holidays_config[place_key]['manual_days'] = manual_days
+                # Process manual days
+                if manual_days:
+                    manual_days_list = [d.strip() for d in manual_days.split(",") if d.strip()]
+                    holidays_list.extend(manual_days_list)
 
-            # Process manual days
-            if manual_days:
-                manual_days_list = [d.strip() for d in manual_days.split(",") if d.strip()]
-                holidays_list.extend(manual_days_list)
+                # Update the config with all holidays, as merged [start, end] intervals
+                place_cfg['holidays'] = LeaveCalendar.from_config(holidays_list).to_config()
+                config_full['sites'][place_key]['holidays'] = place_cfg['holidays']
+                st.session_state.holidays_config[place_key]['holidays'] = place_cfg['holidays']
 
-            # Update the config with all holidays (removing duplicates)
-            place_cfg['holidays'] = list(set(holidays_list))
-            config_full['sites'][place_key]['holidays'] = place_cfg['holidays']
-            st.session_state.holidays_config[place_key]['holidays'] = place_cfg['holidays']
+        holidays_applied = st.form_submit_button("Appliquer les congés", type="primary")
 
 for key in ["df_schedule", "df_schedule_simple"]:
     if key not in st.session_state:
         st.session_state[key] = None
 
+# Pre-check of the holidays and available weekdays against the quotas, once they are applied:
+# other reruns neither load the holidays package nor build an allocator
+if holidays_applied:
+    with profile_section("feasibility"):
+        st.session_state.feasibility_warnings = feasibility_warnings(config_full, selected_date, end_date)
+if st.session_state.feasibility_warnings:
+    with st.expander("⚠️ Contraintes impossibles à satisfaire", expanded=True):
+        st.caption("Même la meilleure répartition ne peut pas respecter ces quotas : "
+                   "ils seront réduits lors de la génération.")
+        for message in st.session_state.feasibility_warnings:
+            st.warning(message)
+
 # Action buttons
 st.markdown("### 📋 Action à effectuer")
-col1, col2 = st.columns(2)
 
-# Store generation results to display messages outside columns
-generation_success = False
-generation_working_days = 0
-generation_public_holidays = []
+with st.expander("Options de génération", expanded=False):
+    nb_starts = st.number_input(
+        "Nombre d'essais (le meilleur planning est conservé)",
+        min_value=1, max_value=64, value=1, step=1,
+        help="Au-delà de 1, des variantes aléatoires sont calculées en parallèle"
+    )
+    time_budget = st.number_input(
+        "Temps maximum (secondes)", min_value=1, max_value=600, value=30, step=5,
+        disabled=nb_starts == 1
+    )
+    optimize_time = st.number_input(
+        "Optimisation locale (secondes, 0 pour désactiver)", min_value=0, max_value=300, value=0, step=5,
+        help="Améliore l'espacement des jours d'un même site et l'équilibre des vendredis Majorelle"
+    )
+    compensate_history = st.checkbox(
+        "Compenser les écarts des trimestres précédents",
+        help="Les sites ayant reçu plus (ou moins) que leur part dans les plannings sauvegardés avant "
+             "ce trimestre en reçoivent moins (ou plus), dans la limite de 25 % de leur part"
+    )
+
+with st.expander("Comparer des scénarios de congés", expanded=False):
+    st.caption("Chaque ligne ajoute une plage de congés à un scénario. Les congés d'un site listé "
+               "dans un scénario remplacent ceux saisis plus haut ; le scénario « Actuel » les garde tous.")
+    split_sites = {cfg['name']: key for key, cfg in config.items() if cfg.get("advanced_split")}
+    scenario_rows = st.data_editor(
+        pd.DataFrame({"Scénario": pd.Series(dtype="str"), "Site": pd.Series(dtype="str"),
+                      "Début": pd.Series(dtype="object"), "Fin": pd.Series(dtype="object")}),
+        num_rows="dynamic",
+        column_config={
+            "Site": st.column_config.SelectboxColumn("Site", options=list(split_sites), required=True),
+            "Début": st.column_config.DateColumn("Début", min_value=selected_date, max_value=end_date,
+                                                 format="DD/MM/YYYY"),
+            "Fin": st.column_config.DateColumn("Fin", min_value=selected_date, max_value=end_date,
+                                               format="DD/MM/YYYY"),
+        },
+        key="scenario_editor",
+    )
+
+    if st.button("Comparer les scénarios"):
+        scenarios = {}
+        for _, row in scenario_rows.dropna(subset=["Scénario", "Site", "Début", "Fin"]).iterrows():
+            site_holidays = scenarios.setdefault(str(row["Scénario"]).strip(), {}) \
+                .setdefault(split_sites[row["Site"]], [])
+            site_holidays.append((pd.Timestamp(row["Début"]).date(), pd.Timestamp(row["Fin"]).date()))
+
+        scenario_working_days, _ = working_days_of(selected_date, end_date)
+        with st.spinner(f"Calcul de {len(scenarios) + 1} scénarios..."):
+            st.session_state.scenario_results = run_scenarios(
+                config_full, scenario_working_days,
+                [{'name': "Actuel"}] + [{'name': name, 'holidays': holidays}
+                                        for name, holidays in scenarios.items()]
+            )
+
+    if st.session_state.scenario_results:
+        results = st.session_state.scenario_results
+        majorelle_names = [name for name in results[0]['sites'] if name in split_sites]
+        st.dataframe(pd.DataFrame([{
+            "Scénario": result['name'],
+            "Couverture (%)": round(100 * result['coverage'], 1),
+            "Créneaux non pourvus": result['unfilled_slots'],
+            "Écart aux quotas": result['quota_deviation'],
+            **{f"Vendredis {name}": result['sites'][name]['fridays'] for name in majorelle_names},
+        } for result in results]), hide_index=True)
+
+        st.markdown("**Écart aux quotas par site** (créneaux attribués - quota)")
+        st.dataframe(pd.DataFrame({
+            result['name']: {name: site['quota_deviation'] for name, site in result['sites'].items()}
+            for result in results
+        }))
+
+col1, col2 = st.columns(2)
 
 with col1:
-    if st.button("🎯 Générer le planning", type="primary"):
+    generation_running = st.session_state.generation_job is not None
+    if st.button("🎯 Générer le planning", type="primary", disabled=generation_running):
         if selected_date > end_date:
             st.error("La date de début doit être avant la date de fin.")
         else:
-            working_days, public_holidays = get_working_days(selected_date, end_date)
-
-            schedule_full = ScheduleAllocator(config_full, working_days).allocate()
-
-            st.session_state.df_schedule = schedule_to_dataframe(schedule_full)
-            st.session_state.generated_for = st.session_state.selected_date
-            
-            # Store results for display outside columns
-            generation_success = True
-            generation_working_days = len(working_days)
-            generation_public_holidays = public_holidays
+            working_days, public_holidays = working_days_of(selected_date, end_date)
+
+            options = {'nb_starts': int(nb_starts), 'optimize_time': float(optimize_time),
+                       'time_budget': float(time_budget)}
+            generation_config = config_full
+            if compensate_history:
+                # Read from the ledger kept by the storage, not from the planning history
+                past_ids = [sid for sid, meta in storage.get_all().items()
+                            if meta['start_date'] < selected_date.isoformat()]
+                weights = {cfg['name']: cfg.get('nb_radiologists', 0) for cfg in config_full['sites'].values()
+                           if cfg.get('nb_radiologists', 0) > 0}
+                deviation = storage.get_history_deviation(weights, past_ids)
+                generation_config = dict(config_full, history_deviation={
+                    key: round(deviation[cfg['name']], 2)
+                    for key, cfg in config_full['sites'].items() if cfg['name'] in deviation
+                })
+            st.session_state.generation_summary = None
+            st.session_state.generation_job = start_generation(
+                get_generation_executor(), generation_config, working_days, options, cache=result_cache,
+                context={'selected_date': st.session_state.selected_date,
+                         'working_days': len(working_days),
+                         'public_holidays': public_holidays,
+                         'nb_starts': int(nb_starts)}
+            )
+            st.rerun()
 
 with col2:
     # Get all saved schedules to check if any exist
@@ -248,13 +392,59 @@ if hasattr(st.session_state, 'show_schedule_selector') and st.session_state.show
         st.error(f"❌ Aucun planning sauvegardé trouvé pour T{quarter} {year}")
         st.session_state.show_schedule_selector = False
 
+
+@st.fragment(run_every=0.5)
+def show_generation_progress():
+    """Poll the running generation; the full page reruns once it is over"""
+    job = st.session_state.generation_job
+    if job is None:
+        return
+
+    if job.done():
+        st.session_state.generation_job = None
+        if job.cancelled:
+            st.session_state.generation_summary = {'cancelled': True}
+        else:
+            try:
+                schedule_full, metrics, info = job.future.result()
+            except GenerationCancelled:
+                st.session_state.generation_summary = {'cancelled': True}
+            except Exception as e:
+                st.session_state.generation_summary = {'error': str(e)}
+            else:
+                st.session_state.df_schedule = schedule_to_dataframe(schedule_full)
+                st.session_state.generated_for = job.context['selected_date']
+                st.session_state.generation_summary = dict(job.context, metrics=metrics, **info)
+        st.rerun(scope="app")
+
+    fraction, label = job.progress()
+    st.progress(fraction, text=f"Génération en cours : {label}")
+    if st.button("⏹ Annuler la génération"):
+        job.cancel()
+
+
+if st.session_state.generation_job is not None:
+    show_generation_progress()
+
 # Display generation messages across full width
-if generation_success:
-    st.success(f"Planning généré pour {generation_working_days} jours ouvrés.")
-    if generation_public_holidays:
-        st.info(f"{len(generation_public_holidays)} jour(s) férié(s) ignoré(s) : " + ", ".join(
-            [f"{d.strftime('%d/%m')} ({n})" for d, n in generation_public_holidays]
-        ))
+summary = st.session_state.generation_summary
+if summary is not None:
+    if summary.get('cancelled'):
+        st.warning("Génération annulée.")
+    elif 'error' in summary:
+        st.error(f"Erreur lors de la génération : {summary['error']}")
+    else:
+        st.success(f"Planning généré pour {summary['working_days']} jours ouvrés.")
+        if summary['cached']:
+            st.caption("Planning déjà calculé avec ces paramètres : résultat réutilisé")
+        elif summary['nb_starts'] > 1:
+            st.caption(f"{summary['finished_starts']}/{summary['nb_starts']} essais terminés, "
+                       f"créneaux non pourvus : {summary['metrics']['unfilled_slots']}, "
+                       f"score : {summary['metrics']['score']}")
+        if summary['public_holidays']:
+            st.info(f"{len(summary['public_holidays'])} jour(s) férié(s) ignoré(s) : " + ", ".join(
+                [f"{d.strftime('%d/%m')} ({n})" for d, n in summary['public_holidays']]
+            ))
 
 # On n'affiche les plannings que si la date actuelle == celle pour laquelle on a généré le planning.
 show_tables = (
@@ -271,10 +461,23 @@ if show_tables and st.session_state.df_schedule is not None:
         edited_full = create_calendar_editor(source=st.session_state.df_schedule)
         st.session_state.df_schedule = edited_full
 
+        # Hand edits are checked against the constraints (and the leave entered above) on every rerun:
+        # only the edited rows are validated again, and the views below patched
+        with profile_section("audit"):
+            views = st.session_state.schedule_views
+            if views is None:
+                views = st.session_state.schedule_views = ScheduleViews(edited_full, config_full['sites'])
+            else:
+                views.update(edited_full, config_full['sites'])
+            violations = views.violations
+        if not violations.empty:
+            with st.expander(f"⚠️ {len(violations)} contrainte(s) non respectée(s)", expanded=True):
+                st.dataframe(violations[['date', 'site', 'message']].rename(
+                    columns={'date': 'Date', 'site': 'Site', 'message': 'Problème'}),
+                    hide_index=True, width='stretch')
+
     with tab2_complete:
-        create_visual_calendar(
-            source=st.session_state.df_schedule,
-        )
+        render_visual_calendar(views.calendar())
 
     st.markdown("## Vue simplifiée : lieu uniquement")
     tab1_simple, tab2_simple = st.tabs(["📊 Tableau", "📅 Vue visuelle"])
@@ -283,10 +486,7 @@ if show_tables and st.session_state.df_schedule is not None:
         create_calendar_editor(source=st.session_state.df_schedule, simplified=True)
 
     with tab2_simple:
-        create_visual_calendar(
-            source=st.session_state.df_schedule,
-            simplified=True
-        )
+        render_visual_calendar(views.calendar(simplified=True))
 
     # Section des statistiques avec 3 onglets
     st.markdown("## 📊 Statistiques du planning")
@@ -297,50 +497,18 @@ if show_tables and st.session_state.df_schedule is not None:
     ])
 
     with stats_tab1:
-        df_summary = schedule_summary(st.session_state.df_schedule, False)
+        df_summary = views.summary(False)
         st.dataframe(df_summary, hide_index=True, width='stretch')
 
     with stats_tab2:
-        df_summary = schedule_summary(st.session_state.df_schedule, True)
+        df_summary = views.summary(True)
         st.dataframe(df_summary, hide_index=True, width='stretch')
 
     with stats_tab3:
         majorelle_sites = [key for key in config.keys() if key.startswith('majorelle_')]
 
         if majorelle_sites:
-            friday_counts = {}
-            for site_key in majorelle_sites:
-                site_name = config[site_key]['name']
-                count = 0
-
-                for _, row in st.session_state.df_schedule.iterrows():
-                    try:
-                        date_str = str(row.iloc[0])
-                        if 'vendredi' in date_str.lower() or 'friday' in date_str.lower():
-                            is_friday = True
-                        else:
-                            try:
-                                from datetime import datetime
-                                for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y']:
-                                    try:
-                                        date_obj = datetime.strptime(date_str.split()[0], fmt)
-                                        is_friday = date_obj.weekday() == 4
-                                        break
-                                    except:
-                                        continue
-                                else:
-                                    is_friday = False
-                            except:
-                                is_friday = False
-
-                        if is_friday:
-                            row_str = ' '.join(str(val) for val in row.values)
-                            if site_name in row_str:
-                                count += 1
-                    except:
-                        continue
-
-                friday_counts[site_name] = count
+            friday_counts = views.fridays()
 
             if friday_counts:
                 df_fridays = pd.DataFrame(
@@ -381,6 +549,8 @@ if show_tables and st.session_state.df_schedule is not None:
             st.session_state.df_schedule,
             selected_date
         )
+        if not violations.empty:
+            st.warning(f"⚠️ Planning sauvegardé avec {len(violations)} contrainte(s) non respectée(s)")
 
         # Synchronise with GitHub
         try:
@@ -389,3 +559,5 @@ if show_tables and st.session_state.df_schedule is not None:
             st.success(f"✅ Planning saved: {schedule_id}")
         except Exception as e:
             st.warning(f"⚠️ Error during sync: {e}")
+
+finish_rerun_profile()
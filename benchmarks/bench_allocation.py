@@ -0,0 +1,194 @@
+"""
+Benchmark of the allocation pipeline (model/) on synthetic configurations.
+
+Each case generates a config with N sites and randomized holidays / available
+weekdays over a horizon, runs ScheduleAllocator.allocate() and records the wall
+time of every phase, the peak Python memory and the number of unfilled slots.
+
+    python benchmarks/bench_allocation.py                  # run and print
+    python benchmarks/bench_allocation.py --save           # refresh the baseline JSON
+    python benchmarks/bench_allocation.py --compare        # fail on regressions vs baseline
+    python benchmarks/bench_allocation.py --sites 8 --horizons quarter year
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+
+from model.leave import LeaveCalendar  # noqa: E402
+from model.scheduler import ScheduleAllocator  # noqa: E402
+from utils.tools import get_working_days  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline_allocation.json"
+
+HORIZONS = {
+    "quarter": 3,
+    "year": 12,
+    "5years": 60,
+}
+
+DEFAULT_SITES = [8, 40, 200]
+NB_MAJORELLE = 4
+START_DATE = date(2026, 1, 1)
+
+
+def make_config(nb_sites: int, working_days: List[date], rng: random.Random) -> Dict:
+    """Synthetic config: a few Majorelle sites with leave periods, the others spread over the week"""
+    sites = {}
+    for i in range(nb_sites):
+        is_majorelle = i < min(NB_MAJORELLE, nb_sites // 2)
+        key = f"majorelle_{i:03d}" if is_majorelle else f"site_{i:03d}"
+
+        if is_majorelle:
+            # Majorelle sites always work on Fridays, plus one or two other days
+            weekdays = sorted(set(rng.sample(range(4), rng.randint(1, 2))) | {4})
+        else:
+            weekdays = sorted(rng.sample(range(5), rng.randint(2, 5)))
+
+        holidays = []
+        for _ in range(rng.randint(0, 3)):
+            start = rng.choice(working_days)
+            holidays.append([str(start), str(start + timedelta(days=rng.randint(1, 14) - 1))])
+
+        sites[key] = {
+            'name': f"Majo - {i:03d}" if is_majorelle else f"Site {i:03d}",
+            'advanced_split': is_majorelle,
+            'nb_radiologists': rng.randint(1, 4),
+            'available_weekdays': weekdays,
+            'pair_same_day': not is_majorelle and rng.random() < 0.05,
+            'holidays': LeaveCalendar.from_config(holidays).to_config(),
+        }
+
+    return {'sites': sites, 'nb_vacations': 2}
+
+
+def horizon_days(months: int) -> List[date]:
+    year = START_DATE.year + (START_DATE.month - 1 + months) // 12
+    month = (START_DATE.month - 1 + months) % 12 + 1
+    working_days, _ = get_working_days(START_DATE, date(year, month, 1) - timedelta(days=1))
+    return working_days
+
+
+def run_case(nb_sites: int, horizon: str, seed: int, repeat: int) -> Dict:
+    working_days = horizon_days(HORIZONS[horizon])
+    config = make_config(nb_sites, working_days, random.Random(f"{seed}-{nb_sites}-{horizon}"))
+
+    phase_runs = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            allocator = ScheduleAllocator(config, working_days)
+            grid = allocator.allocate()
+            total = time.perf_counter() - start
+        phase_runs.append(dict(allocator.phase_timings, total=total))
+
+    # Separate run for memory: tracemalloc slows the allocation down
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        ScheduleAllocator(config, working_days).allocate()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = {phase: min(run[phase] for run in phase_runs) for phase in phase_runs[0]}
+    return {
+        'case': f"{nb_sites}_sites_{horizon}",
+        'sites': nb_sites,
+        'horizon': horizon,
+        'days': len(working_days),
+        'slots': int(grid.slots.size),
+        'timings_s': {phase: round(value, 6) for phase, value in timings.items()},
+        'peak_memory_mb': round(peak / 2 ** 20, 3),
+        'unfilled_slots': int(np.count_nonzero(grid.slots < 0)),
+    }
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float, min_delta: float) -> List[str]:
+    """Return the regressions of results vs baseline (time or memory above baseline * (1 + tolerance))"""
+    reference = {r['case']: r for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        ref = reference.get(result['case'])
+        if ref is None:
+            continue
+        for phase, value in result['timings_s'].items():
+            ref_value = ref['timings_s'].get(phase)
+            # Differences below min_delta seconds are timer noise
+            if ref_value is not None and value - ref_value > max(min_delta, ref_value * tolerance):
+                regressions.append(f"{result['case']} {phase}: {value:.4f}s vs {ref_value:.4f}s")
+        if result['peak_memory_mb'] > ref['peak_memory_mb'] * (1 + tolerance):
+            regressions.append(f"{result['case']} memory: {result['peak_memory_mb']}MB "
+                               f"vs {ref['peak_memory_mb']}MB")
+        if result['unfilled_slots'] > ref['unfilled_slots']:
+            regressions.append(f"{result['case']} unfilled slots: {result['unfilled_slots']} "
+                               f"vs {ref['unfilled_slots']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sites', type=int, nargs='+', default=DEFAULT_SITES)
+    parser.add_argument('--horizons', nargs='+', choices=list(HORIZONS), default=list(HORIZONS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case, the fastest is kept")
+    parser.add_argument('--output', type=Path, help="Write the results to this JSON file")
+    parser.add_argument('--save', action='store_true', help="Store these results in the baseline (by case)")
+    parser.add_argument('--compare', action='store_true', help="Compare with the baseline, exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative slowdown")
+    parser.add_argument('--min-delta', type=float, default=0.01, help="Ignored slowdown, in seconds")
+    args = parser.parse_args()
+
+    results = []
+    for nb_sites in args.sites:
+        for horizon in args.horizons:
+            result = run_case(nb_sites, horizon, args.seed, args.repeat)
+            results.append(result)
+            phases = "  ".join(f"{k}={v:.3f}" for k, v in result['timings_s'].items())
+            print(f"{result['case']:<24} {phases}  peak={result['peak_memory_mb']}MB  "
+                  f"unfilled={result['unfilled_slots']}/{result['slots']}")
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'results': results,
+    }
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.save:
+        # Merge by case so the baseline can be refreshed one subset at a time
+        previous = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+        merged = {r['case']: r for r in previous.get('results', [])}
+        merged.update({r['case']: r for r in results})
+        BASELINE_PATH.write_text(json.dumps(dict(report, results=list(merged.values())), indent=2))
+        print(f"Baseline saved to {BASELINE_PATH}")
+
+    if args.compare:
+        if not BASELINE_PATH.exists():
+            sys.exit(f"No baseline at {BASELINE_PATH}, run with --save first")
+        regressions = compare(results, json.loads(BASELINE_PATH.read_text()),
+                              args.tolerance, args.min_delta)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("No regression against the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Cold-start time of the Streamlit pages.
+
+Every page runs in a fresh interpreter, as after a redeploy: the modules it imports
+are timed with -X importtime, then its first script run is timed through streamlit's
+AppTest (no browser, no GitHub secrets). Imports done by streamlit itself are left out.
+
+    python benchmarks/bench_startup.py                     # run and print
+    python benchmarks/bench_startup.py --pages suivi       # subset of pages
+    python benchmarks/bench_startup.py --save              # refresh the baseline JSON
+    python benchmarks/bench_startup.py --compare           # fail on regressions vs baseline
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline_startup.json"
+
+PAGES = {
+    "planification": "Planification.py",
+    "configuration": "pages/Configuration.py",
+    "suivi": "pages/Suivi.py",
+}
+
+# Separates the imports of streamlit's test harness from those of the page in the importtime log
+MARKER = "--- page start ---"
+
+CHILD = f"""
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+sys.stderr.write({MARKER!r} + "\\n")
+start = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+print(json.dumps({{'first_run_s': time.perf_counter() - start, 'exceptions': len(at.exception)}}))
+"""
+
+
+def parse_importtime(log: str) -> List[Tuple[str, float]]:
+    """Top-level modules imported after MARKER with their cumulative import time in seconds"""
+    modules = []
+    started = False
+    for line in log.splitlines():
+        if line == MARKER:
+            started = True
+            continue
+        if not started or not line.startswith("import time:"):
+            continue
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        # Nested imports are indented under the module that triggered them
+        if name.startswith("  "):
+            continue
+        modules.append((name.strip(), int(fields[1]) / 1e6))
+    return modules
+
+
+def run_page(page: str, repeat: int) -> Dict:
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", CHILD, PAGES[page]],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        measures = json.loads(completed.stdout.strip().splitlines()[-1])
+        modules = parse_importtime(completed.stderr)
+        runs.append((measures, modules))
+
+    measures, modules = min(runs, key=lambda run: run[0]['first_run_s'])
+    heaviest = sorted(modules, key=lambda module: -module[1])[:5]
+    return {
+        'case': page,
+        'page': PAGES[page],
+        'import_s': round(min(sum(t for _, t in mods) for _, mods in runs), 4),
+        'first_run_s': round(measures['first_run_s'], 4),
+        'exceptions': measures['exceptions'],
+        'heaviest_imports': {name: round(seconds, 4) for name, seconds in heaviest},
+    }
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float, min_delta: float) -> List[str]:
+    """Return the regressions of results vs baseline (time above baseline * (1 + tolerance))"""
+    reference = {r['case']: r for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        ref = reference.get(result['case'])
+        if ref is None:
+            continue
+        for metric in ('import_s', 'first_run_s'):
+            # Differences below min_delta seconds are noise
+            if result[metric] - ref[metric] > max(min_delta, ref[metric] * tolerance):
+                regressions.append(f"{result['case']} {metric}: {result[metric]:.3f}s vs {ref[metric]:.3f}s")
+        if result['exceptions'] > ref['exceptions']:
+            regressions.append(f"{result['case']} exceptions: {result['exceptions']} vs {ref['exceptions']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', nargs='+', choices=list(PAGES), default=list(PAGES))
+    parser.add_argument('--repeat', type=int, default=3, help="Cold starts per page, the fastest is kept")
+    parser.add_argument('--output', type=Path, help="Write the results to this JSON file")
+    parser.add_argument('--save', action='store_true', help="Store these results in the baseline (by page)")
+    parser.add_argument('--compare', action='store_true', help="Compare with the baseline, exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative slowdown")
+    parser.add_argument('--min-delta', type=float, default=0.05, help="Ignored slowdown, in seconds")
+    args = parser.parse_args()
+
+    results = []
+    for page in args.pages:
+        result = run_page(page, args.repeat)
+        results.append(result)
+        heaviest = "  ".join(f"{name}={seconds:.3f}" for name, seconds in result['heaviest_imports'].items())
+        print(f"{page:<16} imports={result['import_s']:.3f}s  first_run={result['first_run_s']:.3f}s  "
+              f"exceptions={result['exceptions']}  [{heaviest}]")
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.save:
+        previous = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+        merged = {r['case']: r for r in previous.get('results', [])}
+        merged.update({r['case']: r for r in results})
+        BASELINE_PATH.write_text(json.dumps(dict(report, results=list(merged.values())), indent=2))
+        print(f"Baseline saved to {BASELINE_PATH}")
+
+    if args.compare:
+        if not BASELINE_PATH.exists():
+            sys.exit(f"No baseline at {BASELINE_PATH}, run with --save first")
+        regressions = compare(results, json.loads(BASELINE_PATH.read_text()), args.tolerance, args.min_delta)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("No regression against the baseline")
+
+
+if __name__ == '__main__':
+    main()
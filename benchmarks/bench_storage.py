@@ -0,0 +1,219 @@
+"""
+Benchmark of ScheduleStorage against growing planning histories.
+
+Histories of 1, 10 and 50 years of quarters are built through ScheduleStorage.save,
+then every operation runs in a fresh process on a copy of the history so that its
+wall time and peak RSS are measured in isolation. 'suivi_rerun' replays the calls
+the Suivi page makes on every rerun.
+
+    python benchmarks/bench_storage.py                     # run and print
+    python benchmarks/bench_storage.py --years 1 10        # subset of histories
+    python benchmarks/bench_storage.py --save              # refresh the baseline JSON
+    python benchmarks/bench_storage.py --compare           # fail on regressions vs baseline
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline_storage.json"
+HISTORY_FILE = "planning_all.parquet"
+
+DEFAULT_YEARS = [1, 10, 50]
+FIRST_YEAR = 2000
+
+OPERATIONS = [
+    "save_new",
+    "save_overwrite",
+    "load",
+    "delete",
+    "get_all",
+    "get_statistics",
+    "export_to_excel",
+    "export_to_excel_grouped",
+    "suivi_rerun",
+]
+
+
+def _site_names() -> List[str]:
+    from utils.tools import load_config
+    return [site['name'] for site in load_config(ROOT / "config" / "config.yml")['sites'].values()]
+
+
+def quarter_frame(quarter_start: date, rng: random.Random, names: List[str]):
+    import pandas as pd
+
+    month = quarter_start.month + 3
+    end = date(quarter_start.year + (month > 12), (month - 1) % 12 + 1, 1)
+    days = [quarter_start + timedelta(days=i) for i in range((end - quarter_start).days)]
+    return pd.DataFrame([{
+        "Date": day.strftime("%Y-%m-%d"),
+        "Affectation 1": rng.choice(names),
+        "Affectation 2": rng.choice(names),
+    } for day in days if day.weekday() < 5])
+
+
+def quarter_starts(years: int) -> List[date]:
+    return [date(FIRST_YEAR + y, month, 1) for y in range(years) for month in (1, 4, 7, 10)]
+
+
+def build_history(directory: Path, years: int, seed: int):
+    from utils.storage.storage import ScheduleStorage
+
+    rng = random.Random(seed)
+    names = _site_names()
+    storage = ScheduleStorage(str(directory / HISTORY_FILE))
+    for start in quarter_starts(years):
+        storage.save(quarter_frame(start, rng, names), start)
+
+
+def _run_operation(operation: str, directory: str, years: int, queue):
+    from utils.storage.storage import ScheduleStorage
+
+    storage = ScheduleStorage(str(Path(directory) / HISTORY_FILE))
+    last_year = FIRST_YEAR + years - 1
+    middle_quarter = quarter_starts(years)[len(quarter_starts(years)) // 2]
+    middle_id = ScheduleStorage._generate_id(middle_quarter)
+    year_ids = [f"T{q}_{last_year}" for q in range(1, 5)]
+    df_quarter = quarter_frame(date(last_year + 1, 1, 1), random.Random(0), _site_names())
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+
+    if operation == "save_new":
+        storage.save(df_quarter, date(last_year + 1, 1, 1))
+    elif operation == "save_overwrite":
+        storage.save(df_quarter, middle_quarter)
+    elif operation == "load":
+        storage.load(middle_id)
+    elif operation == "delete":
+        storage.delete(middle_id)
+    elif operation == "get_all":
+        storage.get_all()
+    elif operation == "get_statistics":
+        storage.get_statistics(year_ids)
+    elif operation == "export_to_excel":
+        storage.export_to_excel(last_year, schedule_ids=year_ids)
+    elif operation == "export_to_excel_grouped":
+        storage.export_to_excel(last_year, grouped_majo=True, schedule_ids=year_ids)
+    elif operation == "suivi_rerun":
+        # Same calls as one rerun of pages/Suivi.py with the default selections
+        all_schedules = storage.get_all()
+        filtered_ids = [sid for sid, meta in all_schedules.items() if meta['year'] == last_year]
+        storage.get_statistics(filtered_ids)
+        storage.export_to_excel(last_year, schedule_ids=filtered_ids)
+        storage.export_to_excel(last_year, grouped_majo=True, schedule_ids=filtered_ids)
+
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux
+    queue.put({
+        'time_s': round(elapsed, 6),
+        'peak_rss_mb': round(rss_after / 1024, 2),
+        'rss_growth_mb': round(max(0, rss_after - rss_before) / 1024, 2),
+    })
+
+
+def measure(operation: str, template: Path, years: int, repeat: int) -> Dict:
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as workdir:
+            shutil.copytree(template, workdir, dirs_exist_ok=True)
+            queue = context.Queue()
+            process = context.Process(target=_run_operation, args=(operation, workdir, years, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            runs.append(result)
+    best = min(runs, key=lambda r: r['time_s'])
+    return dict(best, peak_rss_mb=max(r['peak_rss_mb'] for r in runs))
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float, min_delta: float) -> List[str]:
+    reference = {r['case']: r for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        ref = reference.get(result['case'])
+        if ref is None:
+            continue
+        if result['time_s'] - ref['time_s'] > max(min_delta, ref['time_s'] * tolerance):
+            regressions.append(f"{result['case']} time: {result['time_s']:.4f}s vs {ref['time_s']:.4f}s")
+        if result['rss_growth_mb'] - ref['rss_growth_mb'] > max(5, ref['rss_growth_mb'] * tolerance):
+            regressions.append(f"{result['case']} memory: +{result['rss_growth_mb']}MB "
+                               f"vs +{ref['rss_growth_mb']}MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, nargs='+', default=DEFAULT_YEARS)
+    parser.add_argument('--operations', nargs='+', choices=OPERATIONS, default=OPERATIONS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case, the fastest is kept")
+    parser.add_argument('--output', type=Path, help="Write the results to this JSON file")
+    parser.add_argument('--save', action='store_true', help="Store these results in the baseline (by case)")
+    parser.add_argument('--compare', action='store_true', help="Compare with the baseline, exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative slowdown")
+    parser.add_argument('--min-delta', type=float, default=0.02, help="Ignored slowdown, in seconds")
+    args = parser.parse_args()
+
+    results = []
+    for years in args.years:
+        with tempfile.TemporaryDirectory() as template:
+            build_history(Path(template), years, args.seed)
+            history_mb = (Path(template) / HISTORY_FILE).stat().st_size / 2 ** 20
+            print(f"--- {years} year(s): {years * 4} quarters, {history_mb:.2f}MB on disk")
+
+            for operation in args.operations:
+                result = dict(case=f"{operation}_{years}y", operation=operation, years=years,
+                              history_mb=round(history_mb, 3),
+                              **measure(operation, Path(template), years, args.repeat))
+                results.append(result)
+                print(f"{result['case']:<32} {result['time_s']:.4f}s  "
+                      f"peak_rss={result['peak_rss_mb']}MB  growth=+{result['rss_growth_mb']}MB")
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'results': results,
+    }
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.save:
+        previous = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+        merged = {r['case']: r for r in previous.get('results', [])}
+        merged.update({r['case']: r for r in results})
+        BASELINE_PATH.write_text(json.dumps(dict(report, results=list(merged.values())), indent=2))
+        print(f"Baseline saved to {BASELINE_PATH}")
+
+    if args.compare:
+        if not BASELINE_PATH.exists():
+            sys.exit(f"No baseline at {BASELINE_PATH}, run with --save first")
+        regressions = compare(results, json.loads(BASELINE_PATH.read_text()),
+                              args.tolerance, args.min_delta)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("No regression against the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from model.schedule_grid import slot_columns
+from model.site_table import SiteTable
+
+# Slot codes that are not a site id
+EMPTY_CODE = -1
+UNKNOWN_CODE = -2
+
+# Rules checked by audit_schedules, in report order
+RULES = ('date', 'unknown_site', 'weekday', 'holiday', 'pair_same_day', 'family')
+
+VIOLATION_COLUMNS = ['row', 'date', 'slot', 'site', 'rule', 'message']
+
+WEEKDAY_NAMES = ('lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche')
+
+# datetime64[D] counts days from 1970-01-01, a Thursday
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+EPOCH_WEEKDAY = 3
+
+
+def _site_codes(values: pd.Series, sites: SiteTable) -> np.ndarray:
+    """Site id of each slot, EMPTY_CODE for a blank slot and UNKNOWN_CODE for a name not in the config"""
+    blank = (values.isna() | (values.astype(str).str.strip() == '')).to_numpy()
+    codes = values.map(sites.name_to_id).to_numpy(dtype=np.float64)
+    codes = np.where(np.isnan(codes), UNKNOWN_CODE, codes).astype(np.int64)
+    codes[blank] = EMPTY_CODE
+    return codes
+
+
+def _earlier_equal(keys: np.ndarray) -> np.ndarray:
+    """
+    For each cell of a (rows, slots) key array, the first slot of its row holding the same
+    key when it is an earlier one, else -1. Rows are sorted once: O(slots log slots) per
+    row instead of comparing every pair of slots.
+    """
+    nb_slots = keys.shape[1]
+    order = np.argsort(keys, axis=1, kind='stable')
+    ranked = np.take_along_axis(keys, order, axis=1)
+    repeated = np.zeros(keys.shape, dtype=bool)
+    repeated[:, 1:] = ranked[:, 1:] == ranked[:, :-1]
+    # Position in ranked of the first cell of each run of equal keys
+    run_start = np.maximum.accumulate(np.where(repeated, 0, np.arange(nb_slots)), axis=1)
+    first_slot = np.where(repeated, np.take_along_axis(order, run_start, axis=1), -1)
+    earlier = np.empty_like(first_slot)
+    np.put_along_axis(earlier, order, first_slot, axis=1)
+    return earlier
+
+
+def audit_schedules(df: pd.DataFrame, sites: SiteTable) -> pd.DataFrame:
+    """
+    Every constraint violation of schedule rows (Date, Affectation 1, ..., Affectation n),
+    one or several schedules at once: sites working outside their available weekdays or
+    on leave, paired sites not holding every slot of their day, two sites of one family
+    (or the same site twice) on a day. Each rule is checked on all the rows at once, so a
+    whole history is audited in milliseconds.
+    Returns one row per violation: row (position in df), date, slot (0-based), site, rule
+    (see RULES) and a French message, plus schedule_id when df has it.
+    """
+    nb_rows = len(df)
+    days = pd.to_datetime(df["Date"], errors='coerce')
+    valid_day = days.notna().to_numpy()
+    epoch_days = np.where(valid_day, days.to_numpy(dtype='datetime64[D]').astype(np.int64), 0)
+    weekdays = (epoch_days + EPOCH_WEEKDAY) % 7
+    ordinals = epoch_days + EPOCH_ORDINAL
+
+    columns = slot_columns(df.columns)
+    nb_slots = len(columns)
+    codes = np.column_stack([_site_codes(df[column], sites) for column in columns]) \
+        if nb_rows and nb_slots else np.empty((nb_rows, nb_slots), dtype=np.int64)
+    site_ids = np.maximum(codes, 0)
+    known = codes >= 0
+    dated = known & valid_day[:, None]
+
+    masks = np.array(sites.weekday_mask, dtype=np.int64)
+    paired = np.array(sites.paired, dtype=bool)
+    family = np.array(sites.family, dtype=np.int64)
+
+    found = {rule: np.zeros((nb_rows, nb_slots), dtype=bool) for rule in RULES}
+    if nb_slots:
+        found['date'][:, 0] = ~valid_day & (codes != EMPTY_CODE).any(axis=1)
+    found['unknown_site'] = codes == UNKNOWN_CODE
+    found['weekday'] = dated & ((masks[site_ids] >> weekdays[:, None]) & 1 == 0)
+    for site, holidays in enumerate(sites.holidays):
+        if holidays:
+            rows, slots = np.nonzero(dated & (codes == site))
+            on_leave = holidays.mask_ordinals(ordinals[rows])
+            found['holiday'][rows[on_leave], slots[on_leave]] = True
+
+    whole_day = (codes == codes[:, :1]).all(axis=1) if nb_slots else np.zeros(nb_rows, dtype=bool)
+    found['pair_same_day'] = known & paired[site_ids] & ~whole_day[:, None]
+
+    # Blank and unknown slots get keys of their own, below the family ids
+    own_keys = -1 - np.arange(nb_slots)[None, :]
+    # A paired site repeated on its day is not a family conflict with itself
+    repeat = (_earlier_equal(np.where(known, codes, own_keys)) >= 0) & known & paired[site_ids]
+    family_keys = np.where(known & ~repeat, family[site_ids], own_keys)
+    # Reported on the later slot, the other site being the first one of the family that day
+    same_family = _earlier_equal(family_keys)
+    found['family'] = same_family >= 0
+
+    day_labels = np.where(valid_day, days.dt.strftime('%Y-%m-%d').to_numpy(dtype=object), None)
+    raw_values = [df[column].to_numpy(dtype=object) for column in columns]
+
+    def slot_name(row: int, slot: int):
+        return sites.names[codes[row, slot]] if codes[row, slot] >= 0 else raw_values[slot][row]
+
+    records = []
+    for rule in RULES:
+        for row, slot in zip(*np.nonzero(found[rule])):
+            name = slot_name(row, slot)
+            other = slot_name(row, same_family[row, slot]) if rule == 'family' else name
+            message = _message(rule, name, other, weekdays[row])
+            records.append((int(row), day_labels[row], int(slot), name, rule, message))
+
+    violations = pd.DataFrame(records, columns=VIOLATION_COLUMNS)
+    if "schedule_id" in df.columns:
+        violations.insert(0, "schedule_id", df["schedule_id"].to_numpy(dtype=object)[violations['row'].to_numpy()])
+    return violations.sort_values(['row', 'slot'], kind='stable').reset_index(drop=True)
+
+
+def _message(rule: str, name, other, weekday: int) -> str:
+    """French message of a violation of rule by site name, other being the site of the other slot"""
+    if rule == 'date':
+        return "Date invalide"
+    if rule == 'unknown_site':
+        return f"Site inconnu : {name}"
+    if rule == 'weekday':
+        return f"{name} ne travaille pas le {WEEKDAY_NAMES[weekday]}"
+    if rule == 'holiday':
+        return f"{name} est en congé"
+    if rule == 'pair_same_day':
+        return f"{name} doit occuper tous les créneaux du jour"
+    if name == other:
+        return f"{name} est affecté deux fois le même jour"
+    return f"{other} et {name} sont du même groupe de sites"
@@ -0,0 +1,178 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from model.flow import MaxFlow
+from model.site_table import SiteTable
+
+
+class FeasibilityReport:
+    """Result of analyze_feasibility: what the best possible allocation can place, per site and per week"""
+
+    def __init__(self, quotas: Dict[int, int], capacity: Dict[int, int], placeable: Dict[int, int],
+                 week_slots: Dict[date, int], week_fillable: Dict[date, int], sites: SiteTable):
+        self.quotas = quotas
+        self.capacity = capacity
+        self.placeable = placeable
+        self.week_slots = week_slots
+        self.week_fillable = week_fillable
+        self.sites = sites
+
+    @property
+    def total_slots(self) -> int:
+        return sum(self.week_slots.values())
+
+    @property
+    def max_placeable(self) -> int:
+        return sum(self.placeable.values())
+
+    @property
+    def is_feasible(self) -> bool:
+        return not self.over_constrained_sites() and not self.under_covered_weeks()
+
+    def over_constrained_sites(self) -> List[int]:
+        """Sites whose quota cannot be fully placed"""
+        return [site for site, quota in self.quotas.items() if self.placeable[site] < quota]
+
+    def under_covered_weeks(self) -> List[date]:
+        """Mondays of the weeks in which some slots cannot be filled"""
+        return [week for week, slots in sorted(self.week_slots.items()) if self.week_fillable[week] < slots]
+
+    def capped_quotas(self) -> Dict[int, int]:
+        """Quotas reduced to what the best allocation can place"""
+        return {site: min(quota, self.placeable[site]) for site, quota in self.quotas.items()}
+
+    def warnings(self) -> List[str]:
+        messages = []
+        for site in self.over_constrained_sites():
+            messages.append(
+                f"{self.sites.names[site]} : quota de {self.quotas[site]} créneaux, "
+                f"{self.placeable[site]} plaçables au mieux sur {self.capacity[site]} possibles"
+            )
+        for week in self.under_covered_weeks():
+            missing = self.week_slots[week] - self.week_fillable[week]
+            messages.append(
+                f"Semaine du {week.strftime('%d/%m/%Y')} : {missing} créneau(x) sans site disponible"
+            )
+        return messages
+
+
+def _greedy_fill(sites: SiteTable, active: List[int], available: np.ndarray,
+                 quotas: Dict[int, int], nb_vacations: int) -> bool:
+    """
+    Fill the days in order with the most urgent sites (remaining quota over remaining
+    available days). True when it places every quota in every slot: the relaxation is then
+    feasible and the max-flow is not needed.
+    """
+    remaining = np.array([quotas[site] for site in active], dtype=np.float64)
+    if remaining.sum() != nb_vacations * available.shape[1]:
+        return False
+    days_left = available.sum(axis=1).astype(np.float64)
+
+    for row in range(available.shape[1]):
+        open_today = available[:, row]
+        candidates = np.flatnonzero(open_today & (remaining > 0))
+        urgency = remaining[candidates] / days_left[candidates]
+        free = nb_vacations
+        families = set()
+        for index in candidates[np.argsort(-urgency, kind='stable')].tolist():
+            site = active[index]
+            need = nb_vacations if sites.paired[site] else 1
+            if need > free or sites.family[site] in families:
+                continue
+            remaining[index] -= need
+            free -= need
+            families.add(sites.family[site])
+            if not free:
+                break
+        if free:
+            return False
+        days_left[open_today] -= 1
+
+    return not remaining.any()
+
+
+def analyze_feasibility(sites: SiteTable, working_days: List[date], quotas: Dict[int, int],
+                        nb_vacations: int = 2) -> FeasibilityReport:
+    """
+    Max-flow relaxation of the allocation: source -> site (quota) -> day (available days)
+    -> sink (nb_vacations). A site holds one slot per day, both for paired sites, and sites
+    of a same family share one slot per day. Majorelle Friday rules are ignored, so the
+    result is an upper bound of what the allocator can place.
+    """
+    active = [site for site in range(len(sites)) if quotas.get(site, 0) > 0]
+    available = sites.availability(working_days)[active]
+    per_day = {site: nb_vacations if sites.paired[site] else 1 for site in active}
+    capacity = {site: 0 for site in quotas}
+    capacity.update({site: int(available[i].sum()) * per_day[site] for i, site in enumerate(active)})
+
+    if _greedy_fill(sites, active, available, quotas, nb_vacations):
+        placeable = {site: quotas[site] for site in quotas}
+        day_fillable = [nb_vacations] * len(working_days)
+    else:
+        placeable, day_fillable = _max_flow_fill(sites, active, available, quotas, per_day, nb_vacations)
+
+    week_slots = defaultdict(int)
+    week_fillable = defaultdict(int)
+    for row, day in enumerate(working_days):
+        week = day - timedelta(days=day.weekday())
+        week_slots[week] += nb_vacations
+        week_fillable[week] += day_fillable[row]
+
+    return FeasibilityReport(
+        quotas=dict(quotas),
+        capacity=capacity,
+        placeable=placeable,
+        week_slots=dict(week_slots),
+        week_fillable=dict(week_fillable),
+        sites=sites,
+    )
+
+
+def _max_flow_fill(sites: SiteTable, active: List[int], available: np.ndarray, quotas: Dict[int, int],
+                   per_day: Dict[int, int], nb_vacations: int) -> Tuple[Dict[int, int], List[int]]:
+    """Max-flow of the relaxation: slots placeable per site and fillable per day"""
+    # Days open to the same sites are interchangeable: the network gets one node per class
+    # of days with capacities scaled by the class size instead of one node per day
+    day_classes = defaultdict(list)
+    for row in range(available.shape[1]):
+        day_classes[available[:, row].tobytes()].append(row)
+
+    source, sink = 0, 1
+    network = MaxFlow(2)
+    site_edges = {site: network.add_edge(source, network.add_node(), quotas[site]) for site in active}
+    site_node = {site: network.head[edge] for site, edge in site_edges.items()}
+
+    class_edges = []
+    for rows in day_classes.values():
+        nb_days = len(rows)
+        class_node = network.add_node()
+        class_edges.append((rows, network.add_edge(class_node, sink, nb_vacations * nb_days)))
+
+        families = defaultdict(list)
+        for index in np.flatnonzero(available[:, rows[0]]).tolist():
+            families[sites.family[active[index]]].append(active[index])
+
+        for members in families.values():
+            target = class_node
+            if len(members) > 1:
+                # The sites of a family share a single slot per day
+                target = network.add_node()
+                network.add_edge(target, class_node, max(per_day[site] for site in members) * nb_days)
+            for site in members:
+                network.add_edge(site_node[site], target, per_day[site] * nb_days)
+
+    network.max_flow(source, sink)
+
+    # Spread the flow of each class over its days, in day order
+    day_fillable = [0] * available.shape[1]
+    for rows, edge in class_edges:
+        remaining = network.flow(edge)
+        for row in rows:
+            day_fillable[row] = min(nb_vacations, remaining)
+            remaining -= day_fillable[row]
+
+    placeable = {site: network.flow(site_edges[site]) if site in site_edges else 0 for site in quotas}
+    return placeable, day_fillable
@@ -0,0 +1,82 @@
+from collections import deque
+from typing import List
+
+
+class MaxFlow:
+    """Dinic max-flow on an integer-capacity graph, nodes are 0..nb_nodes-1"""
+
+    def __init__(self, nb_nodes: int):
+        self.nb_nodes = nb_nodes
+        self.adjacency: List[List[int]] = [[] for _ in range(nb_nodes)]
+        # Edge e goes to head[e] with residual capacity capacity[e]; e ^ 1 is its reverse edge
+        self.head: List[int] = []
+        self.capacity: List[int] = []
+        self.initial: List[int] = []
+
+    def add_node(self) -> int:
+        self.adjacency.append([])
+        self.nb_nodes += 1
+        return self.nb_nodes - 1
+
+    def add_edge(self, u: int, v: int, capacity: int) -> int:
+        """Add u -> v and return the edge index, to read its flow after max_flow()"""
+        edge = len(self.head)
+        self.head.extend((v, u))
+        self.capacity.extend((capacity, 0))
+        self.initial.extend((capacity, 0))
+        self.adjacency[u].append(edge)
+        self.adjacency[v].append(edge + 1)
+        return edge
+
+    def set_capacity(self, edge: int, capacity: int):
+        """Raise the capacity of an edge, keeping its current flow: max_flow() then augments from there"""
+        delta = capacity - self.initial[edge]
+        if delta < 0:
+            raise ValueError("Capacities can only be raised once flow has been pushed")
+        self.initial[edge] = capacity
+        self.capacity[edge] += delta
+
+    def flow(self, edge: int) -> int:
+        return self.initial[edge] - self.capacity[edge]
+
+    def _levels(self, source: int, sink: int) -> List[int]:
+        level = [-1] * self.nb_nodes
+        level[source] = 0
+        queue = deque([source])
+        while queue:
+            u = queue.popleft()
+            for edge in self.adjacency[u]:
+                v = self.head[edge]
+                if self.capacity[edge] > 0 and level[v] < 0:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        return level
+
+    def _push(self, u: int, sink: int, limit: float, level: List[int], next_edge: List[int]) -> int:
+        """Push up to limit units from u along the level graph, over as many paths as needed"""
+        if u == sink:
+            return limit
+        pushed = 0
+        adjacency = self.adjacency[u]
+        while next_edge[u] < len(adjacency):
+            edge = adjacency[next_edge[u]]
+            v = self.head[edge]
+            if self.capacity[edge] > 0 and level[v] == level[u] + 1:
+                found = self._push(v, sink, min(limit - pushed, self.capacity[edge]), level, next_edge)
+                if found:
+                    self.capacity[edge] -= found
+                    self.capacity[edge ^ 1] += found
+                    pushed += found
+                    if pushed == limit:
+                        # The edge may still have capacity: keep it for the next push
+                        return pushed
+            next_edge[u] += 1
+        return pushed
+
+    def max_flow(self, source: int, sink: int) -> int:
+        total = 0
+        while True:
+            level = self._levels(source, sink)
+            if level[sink] < 0:
+                return total
+            total += self._push(source, sink, float('inf'), level, [0] * self.nb_nodes)
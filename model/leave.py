@@ -0,0 +1,94 @@
+from bisect import bisect_right
+from datetime import date, timedelta
+from typing import Iterable, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+
+# A config entry: an ISO date (one day) or a [start, end] pair of ISO dates, both included
+LeaveEntry = Union[str, date, Sequence]
+
+
+def _to_date(value) -> date:
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip())
+
+
+class LeaveCalendar:
+    """
+    Leave days of a site as sorted, merged [start, end] intervals (both included).
+    Lookups bisect the interval starts, so a long leave costs one interval whatever its length.
+    """
+
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self, intervals: Iterable[Tuple[date, date]] = ()):
+        self.starts: List[date] = []
+        self.ends: List[date] = []
+        for start, end in sorted((s, e) for s, e in intervals if s <= e):
+            # Overlapping or adjacent intervals are merged
+            if self.ends and start <= self.ends[-1] + timedelta(days=1):
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    @classmethod
+    def from_config(cls, raw: Iterable[LeaveEntry]) -> 'LeaveCalendar':
+        """Read config holidays, ISO dates or [start, end] pairs; unreadable entries are skipped"""
+        intervals = []
+        for entry in raw or []:
+            try:
+                if isinstance(entry, (list, tuple)):
+                    start, end = entry
+                    intervals.append((_to_date(start), _to_date(end)))
+                else:
+                    day = _to_date(entry)
+                    intervals.append((day, day))
+            except (TypeError, ValueError):
+                continue
+        return cls(intervals)
+
+    def to_config(self) -> List[List[str]]:
+        """[start, end] ISO pairs, the form stored in config and session state"""
+        return [[start.isoformat(), end.isoformat()] for start, end in self.intervals()]
+
+    def intervals(self) -> Iterator[Tuple[date, date]]:
+        return zip(self.starts, self.ends)
+
+    def days(self) -> Iterator[date]:
+        for start, end in self.intervals():
+            for offset in range((end - start).days + 1):
+                yield start + timedelta(days=offset)
+
+    def __contains__(self, day: date) -> bool:
+        index = bisect_right(self.starts, day) - 1
+        return index >= 0 and day <= self.ends[index]
+
+    def __len__(self) -> int:
+        """Number of leave days"""
+        return sum((end - start).days + 1 for start, end in self.intervals())
+
+    def __bool__(self) -> bool:
+        return bool(self.starts)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, LeaveCalendar) and self.starts == other.starts and self.ends == other.ends
+
+    def __repr__(self) -> str:
+        return f"LeaveCalendar({self.to_config()})"
+
+    def mask(self, days: Sequence[date]) -> np.ndarray:
+        """Boolean array, True for the days on leave"""
+        if not self.starts or not len(days):
+            return np.zeros(len(days), dtype=bool)
+        return self.mask_ordinals(np.fromiter((day.toordinal() for day in days), dtype=np.int64, count=len(days)))
+
+    def mask_ordinals(self, ordinals: np.ndarray) -> np.ndarray:
+        """mask() of days given as an array of date.toordinal() values"""
+        if not self.starts or not len(ordinals):
+            return np.zeros(len(ordinals), dtype=bool)
+        starts = np.array([start.toordinal() for start in self.starts], dtype=np.int64)
+        ends = np.array([end.toordinal() for end in self.ends], dtype=np.int64)
+        index = np.searchsorted(starts, ordinals, side='right') - 1
+        return (index >= 0) & (ordinals <= ends[np.maximum(index, 0)])
@@ -0,0 +1,204 @@
+import math
+import random
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from model.metrics import FRIDAY_DEVIATION_WEIGHT, FRIDAY_OUT_OF_RANGE_WEIGHT, FRIDAY_RANGE, FRIDAY_TARGET
+from model.schedule_grid import EMPTY, ScheduleGrid
+from model.site_table import SiteTable
+from model.validator import ScheduleValidator
+
+# Two days of the same site closer than SPACING_WINDOW working days cost (SPACING_WINDOW - distance)
+SPACING_WINDOW = 5
+
+# Simulated annealing temperatures, lowered geometrically over the time budget
+START_TEMPERATURE = 3.0
+END_TEMPERATURE = 0.05
+
+# Moves between two clock reads
+CHECK_EVERY = 2048
+
+
+class LocalSearchOptimizer:
+    """
+    Improve an allocated schedule with simulated annealing over pairwise slot swaps.
+
+    The objective adds a spacing penalty (same site on nearby days) and the Majorelle
+    Friday penalty of model.metrics. Swaps keep every site's slot count, so coverage
+    and quotas are unchanged and only these terms are evaluated, incrementally:
+    a move costs O(SPACING_WINDOW) whatever the size of the schedule.
+    """
+
+    def __init__(self, grid: ScheduleGrid, sites: SiteTable, validator: ScheduleValidator,
+                 seed: Optional[int] = None):
+        self.grid = grid
+        self.sites = sites
+        self.validator = validator
+        self._rng = random.Random(seed)
+
+        nb_rows = len(grid)
+        rows = grid.slots.tolist()
+        self._is_friday = grid.friday_mask().tolist()
+        self._majorelle = [bool(m) for m in sites.majorelle]
+
+        # availability[site][row], computed once so that a move is checked in O(1)
+        self._available = [
+            bytearray(sites.is_available(site, day) for day in grid.days) for site in range(len(sites))
+        ]
+
+        # occupancy[site][row]: slots held by the site on that row
+        self._occupancy = [bytearray(nb_rows) for _ in range(len(sites))]
+        self._fridays = [0] * len(sites)
+        self._reset_counts()
+
+        # Paired sites must keep both slots of their day: their rows never move
+        self._cells = [
+            (row, slot) for row, day_sites in enumerate(rows)
+            if not any(site != EMPTY and sites.paired[site] for site in day_sites)
+            for slot, site in enumerate(day_sites) if site != EMPTY
+        ]
+
+        self.score = self.spacing_penalty() + sum(
+            self._friday_penalty(self._fridays[site]) for site in sites.majorelle_ids()
+        )
+
+    def spacing_penalty(self) -> int:
+        """Full spacing penalty, used for the initial score"""
+        total = 0
+        for occupancy in self._occupancy:
+            rows = [row for row, count in enumerate(occupancy) if count]
+            for i, row in enumerate(rows):
+                for other in rows[i + 1:]:
+                    if other - row >= SPACING_WINDOW:
+                        break
+                    total += SPACING_WINDOW - (other - row)
+        return total
+
+    @staticmethod
+    def _friday_penalty(count: int) -> int:
+        penalty = FRIDAY_DEVIATION_WEIGHT * abs(count - FRIDAY_TARGET)
+        if not FRIDAY_RANGE[0] <= count <= FRIDAY_RANGE[1]:
+            penalty += FRIDAY_OUT_OF_RANGE_WEIGHT
+        return penalty
+
+    def _neighbours(self, occupancy: bytearray, row: int) -> int:
+        """Spacing cost of one slot of a site on row against the site's other days"""
+        cost = 0
+        last = len(occupancy) - 1
+        for distance in range(1, SPACING_WINDOW):
+            weight = SPACING_WINDOW - distance
+            if row - distance >= 0:
+                cost += weight * occupancy[row - distance]
+            if row + distance <= last:
+                cost += weight * occupancy[row + distance]
+        return cost
+
+    def _move_delta(self, site: int, from_row: int, to_row: int) -> int:
+        """Spacing delta of moving one slot of site from from_row to to_row"""
+        occupancy = self._occupancy[site]
+        delta = self._neighbours(occupancy, to_row) - self._neighbours(occupancy, from_row)
+        distance = abs(to_row - from_row)
+        if distance < SPACING_WINDOW:
+            # The neighbours of to_row still include the slot being moved away
+            delta -= SPACING_WINDOW - distance
+        return delta
+
+    def _swap_delta(self, site_a: int, row_a: int, site_b: int, row_b: int) -> int:
+        delta = self._move_delta(site_a, row_a, row_b) + self._move_delta(site_b, row_b, row_a)
+
+        if self._is_friday[row_a] != self._is_friday[row_b]:
+            # site_a leaves a Friday and site_b gets one, or the other way round
+            step = -1 if self._is_friday[row_a] else 1
+            for site, change in ((site_a, step), (site_b, -step)):
+                if self._majorelle[site]:
+                    count = self._fridays[site]
+                    delta += self._friday_penalty(count + change) - self._friday_penalty(count)
+        return delta
+
+    def _apply(self, row_a: int, slot_a: int, row_b: int, slot_b: int, site_a: int, site_b: int):
+        self.grid.swap(row_a, slot_a, row_b, slot_b)
+        self._occupancy[site_a][row_a] -= 1
+        self._occupancy[site_a][row_b] += 1
+        self._occupancy[site_b][row_b] -= 1
+        self._occupancy[site_b][row_a] += 1
+        if self._is_friday[row_a] != self._is_friday[row_b]:
+            step = -1 if self._is_friday[row_a] else 1
+            self._fridays[site_a] += step
+            self._fridays[site_b] -= step
+
+    def optimize(self, time_budget: float, max_moves: Optional[int] = None,
+                 progress_callback: Optional[Callable[[float], None]] = None) -> Dict[str, float]:
+        """
+        Run the annealing for time_budget seconds (or max_moves moves) and leave the best
+        schedule found in the grid. progress_callback gets the elapsed fraction of the budget.
+        """
+        stats = {'initial_score': self.score, 'moves': 0, 'accepted': 0}
+        cells = self._cells
+        if len(cells) < 2 or time_budget <= 0:
+            return dict(stats, final_score=self.score)
+
+        slots = self.grid.slots
+        available = self._available
+        rng = self._rng
+        best_score = self.score
+        best_slots = slots.copy()
+
+        start = time.perf_counter()
+        temperature = START_TEMPERATURE
+        moves = accepted = 0
+
+        while max_moves is None or moves < max_moves:
+            if moves % CHECK_EVERY == 0:
+                progress = (time.perf_counter() - start) / time_budget
+                if progress >= 1:
+                    break
+                if progress_callback is not None:
+                    progress_callback(progress)
+                temperature = START_TEMPERATURE * (END_TEMPERATURE / START_TEMPERATURE) ** progress
+            moves += 1
+
+            row_a, slot_a = cells[rng.randrange(len(cells))]
+            row_b, slot_b = cells[rng.randrange(len(cells))]
+            if row_a == row_b:
+                continue
+            site_a = int(slots[row_a, slot_a])
+            site_b = int(slots[row_b, slot_b])
+            if site_a == site_b or not available[site_a][row_b] or not available[site_b][row_a]:
+                continue
+
+            delta = self._swap_delta(site_a, row_a, site_b, row_b)
+            if delta > 0 and rng.random() >= math.exp(-delta / temperature):
+                continue
+            # site_b goes to row_a at slot_a, site_a to row_b
+            if not self.validator.validate_swap(site_a, site_b, slots[row_a], slots[row_b], slot_a, slot_b):
+                continue
+
+            self._apply(row_a, slot_a, row_b, slot_b, site_a, site_b)
+            self.score += delta
+            accepted += 1
+            if self.score < best_score:
+                best_score = self.score
+                np.copyto(best_slots, slots)
+
+        if self.score != best_score:
+            np.copyto(slots, best_slots)
+            self._reset_counts()
+            self.score = best_score
+
+        stats.update(moves=moves, accepted=accepted, final_score=self.score,
+                     seconds=time.perf_counter() - start)
+        return stats
+
+    def _reset_counts(self):
+        """Rebuild occupancy and Friday counts from the grid"""
+        for occupancy in self._occupancy:
+            occupancy[:] = bytes(len(occupancy))
+        self._fridays = [0] * len(self._fridays)
+        for row, day_sites in enumerate(self.grid.slots.tolist()):
+            for site in day_sites:
+                if site != EMPTY:
+                    self._occupancy[site][row] += 1
+                    if self._is_friday[row]:
+                        self._fridays[site] += 1
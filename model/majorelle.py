@@ -1,20 +1,26 @@
+from bisect import bisect_left, bisect_right
 from datetime import date
 from typing import List, Dict, Optional
 
+from model.flow import MaxFlow
+from model.site_table import SiteTable
 from model.validator import ScheduleValidator
 
 
+FRIDAYS_PER_SITE = 3
+
+
 class MajorelleManager:
     """Manage fridays allocation to Majorelle sites"""
 
-    def __init__(self, majorelle_sites: List[str], config: Dict):
-        self.majorelle_sites = majorelle_sites
-        self.config = config
+    def __init__(self, sites: SiteTable):
+        self.sites = sites
+        self.majorelle_sites = sites.majorelle_ids()
         self.friday_allocation = {}
-        self.friday_used = {site: 0 for site in majorelle_sites}
-        self.constraints_validator = ScheduleValidator(config)
+        self.friday_used = {site: 0 for site in self.majorelle_sites}
+        self.constraints_validator = ScheduleValidator(sites)
 
-    def allocate_fridays(self, working_days: List[date]) -> Dict[str, List[date]]:
+    def allocate_fridays(self, working_days: List[date]) -> Dict[int, List[date]]:
         """
         Allocates Fridays to Majorelle sites.
         Each site should have 3 fridays in the targeted semester.
@@ -33,7 +39,7 @@ class MajorelleManager:
             ]
 
             if len(site_available_fridays[site]) < 3:
-                print(f"Warning: Site {self.config[site]['name']} has only "
+                print(f"Warning: Site {self.sites.names[site]} has only "
                       f"{len(site_available_fridays[site])} Fridays available (need 3)")
 
         total_allocations_possible = sum(min(len(fridays), 3) for fridays in site_available_fridays.values())
@@ -46,57 +52,63 @@ class MajorelleManager:
         return self.friday_allocation
 
     def _allocate_with_availability(self, all_fridays: List[date],
-                                    site_available_fridays: Dict[str, List[date]]):
+                                    site_available_fridays: Dict[int, List[date]]):
         """
-        Allocate Fridays to sites while respecting availability constraints.
-        Try to distribute evenly across the semester periods.
+        Allocate Fridays to sites while respecting availability constraints, as a
+        capacity-constrained bipartite matching solved by max-flow:
+        source -> site (FRIDAYS_PER_SITE) -> site period (1) -> available Friday -> sink (1).
+        Site capacities are raised one Friday at a time so that every site gets its
+        first Fridays before any gets its third, then the one-per-period spread is
+        relaxed to use the leftover Fridays.
         """
         periods = self._split_fridays_into_periods(all_fridays)
+        friday_period = {friday: idx for idx, period in enumerate(periods) for friday in period}
 
-        for site in self.majorelle_sites:
-            self.friday_allocation[site] = []
-
-        for period_idx, period in enumerate(periods):
-            sites_needing_friday = list(self.majorelle_sites)
-
-            for friday in period:
-                if not sites_needing_friday:
-                    break
-
-                available_sites = [
-                    site for site in sites_needing_friday
-                    if friday in site_available_fridays[site]
-                       and len(self.friday_allocation[site]) < 3
-                       and not self._is_friday_allocated(friday)
-                ]
-
-                if available_sites:
-                    # Prioritize sites with few fridays available
-                    chosen_site = min(available_sites,
-                                      key=lambda s: (len(self.friday_allocation[s]), s))
-                    self.friday_allocation[chosen_site].append(friday)
-                    sites_needing_friday.remove(chosen_site)
+        network = MaxFlow(2)
+        source, sink = 0, 1
+        friday_node = {friday: network.add_node() for friday in all_fridays}
+        for node in friday_node.values():
+            network.add_edge(node, sink, 1)
 
+        site_edges = {}
+        period_edges = []
+        friday_edges = {}
         for site in self.majorelle_sites:
-            current_count = len(self.friday_allocation[site])
-            if current_count < 4:
-                remaining_fridays = [
-                    f for f in site_available_fridays[site]
-                    if not self._is_friday_allocated(f)
-                ]
-
-                for friday in remaining_fridays[:3 - current_count]:
-                    self.friday_allocation[site].append(friday)
+            site_node = network.add_node()
+            site_edges[site] = network.add_edge(source, site_node, 0)
+            period_nodes = []
+            for _ in periods:
+                period_node = network.add_node()
+                period_edges.append(network.add_edge(site_node, period_node, 1))
+                period_nodes.append(period_node)
+            for friday in site_available_fridays[site]:
+                friday_edges[site, friday] = network.add_edge(
+                    period_nodes[friday_period[friday]], friday_node[friday], 1
+                )
+
+        for capacity in range(1, FRIDAYS_PER_SITE + 1):
+            for edge in site_edges.values():
+                network.set_capacity(edge, capacity)
+            network.max_flow(source, sink)
+
+        # Not enough Fridays in some period: allow several Fridays per period
+        for edge in period_edges:
+            network.set_capacity(edge, FRIDAYS_PER_SITE)
+        network.max_flow(source, sink)
 
-                self.friday_allocation[site].sort()
+        for site in self.majorelle_sites:
+            self.friday_allocation[site] = [
+                friday for friday in site_available_fridays[site]
+                if network.flow(friday_edges[site, friday])
+            ]
 
         print("\n=== Friday allocation for Majorelle sites ===")
         for site in self.majorelle_sites:
             allocated_count = len(self.friday_allocation[site])
             status = "✓" if allocated_count == 3 else f"⚠ ({allocated_count}/3)"
-            print(f"{self.config[site]['name']}: {status}")
+            print(f"{self.sites.names[site]}: {status}")
             if allocated_count < 4:
-                holidays = self.config[site].get('holidays', [])
+                holidays = self.sites.holidays[site]
                 if holidays:
                     print(f"  Note: {len(holidays)} days of holidays configured")
 
@@ -118,11 +130,7 @@ class MajorelleManager:
 
         return periods
 
-    def _is_friday_allocated(self, friday: date) -> bool:
-        """Check if a friday has been already allocated to any site"""
-        return any(friday in self.friday_allocation[s] for s in self.friday_allocation)
-
-    def should_place_majorelle_on_friday(self, day: date) -> Optional[str]:
+    def should_place_majorelle_on_friday(self, day: date) -> Optional[int]:
         """Determine if a Majorelle site should be placed on this Friday"""
         if day.weekday() != 4:
             return None
@@ -134,20 +142,20 @@ class MajorelleManager:
                     if self.constraints_validator.is_available(site, day):
                         return site
                     else:
-                        print(f"Warning: {self.config[site]['name']} was allocated to "
+                        print(f"Warning: {self.sites.names[site]} was allocated to "
                               f"{day.strftime('%Y-%m-%d')} but is no longer available")
         return None
 
-    def increment_friday_count(self, site: str):
+    def increment_friday_count(self, site: int):
         """Increment the count of Fridays used for a site"""
         if site in self.friday_used:
             self.friday_used[site] += 1
 
-    def get_friday_count(self, site: str) -> int:
+    def get_friday_count(self, site: int) -> int:
         """Get the current count of Fridays for a site"""
         return self.friday_used.get(site, 0)
 
-    def can_place_on_friday(self, site: str, is_backfilling: bool = False) -> bool:
+    def can_place_on_friday(self, site: int, is_backfilling: bool = False) -> bool:
         """Check if a site can be placed on a Friday"""
         if site not in self.majorelle_sites:
             return True
@@ -156,13 +164,12 @@ class MajorelleManager:
         max_allowed = 4 if is_backfilling else 3
         return current_count < max_allowed
 
-    def get_future_friday_count(self, site: str, current_date: date, include_current: bool = False) -> int:
+    def get_future_friday_count(self, site: int, current_date: date, include_current: bool = False) -> int:
         if site not in self.majorelle_sites or site not in self.friday_allocation:
             return 0
 
-        future_fridays = [
-            friday for friday in self.friday_allocation[site]
-            if friday > current_date or (include_current and friday == current_date)
-        ]
-
-        return len(future_fridays)
+        # friday_allocation lists are in date order
+        fridays = self.friday_allocation[site]
+        if include_current:
+            return len(fridays) - bisect_left(fridays, current_date)
+        return len(fridays) - bisect_right(fridays, current_date)
@@ -0,0 +1,70 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+from model.schedule_grid import EMPTY, ScheduleGrid
+from model.site_table import SiteTable
+
+FRIDAY_TARGET = 3
+FRIDAY_RANGE = (2, 4)
+
+# Weights of the objective: coverage first, then Majorelle Fridays, then quotas
+UNFILLED_WEIGHT = 100
+FRIDAY_OUT_OF_RANGE_WEIGHT = 50
+FRIDAY_DEVIATION_WEIGHT = 10
+QUOTA_DEVIATION_WEIGHT = 1
+
+
+def evaluate_schedule(grid: ScheduleGrid, sites: SiteTable,
+                      quotas: Optional[Dict[int, int]] = None) -> Dict[str, float]:
+    """
+    Coverage and fairness metrics of an allocated schedule.
+    'score' aggregates them, lower is better.
+    """
+    filled = grid.slots[grid.slots != EMPTY]
+    slot_counts = np.bincount(filled, minlength=len(sites))
+    unfilled = int(grid.slots.size - filled.size)
+
+    fridays = grid.slots[grid.friday_mask()]
+    friday_counts = {site: int(np.count_nonzero((fridays == site).any(axis=1)))
+                     for site in sites.majorelle_ids()}
+    friday_out_of_range = sum(1 for count in friday_counts.values()
+                              if not FRIDAY_RANGE[0] <= count <= FRIDAY_RANGE[1])
+    friday_deviation = sum(abs(count - FRIDAY_TARGET) for count in friday_counts.values())
+
+    quota_deviation = 0
+    if quotas:
+        quota_deviation = int(sum(abs(int(slot_counts[site]) - quota) for site, quota in quotas.items()))
+
+    score = (UNFILLED_WEIGHT * unfilled
+             + FRIDAY_OUT_OF_RANGE_WEIGHT * friday_out_of_range
+             + FRIDAY_DEVIATION_WEIGHT * friday_deviation
+             + QUOTA_DEVIATION_WEIGHT * quota_deviation)
+
+    return {
+        'unfilled_slots': unfilled,
+        'friday_out_of_range': friday_out_of_range,
+        'friday_deviation': friday_deviation,
+        'quota_deviation': quota_deviation,
+        'score': score,
+    }
+
+
+def site_breakdown(grid: ScheduleGrid, sites: SiteTable,
+                   quotas: Optional[Dict[int, int]] = None) -> Dict[str, Dict[str, int]]:
+    """Per-site slots, quota, deviation from the quota and Fridays, keyed by site name"""
+    filled = grid.slots[grid.slots != EMPTY]
+    slot_counts = np.bincount(filled, minlength=len(sites))
+    fridays = grid.slots[grid.friday_mask()]
+    quotas = quotas or {}
+
+    breakdown = {}
+    for site in range(len(sites)):
+        quota = quotas.get(site, 0)
+        breakdown[sites.names[site]] = {
+            'slots': int(slot_counts[site]),
+            'quota': int(quota),
+            'quota_deviation': int(slot_counts[site]) - int(quota),
+            'fridays': int(np.count_nonzero((fridays == site).any(axis=1))),
+        }
+    return breakdown
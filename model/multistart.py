@@ -0,0 +1,82 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from model.metrics import evaluate_schedule
+from model.schedule_grid import ScheduleGrid
+from model.scheduler import ProgressCallback, ScheduleAllocator
+
+# Seconds between two progress reports while waiting for the runs
+PROGRESS_POLL = 0.5
+
+
+def run_allocation(config: Dict, working_days: List[date], seed: Optional[int] = None,
+                   optimize_time: Optional[float] = None) -> Tuple[ScheduleGrid, Dict[str, float]]:
+    """Run one allocation with its console log silenced and return the schedule with its metrics"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        allocator = ScheduleAllocator(config, working_days, seed=seed, optimize_time=optimize_time)
+        grid = allocator.allocate()
+    metrics = evaluate_schedule(grid, allocator.sites, allocator.quotas)
+    metrics['seed'] = seed
+    return grid, metrics
+
+
+def allocate_best_of(config: Dict, working_days: List[date], nb_starts: int,
+                     time_budget: Optional[float] = None, max_workers: Optional[int] = None,
+                     base_seed: int = 0, optimize_time: Optional[float] = None,
+                     progress_callback: Optional[ProgressCallback] = None
+                     ) -> Tuple[ScheduleGrid, Dict[str, float], List[Dict[str, float]]]:
+    """
+    Multi-start allocation: run the deterministic allocation plus nb_starts - 1 seeded
+    variants (randomized tie-breaks and sequence rotation) in a process pool and keep
+    the schedule with the lowest score.
+
+    Args:
+        nb_starts: Number of allocations to run, the first one is the deterministic one
+        time_budget: Wall-clock budget in seconds. Variants not finished in time are dropped
+        max_workers: Worker processes, all cores by default
+        optimize_time: Seconds of local search run on each variant (see ScheduleAllocator)
+        progress_callback: Called with ('multistart', fraction of the runs finished).
+            Raising from it cancels the remaining runs
+
+    Returns:
+        (best schedule, its metrics, metrics of every finished run)
+    """
+    seeds = [None] + [base_seed + i for i in range(1, nb_starts)]
+    deadline = time.monotonic() + time_budget if time_budget else None
+    max_workers = min(max_workers or os.cpu_count() or 1, len(seeds))
+
+    results = []
+    # spawn: the pool may be created from a thread of the Streamlit server
+    executor = ProcessPoolExecutor(max_workers=max_workers,
+                                   mp_context=multiprocessing.get_context("spawn"))
+    try:
+        pending = {executor.submit(run_allocation, config, working_days, seed, optimize_time)
+                   for seed in seeds}
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if progress_callback is not None:
+                # Wake up regularly so that the callback gets a chance to cancel
+                timeout = PROGRESS_POLL if timeout is None else min(timeout, PROGRESS_POLL)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            results.extend(future.result() for future in done)
+            if progress_callback is not None:
+                progress_callback('multistart', len(results) / len(seeds))
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if not results:
+        # Nothing finished within the budget: fall back to the deterministic allocation
+        results.append(run_allocation(config, working_days, optimize_time=optimize_time))
+
+    best_grid, best_metrics = min(
+        results, key=lambda r: (r[1]['score'], r[1]['seed'] is not None, r[1]['seed'] or 0)
+    )
+    return best_grid, best_metrics, [metrics for _, metrics in results]
@@ -0,0 +1,64 @@
+import contextlib
+import copy
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Dict, List, Optional
+
+from model.leave import LeaveCalendar
+from model.metrics import evaluate_schedule, site_breakdown
+from model.scheduler import ScheduleAllocator
+
+
+def apply_scenario(config: Dict, scenario: Dict) -> Dict:
+    """
+    Config of a scenario: a copy of config where scenario['holidays'] replaces the
+    holidays of the sites it lists ({site key: [dates or (start, end) intervals]}) and scenario['sites'] overrides
+    site settings ({site key: {setting: value}}).
+    """
+    scenario_config = copy.deepcopy(config)
+    for key, settings in scenario.get('sites', {}).items():
+        scenario_config['sites'][key].update(settings)
+    for key, holidays in scenario.get('holidays', {}).items():
+        scenario_config['sites'][key]['holidays'] = LeaveCalendar.from_config(holidays).to_config()
+    return scenario_config
+
+
+def evaluate_scenario(config: Dict, working_days: List[date]) -> Dict:
+    """Allocate one scenario (console log silenced) and return its comparison metrics"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        allocator = ScheduleAllocator(config, working_days)
+        grid = allocator.allocate()
+
+    metrics = evaluate_schedule(grid, allocator.sites, allocator.quotas)
+    metrics['coverage'] = 1 - metrics['unfilled_slots'] / grid.slots.size if grid.slots.size else 1.0
+    metrics['sites'] = site_breakdown(grid, allocator.sites, allocator.quotas)
+    return metrics
+
+
+def run_scenarios(config: Dict, working_days: List[date], scenarios: List[Dict],
+                  max_workers: Optional[int] = None) -> List[Dict]:
+    """
+    Allocate every scenario in parallel worker processes.
+
+    Args:
+        scenarios: Dicts with a 'name' and the changes of apply_scenario
+        max_workers: Worker processes, all cores by default
+
+    Returns:
+        One dict per scenario, in the input order: its name and the metrics of evaluate_scenario
+    """
+    if not scenarios:
+        return []
+
+    configs = [apply_scenario(config, scenario) for scenario in scenarios]
+    max_workers = min(max_workers or os.cpu_count() or 1, len(configs))
+
+    # spawn: the pool may be created from a thread of the Streamlit server
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        results = list(executor.map(evaluate_scenario, configs, [working_days] * len(configs)))
+
+    return [dict(result, name=scenario['name']) for scenario, result in zip(scenarios, results)]
@@ -0,0 +1,96 @@
+import re
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+EMPTY = -1
+
+# Schedule tables have a Date column then one "Affectation <n>" column per daily slot
+SLOT_COLUMN_PATTERN = re.compile(r"^Affectation (\d+)$")
+
+
+def slot_column(slot: int) -> str:
+    """Table column of a slot (0-based)"""
+    return f"Affectation {slot + 1}"
+
+
+def slot_columns(columns: Iterable[str]) -> List[str]:
+    """The slot columns among columns, in slot order"""
+    numbered = [(int(match.group(1)), column) for column in columns
+                if (match := SLOT_COLUMN_PATTERN.match(str(column)))]
+    return [column for _, column in sorted(numbered)]
+
+
+class ScheduleGrid:
+    """Schedule stored as a (days, nb_vacations) array of site IDs, EMPTY for unfilled slots"""
+
+    __slots__ = ('days', 'day_index', 'weekdays', 'slots', 'names')
+
+    def __init__(self, days: Sequence[date], nb_vacations: int, names: Sequence[str]):
+        self.days: List[date] = list(days)
+        self.day_index: Dict[date, int] = {day: row for row, day in enumerate(self.days)}
+        self.weekdays = np.array([day.weekday() for day in self.days], dtype=np.int8)
+        self.slots = np.full((len(self.days), nb_vacations), EMPTY, dtype=np.int32)
+        self.names: List[str] = list(names)
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    @property
+    def nb_vacations(self) -> int:
+        return self.slots.shape[1]
+
+    def friday_mask(self) -> np.ndarray:
+        return self.weekdays == 4
+
+    def rows_with_empty(self) -> np.ndarray:
+        return np.flatnonzero((self.slots == EMPTY).any(axis=1))
+
+    def first_slot(self, row: int, site_id: int) -> Optional[int]:
+        hits = np.flatnonzero(self.slots[row] == site_id)
+        return int(hits[0]) if hits.size else None
+
+    def swap(self, row_a: int, slot_a: int, row_b: int, slot_b: int):
+        self.slots[row_a, slot_a], self.slots[row_b, slot_b] = \
+            self.slots[row_b, slot_b], self.slots[row_a, slot_a]
+
+    def site_names(self, row: int) -> List[Optional[str]]:
+        return [self.names[site] if site != EMPTY else None for site in self.slots[row].tolist()]
+
+    def items(self) -> Iterator[Tuple[date, List[Optional[str]]]]:
+        """Iterate like dict.items() over {day: [site names]}, in day order"""
+        for row, day in enumerate(self.days):
+            yield day, self.site_names(row)
+
+
+class SiteDayIndex:
+    """Per-site sets of the Friday and non-Friday rows a site occupies, kept in sync on swaps"""
+
+    def __init__(self, grid: ScheduleGrid):
+        self.grid = grid
+        self._is_friday = grid.friday_mask().tolist()
+        self.fridays: Dict[int, Set[int]] = defaultdict(set)
+        self.others: Dict[int, Set[int]] = defaultdict(set)
+
+        rows, cols = np.nonzero(grid.slots != EMPTY)
+        for row, site in zip(rows.tolist(), grid.slots[rows, cols].tolist()):
+            self._rows_for(row)[site].add(row)
+
+    def _rows_for(self, row: int) -> Dict[int, Set[int]]:
+        return self.fridays if self._is_friday[row] else self.others
+
+    def friday_count(self, site_id: int) -> int:
+        """Number of Fridays on which the site holds at least one slot"""
+        return len(self.fridays[site_id])
+
+    def refresh(self, row: int, site_ids: Iterable[int]):
+        """Re-sync the given sites after the content of a row changed"""
+        present = set(self.grid.slots[row].tolist())
+        rows_by_site = self._rows_for(row)
+        for site in site_ids:
+            if site in present:
+                rows_by_site[site].add(row)
+            else:
+                rows_by_site[site].discard(row)
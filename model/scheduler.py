@@ -1,468 +1,580 @@
-from collections import defaultdict
+import random
+import time
+from contextlib import contextmanager
 from datetime import date
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
+import numpy as np
+
+from model.schedule_grid import EMPTY, ScheduleGrid, SiteDayIndex
+from model.site_table import SiteTable
 from model.validator import ScheduleValidator
-from model.sequence import SequenceGenerator
+from model.sequence import SequenceGenerator, SiteQueue
 from model.majorelle import MajorelleManager
-from utils.tools import get_site_key_from_name
+from model.local_search import LocalSearchOptimizer
+from model.feasibility import FeasibilityReport, analyze_feasibility
+from model.metrics import FRIDAY_RANGE
+
+# Bump on any change of the allocation output: cached results are keyed on it
+ALGORITHM_VERSION = "2026.10-6"
+
+# Longest chain of displaced sites tried to place a leftover site in backfilling
+BACKFILL_MAX_DEPTH = 3
+
+# Phases in execution order, as reported to the progress callback
+PHASES = ('fridays', 'sequence', 'main_allocation', 'backfilling', 'rebalance', 'optimize')
+
+# progress_callback(phase, fraction of the phase done). Raising from it aborts allocate()
+ProgressCallback = Callable[[str, float], None]
 
 
 class ScheduleAllocator:
     """Classe principale pour l'allocation du planning"""
 
-    def __init__(self, config: Dict, working_days: List[date]):
-        self.config = config['sites']
+    def __init__(self, config: Dict, working_days: List[date], seed: Optional[int] = None,
+                 optimize_time: Optional[float] = None,
+                 progress_callback: Optional[ProgressCallback] = None):
+        self.sites = SiteTable(config['sites'])
         self.nb_vacations = config.get('nb_vacations', 2)
         self.working_days = working_days
         self.total_slots = len(working_days) * self.nb_vacations
-        self.schedule = defaultdict(list)
-
-        self.majorelle_sites = [k for k in self.config if k.startswith('majorelle_')]
-        self.majorelle_manager = MajorelleManager(self.majorelle_sites, self.config)
-        self.constraint_validator = ScheduleValidator(self.config)
-
-    def allocate(self) -> Dict[date, List[str]]:
+        self.schedule = ScheduleGrid(working_days, self.nb_vacations, self.sites.names)
+        # availability[site, row], shared by the quotas and the backfilling
+        self.availability = self.sites.availability(working_days)
+        # Slots each site got above (+) or below (-) its share in past quarters, by site key
+        # (ScheduleStorage.get_history_deviation): the quotas make up for it when set
+        deviation = config.get('history_deviation')
+        self.history_offsets = np.array([float(deviation.get(key, 0)) for key in self.sites.keys]) \
+            if deviation else None
+
+        self.majorelle_sites = self.sites.majorelle_ids()
+        self.majorelle_manager = MajorelleManager(self.sites)
+        self.constraint_validator = ScheduleValidator(self.sites)
+        self.phase_timings: Dict[str, float] = {}
+        self.quotas: Dict[int, int] = {}
+
+        # A seed randomizes tie-breaks and rotates the sequence (multi-start); None keeps
+        # the deterministic key order
+        self.seed = seed
+        self._rng = random.Random(seed) if seed is not None else None
+
+        # Seconds of local search after the rebalance, None or 0 skips the phase
+        self.optimize_time = optimize_time
+        self.optimize_stats: Dict[str, float] = {}
+
+        self.progress_callback = progress_callback
+        self.feasibility: Optional[FeasibilityReport] = None
+
+    def allocate(self) -> ScheduleGrid:
         print('Total slots to allocate:', self.total_slots)
 
         if self.total_slots <= 0:
             return self.schedule
 
         # Phase 1: Pre-allocation of fridays for Majorelle
-        self.majorelle_manager.allocate_fridays(self.working_days)
+        with self._timed('fridays'):
+            self.majorelle_manager.allocate_fridays(self.working_days)
 
         # Phase 2: Compute quotas and create sequence
-        quotas = self._calculate_quotas()
-        seq = SequenceGenerator.generate_sequence(quotas, self.config)
+        with self._timed('sequence'):
+            self.quotas = self._calculate_quotas()
+            self._relax_infeasible_quotas()
+            seq = self._generate_sequence(self.quotas)
 
         # Phase 3: main allocation
-        self._main_allocation(seq)
+        with self._timed('main_allocation'):
+            self._main_allocation(seq)
 
         # Phase 4: Backfilling
-        self._backfilling(seq)
+        with self._timed('backfilling'):
+            self._backfilling(seq)
 
         # Phase 5: Rebalance fridays
-        self._rebalance_majorelle_fridays()
+        with self._timed('rebalance'):
+            self._rebalance_majorelle_fridays()
+
+        # Phase 6: optional local search
+        if self.optimize_time:
+            with self._timed('optimize'):
+                self._optimize()
 
         return self.schedule
 
-    def _calculate_quotas(self) -> Dict[str, int]:
-        quotas = SequenceGenerator.calculate_quotas(self.config, self.total_slots)
-        quotas = SequenceGenerator.adjust_for_paired_sites(quotas, self.config,
-                                                         self.total_slots)
+    @contextmanager
+    def _timed(self, phase: str):
+        """Record the wall time of an allocation phase in self.phase_timings (seconds)"""
+        self._report(phase, 0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_timings[phase] = time.perf_counter() - start
+        self._report(phase, 1.0)
+
+    def _report(self, phase: str, fraction: float):
+        if self.progress_callback is not None:
+            self.progress_callback(phase, fraction)
+
+    def _optimize(self):
+        print("\n=== Phase d'optimisation locale ===")
+        optimizer = LocalSearchOptimizer(self.schedule, self.sites, self.constraint_validator, seed=self.seed)
+        self.optimize_stats = optimizer.optimize(
+            self.optimize_time,
+            progress_callback=lambda fraction: self._report('optimize', fraction)
+        )
+        print(f"Score: {self.optimize_stats['initial_score']} → {self.optimize_stats['final_score']} "
+              f"({self.optimize_stats['accepted']} échanges acceptés sur {self.optimize_stats['moves']} essais)")
+
+    def _generate_sequence(self, quotas: Dict[int, int]) -> List[int]:
+        if self._rng is None:
+            return SequenceGenerator.generate_sequence(quotas, self.sites)
+
+        tie_break = list(range(len(self.sites)))
+        self._rng.shuffle(tie_break)
+        seq = SequenceGenerator.generate_sequence(quotas, self.sites, tie_break)
+        if seq:
+            shift = self._rng.randrange(len(seq))
+            seq = seq[shift:] + seq[:shift]
+        return seq
+
+    def _calculate_quotas(self) -> Dict[int, int]:
+        quotas = SequenceGenerator.calculate_quotas(self.sites, self.total_slots, self.availability,
+                                                    self.nb_vacations, self.history_offsets)
+        quotas = SequenceGenerator.adjust_for_paired_sites(quotas, self.sites, self.total_slots,
+                                                         self.availability, self.nb_vacations)
         return quotas
 
-    def _main_allocation(self, seq: List[str]):
-        for day in self.working_days:
-            if len(seq) == 0:
+    def check_feasibility(self) -> FeasibilityReport:
+        """Max-flow check of the quotas against the sites' availability, without allocating"""
+        if not self.quotas:
+            self.quotas = self._calculate_quotas()
+        self.feasibility = analyze_feasibility(self.sites, self.working_days, self.quotas, self.nb_vacations)
+        return self.feasibility
+
+    def _relax_infeasible_quotas(self):
+        """Cap the quotas that no allocation can place, so that they are not chased in backfilling"""
+        if self.check_feasibility().is_feasible:
+            return
+
+        print("\n=== Contraintes impossibles à satisfaire ===")
+        for message in self.feasibility.warnings():
+            print(f"  {message}")
+
+        capped = self.feasibility.capped_quotas()
+        for site, quota in capped.items():
+            if self.sites.paired[site]:
+                # Paired sites always take every slot of a day
+                capped[site] = quota - quota % self.nb_vacations
+        self.quotas = capped
+
+    def _main_allocation(self, seq: List[int]):
+        queue = SiteQueue(seq)
+        for row, day in enumerate(self.working_days):
+            if len(queue) == 0:
                 print(f"No more slots available for day {day}")
                 break
 
-            first_site, second_site = self._allocate_day(day, seq)
+            day_sites = self._allocate_day(day, queue)
+            self.schedule.slots[row, :len(day_sites)] = day_sites
 
-            assignments = [self.config[first_site]['name'] if first_site else None,
-                           self.config[second_site]['name'] if second_site else None]
-            self.schedule[day] = assignments
+        # The backfilling works on what is left, in sequence order
+        seq[:] = queue.to_list()
 
-    def _allocate_day(self, day: date, seq: List[str]) -> Tuple[Optional[str], Optional[str]]:
+    def _allocate_day(self, day: date, queue: SiteQueue) -> List[int]:
+        """Sites of the first slots of the day, in slot order: the other slots stay empty"""
         is_friday = day.weekday() == 4
 
         majorelle_for_today = self.majorelle_manager.should_place_majorelle_on_friday(day)
 
-        first_site, idx_first = self._find_first_site(day, seq,
-                                                      majorelle_for_today, is_friday)
+        first_site = self._find_first_site(day, queue, majorelle_for_today, is_friday)
 
         if first_site is None:
-            return None, None
-
-        seq.pop(idx_first)
+            return []
 
-        if is_friday and first_site in self.majorelle_sites:
+        if is_friday and self.sites.majorelle[first_site]:
             self.majorelle_manager.increment_friday_count(first_site)
 
-        second_site = self._find_second_site(first_site, day, seq, is_friday)
-
-        return first_site, second_site
+        day_sites = [first_site]
+        day_families = {self.sites.family[first_site]}
+        while len(day_sites) < self.nb_vacations:
+            site = self._find_next_site(first_site, day_families, day, queue, is_friday)
+            if site is None:
+                break
+            day_sites.append(site)
+            day_families.add(self.sites.family[site])
+
+        return day_sites
+
+    def _keeps_friday_slots(self, site: int, day: date, queue: SiteQueue, is_friday: bool,
+                            warn: bool = False) -> bool:
+        """Whether a Majorelle site keeps enough slots in the sequence for its pre-allocated Fridays"""
+        if not self.sites.majorelle[site]:
+            return True
+
+        if is_friday and day in self.majorelle_manager.friday_allocation.get(site, []):
+            # On peut le placer même s'il ne reste qu'1 slot
+            return True
+
+        remaining_occurrences = queue.count(site)
+        future_fridays = self.majorelle_manager.get_future_friday_count(site, day, False)
+        if remaining_occurrences <= future_fridays:
+            if warn and not is_friday:
+                print(f"  ⚠️ {self.sites.names[site]}: {remaining_occurrences} slots restants "
+                      f"mais {future_fridays} vendredis futurs → réservation")
+            return False
+        return True
 
-    def _find_first_site(self, day: date, seq: List[str],
-                         majorelle_for_today: Optional[str],
-                         is_friday: bool) -> Tuple[Optional[str], Optional[int]]:
+    def _find_first_site(self, day: date, queue: SiteQueue,
+                         majorelle_for_today: Optional[int],
+                         is_friday: bool) -> Optional[int]:
 
-        if majorelle_for_today and majorelle_for_today in seq:
-            for i, site in enumerate(seq):
-                if site == majorelle_for_today:
-                    return site, i
+        if majorelle_for_today is not None and queue.take(majorelle_for_today):
+            return majorelle_for_today
 
-        for i, site in enumerate(seq):
+        def accept(site: int) -> bool:
             if is_friday and not self.majorelle_manager.can_place_on_friday(site):
-                continue
-
-            if site in self.majorelle_sites:
-                remaining_occurrences = seq.count(site)
-
-                if is_friday:
-                    if day in self.majorelle_manager.friday_allocation.get(site, []):
-                        # On peut le placer même s'il ne reste qu'1 slot
-                        pass
-                    else:
-                        future_fridays = self.majorelle_manager.get_future_friday_count(site, day, False)
-                        if remaining_occurrences <= future_fridays:
-                            continue
-                else:
-                    future_fridays = self.majorelle_manager.get_future_friday_count(site, day, False)
-                    if remaining_occurrences <= future_fridays:
-                        print(f"  ⚠️ {self.config[site]['name']}: {remaining_occurrences} slots restants "
-                              f"mais {future_fridays} vendredis futurs → réservation")
-                        continue
-
-            if self.constraint_validator.is_available(site, day):
-                return site, i
+                return False
+            if not self._keeps_friday_slots(site, day, queue, is_friday, warn=True):
+                return False
+            return self.constraint_validator.is_available(site, day)
 
-        return None, None
+        return queue.take_first(accept)
 
-    def _find_second_site(self, first_site: str, day: date,
-                          seq: List[str], is_friday: bool) -> Optional[str]:
-        if self.config[first_site].get("pair_same_day", False):
-            for i, site in enumerate(seq):
-                if site == first_site:
-                    seq.pop(i)
-                    return site
-            print(f"Warning: no more occurence of {first_site} found")
+    def _find_next_site(self, first_site: int, day_families: Set[int], day: date,
+                        queue: SiteQueue, is_friday: bool) -> Optional[int]:
+        if self.sites.paired[first_site]:
+            if queue.take(first_site):
+                return first_site
+            print(f"Warning: no more occurence of {self.sites.keys[first_site]} found")
             return None
-        else:
-            for i, site in enumerate(seq):
-                if is_friday and not self.majorelle_manager.can_place_on_friday(site):
-                    continue
-
-                if site in self.majorelle_sites:
-                    remaining_occurrences = seq.count(site)
-
-                    if is_friday:
-                        if day in self.majorelle_manager.friday_allocation.get(site, []):
-                            pass
-                        else:
-                            future_fridays = self.majorelle_manager.get_future_friday_count(site, day, False)
-                            if remaining_occurrences <= future_fridays:
-                                continue
-                    else:
-                        future_fridays = self.majorelle_manager.get_future_friday_count(site, day, False)
-                        if remaining_occurrences <= future_fridays:
-                            continue
 
-                if (self.constraint_validator.validate_second_site(first_site, site) and
-                        self.constraint_validator.is_available(site, day)):
-
-                    if is_friday and site in self.majorelle_sites:
-                        self.majorelle_manager.increment_friday_count(site)
-                    seq.pop(i)
-                    return site
+        def accept(site: int) -> bool:
+            if is_friday and not self.majorelle_manager.can_place_on_friday(site):
+                return False
+            if not self._keeps_friday_slots(site, day, queue, is_friday):
+                return False
+            return (self.constraint_validator.validate_next_site(first_site, day_families, site) and
+                    self.constraint_validator.is_available(site, day))
 
-            return None
+        site = queue.take_first(accept)
+        if site is not None and is_friday and self.sites.majorelle[site]:
+            self.majorelle_manager.increment_friday_count(site)
+        return site
 
-    def _backfilling(self, seq: List[str]):
+    def _backfilling(self, seq: List[int]):
         print("\n=== Backfilling stage===")
-        print(f"Remaining sites in seq: {len(seq)} ({seq})")
+        print(f"Remaining sites in seq: {len(seq)} ({[self.sites.keys[s] for s in seq]})")
+
+        # The backfilling keeps its own Friday counts, displaced sites included
+        self._is_friday = self.schedule.friday_mask().tolist()
+        fridays = self.schedule.slots[self.schedule.friday_mask()]
+        self._friday_counts = np.bincount(fridays[fridays != EMPTY], minlength=len(self.sites)).tolist()
 
         print("\nVendredis alloués aux sites Majorelle avant backfilling:")
         for site in self.majorelle_sites:
-            count = self.majorelle_manager.get_friday_count(site)
-            print(f"  {self.config[site]['name']}: {count} vendredis")
+            print(f"  {self.sites.names[site]}: {self._friday_counts[site]} vendredis")
 
-        none_counts = {day: self.schedule[day].count(None) for day in self.schedule}
-        days_with_none = [day for day in self.schedule if none_counts[day] > 0]
+        days_with_none = self.schedule.rows_with_empty()
 
-        if not days_with_none or not seq:
+        if not days_with_none.size or not seq:
             return
 
         print(f"Number of days with None: {len(days_with_none)}")
-        print("Note: Durant le backfilling, les sites Majorelle peuvent avoir 3-5 vendredis (flexibilité ±1)")
+        print(f"Note: Durant le backfilling, les sites Majorelle restent entre "
+              f"{FRIDAY_RANGE[0]} et {FRIDAY_RANGE[1]} vendredis")
+
+        # Sites with no augmenting path, valid until the next change of the schedule
+        unplaceable = set()
 
         remaining_seq = seq.copy()
-        for site_to_place in remaining_seq:
-            if not site_to_place:
+        for i, site_to_place in enumerate(remaining_seq):
+            if site_to_place is None:
                 continue
+            self._report('backfilling', i / len(remaining_seq))
 
-            self._try_place_site_backfilling(site_to_place, days_with_none, seq)
-
-        final_none_counts = {day: self.schedule[day].count(None) for day in self.working_days}
-        total_none = sum(final_none_counts.values())
-        print(f"\n=== Final result: {total_none} remaining None, {len(seq)} unassigned sites in seq ===")
-
-    def _try_place_site_backfilling(self, site_to_place: str,
-                                    days_with_none: List[date], seq: List[str]):
-        print(f"\nTrying to place: {site_to_place} ({self.config[site_to_place]['name']})")
-
-        if site_to_place in self.majorelle_sites:
-            current_fridays = self.majorelle_manager.get_friday_count(site_to_place)
-            print(f"  (Site Majorelle avec {current_fridays} vendredis actuellement)")
-
-        for problem_day in days_with_none:
-            for slot_idx in range(len(self.schedule[problem_day])):
-                if self.schedule[problem_day][slot_idx] is not None:
-                    continue
-
-                if self._find_swap_for_backfilling(site_to_place, problem_day,
-                                                   slot_idx, seq):
-                    return
-
-        print(f"  ⚠️ Unable to place {self.config[site_to_place]['name']}")
-
-    def _find_swap_for_backfilling(self, site_to_place: str, problem_day: date,
-                                   slot_idx: int, seq: List[str]) -> bool:
-        for swap_day in self.working_days:
-            if swap_day >= problem_day or self._day_contains_paired_site(swap_day):
+            if site_to_place in unplaceable:
+                print(f"\n  ⚠️ Unable to place {self.sites.names[site_to_place]} (déjà tenté)")
                 continue
+            if self._try_place_site_backfilling(site_to_place, seq):
+                unplaceable.clear()
+            else:
+                unplaceable.add(site_to_place)
 
-            for swap_slot_idx in range(len(self.schedule[swap_day])):
-                site_name_to_swap = self.schedule[swap_day][swap_slot_idx]
-                if site_name_to_swap is None:
-                    continue
+        total_none = int(np.count_nonzero(self.schedule.slots == EMPTY))
+        print(f"\n=== Final result: {total_none} remaining None, {len(seq)} unassigned sites in seq ===")
 
-                site_key_to_swap = get_site_key_from_name(self.config, site_name_to_swap)
-                if site_key_to_swap is None:
-                    continue
+    def _try_place_site_backfilling(self, site_to_place: int, seq: List[int]) -> bool:
+        print(f"\nTrying to place: {self.sites.keys[site_to_place]} ({self.sites.names[site_to_place]})")
 
-                if self._validate_backfilling_swap(site_to_place, site_key_to_swap,
-                                                   problem_day, swap_day,
-                                                   slot_idx, swap_slot_idx):
-                    self._execute_swap(site_to_place, site_key_to_swap,
-                                       site_name_to_swap, problem_day, swap_day,
-                                       slot_idx, swap_slot_idx, seq)
-                    return True
+        if self.sites.majorelle[site_to_place]:
+            print(f"  (Site Majorelle avec {self._friday_counts[site_to_place]} vendredis actuellement)")
 
-        return False
+        chain = self._find_augmenting_path(site_to_place)
+        if chain is None:
+            print(f"  ⚠️ Unable to place {self.sites.names[site_to_place]}")
+            return False
 
-    def _day_contains_paired_site(self, day: date) -> bool:
-        day_schedule = self.schedule[day]
-        for site_name in day_schedule:
-            if site_name:
-                site_key = get_site_key_from_name(self.config, site_name)
-                if site_key and self.config[site_key].get("pair_same_day", False):
-                    return True
-        return False
+        self._execute_chain(chain, seq)
+        return True
+
+    def _find_augmenting_path(self, site_to_place: int) -> Optional[List[Tuple[int, int, int]]]:
+        """
+        BFS over move chains: site_to_place takes a slot, the site it displaces takes another
+        slot, and so on until a site lands in an empty slot. Returns the shortest chain found
+        (at most BACKFILL_MAX_DEPTH displaced sites) as [(site, row, slot)] moves, or None.
+        """
+        if self.sites.paired[site_to_place]:
+            # A paired site needs a whole day: no single-slot move can place it
+            return None
 
-    def _validate_backfilling_swap(self, site_to_place: str, site_to_swap: str,
-                                   problem_day: date, swap_day: date,
-                                   slot_idx: int, swap_slot_idx: int) -> bool:
+        slots = self.schedule.slots
+        # parent[site] = (site that displaces it, row, slot) ; the chain is read back from the hole
+        parent = {site_to_place: None}
+        frontier = [site_to_place]
+
+        for depth in range(BACKFILL_MAX_DEPTH + 1):
+            next_frontier = []
+            for mover in frontier:
+                chain_rows = self._chain_rows(parent, mover)
+                for row in np.flatnonzero(self.availability[mover]).tolist():
+                    if row in chain_rows:
+                        continue
+                    day_sites = slots[row].tolist()
+                    for slot, occupant in enumerate(day_sites):
+                        if occupant != EMPTY and (depth == BACKFILL_MAX_DEPTH or occupant in parent
+                                                  or self.sites.paired[occupant]):
+                            continue
+                        if not self._can_take_slot(mover, row, slot, day_sites):
+                            continue
+                        if occupant == EMPTY:
+                            return self._read_chain(parent, mover, row, slot)
+                        parent[occupant] = (mover, row, slot)
+                        next_frontier.append(occupant)
+            frontier = next_frontier
+            if not frontier:
+                break
 
-        if not self.constraint_validator.is_available(site_to_swap, problem_day):
-            return False
-        if not self.constraint_validator.is_available(site_to_place, swap_day):
-            return False
+        return None
 
+    def _can_take_slot(self, site: int, row: int, slot: int, day_sites: List[int]) -> bool:
+        """Whether site can replace the occupant of (row, slot), the other slots of the day unchanged"""
+        for other_slot, other in enumerate(day_sites):
+            if other_slot == slot or other == EMPTY:
+                continue
+            if self.sites.paired[other] or self.sites.same_family(site, other):
+                return False
 
-        if swap_day.weekday() == 4 and site_to_place in self.majorelle_sites:
-            if self.majorelle_manager.get_friday_count(site_to_place) >= 5:
+        if self._is_friday[row]:
+            # Majorelle sites stay within FRIDAY_RANGE Fridays, whether they arrive or leave
+            if self.sites.majorelle[site] and self._friday_counts[site] >= FRIDAY_RANGE[1]:
                 return False
-        if problem_day.weekday() == 4 and site_to_swap in self.majorelle_sites:
-            if self.majorelle_manager.get_friday_count(site_to_swap) >= 5:
+            occupant = day_sites[slot]
+            if occupant != EMPTY and self.sites.majorelle[occupant] \
+                    and self._friday_counts[occupant] <= FRIDAY_RANGE[0]:
                 return False
-
-        return self.constraint_validator.validate_swap(
-            site_to_place, self.config[site_to_swap]['name'],
-            self.schedule[problem_day], self.schedule[swap_day],
-            slot_idx, swap_slot_idx
-        )
-
-    def _execute_swap(self, site_to_place: str, site_key_to_swap: str,
-                      site_name_to_swap: str, problem_day: date, swap_day: date,
-                      slot_idx: int, swap_slot_idx: int, seq: List[str]):
-        print(f"  Exchange found:")
-        print(f"    - {self.config[site_to_place]['name']} to {swap_day.strftime('%Y-%m-%d')} "
-              f"({'Vendredi' if swap_day.weekday() == 4 else 'autre jour'})")
-        print(f"    - {site_name_to_swap} from {swap_day.strftime('%Y-%m-%d')} to "
-              f"{problem_day.strftime('%Y-%m-%d')} "
-              f"({'Vendredi' if problem_day.weekday() == 4 else 'autre jour'})")
-
-        if swap_day.weekday() == 4 and site_to_place in self.majorelle_sites:
-            self.majorelle_manager.increment_friday_count(site_to_place)
-            count = self.majorelle_manager.get_friday_count(site_to_place)
-            print(f"    → {self.config[site_to_place]['name']} a maintenant {count} vendredis")
-
-        if problem_day.weekday() == 4 and site_key_to_swap in self.majorelle_sites:
-            self.majorelle_manager.increment_friday_count(site_key_to_swap)
-            count = self.majorelle_manager.get_friday_count(site_key_to_swap)
-            print(f"    → {self.config[site_key_to_swap]['name']} a maintenant {count} vendredis")
-
-        self.schedule[problem_day][slot_idx] = site_name_to_swap
-        self.schedule[swap_day][swap_slot_idx] = self.config[site_to_place]['name']
-        seq.remove(site_to_place)
+        return True
+
+    @staticmethod
+    def _chain_rows(parent: Dict, site: int) -> Set[int]:
+        """Rows already rewritten by the chain leading to site"""
+        rows = set()
+        step = parent[site]
+        while step is not None:
+            previous, row, _ = step
+            rows.add(row)
+            step = parent[previous]
+        return rows
+
+    @staticmethod
+    def _read_chain(parent: Dict, last_site: int, row: int, slot: int) -> List[Tuple[int, int, int]]:
+        chain = [(last_site, row, slot)]
+        step = parent[last_site]
+        while step is not None:
+            chain.append(step)
+            step = parent[step[0]]
+        chain.reverse()
+        return chain
+
+    def _execute_chain(self, chain: List[Tuple[int, int, int]], seq: List[int]):
+        print(f"  Exchange found ({len(chain) - 1} déplacement(s)):")
+        for site, row, slot in chain:
+            day = self.schedule.days[row]
+            displaced = int(self.schedule.slots[row, slot])
+            origin = f" (remplace {self.sites.names[displaced]})" if displaced != EMPTY else " (créneau vide)"
+            print(f"    - {self.sites.names[site]} to {day.strftime('%Y-%m-%d')} "
+                  f"({'Vendredi' if self._is_friday[row] else 'autre jour'}){origin}")
+
+            if self._is_friday[row]:
+                self._friday_counts[site] += 1
+                if displaced != EMPTY:
+                    self._friday_counts[displaced] -= 1
+                if self.sites.majorelle[site]:
+                    print(f"    → {self.sites.names[site]} a maintenant {self._friday_counts[site]} vendredis")
+
+            self.schedule.slots[row, slot] = site
+
+        seq.remove(chain[0][0])
 
     def _rebalance_majorelle_fridays(self):
         print("\n=== Phase de rééquilibrage des vendredis Majorelle ===")
 
-        majorelle_friday_count = self._count_majorelle_fridays()
+        self._day_index = SiteDayIndex(self.schedule)
 
         print("Compte initial des vendredis:")
         for site in self.majorelle_sites:
-            print(f"  {self.config[site]['name']}: {majorelle_friday_count[site]} vendredis")
+            print(f"  {self.sites.names[site]}: {self._day_index.friday_count(site)} vendredis")
 
         sites_under = [site for site in self.majorelle_sites
-                       if majorelle_friday_count[site] < 3]
+                       if self._day_index.friday_count(site) < 3]
 
         if not sites_under:
             self._print_final_friday_verification()
             return
 
         print(f"\nSites Majorelle avec moins de 3 vendredis: "
-              f"{[self.config[s]['name'] for s in sites_under]}")
+              f"{[self.sites.names[s] for s in sites_under]}")
 
         for site_under in sites_under:
-            self._rebalance_single_site(site_under, majorelle_friday_count)
+            self._rebalance_single_site(site_under)
 
         self._print_final_friday_verification()
 
-    def _count_majorelle_fridays(self) -> Dict[str, int]:
-        counts = {}
-        for site in self.majorelle_sites:
-            count = 0
-            for day in self.working_days:
-                if day.weekday() == 4 and self.config[site]['name'] in self.schedule[day]:
-                    count += 1
-            counts[site] = count
-        return counts
-
-    def _rebalance_single_site(self, site_under: str,
-                               majorelle_friday_count: Dict[str, int]):
-        while majorelle_friday_count[site_under] < 3:
+    def _rebalance_single_site(self, site_under: int):
+        # Donors with no valid exchange left. An exchange only rewrites one Friday row
+        # and one row leaving the receiver, so a donor can only get new options when it
+        # sits on the rewritten Friday: no need to rescan every donor after each swap.
+        exhausted = set()
+
+        while self._day_index.friday_count(site_under) < 3:
             # Priorité 1: Swap with non-Majorelle sites
-            if self._try_rebalance_with_non_majorelle(site_under, majorelle_friday_count):
+            if self._try_rebalance_with_non_majorelle(site_under, exhausted):
                 continue
 
             # Priorité 2: Swap with Majorelle
-            if self._try_rebalance_with_majorelle(site_under, majorelle_friday_count):
+            if self._try_rebalance_with_majorelle(site_under, exhausted):
                 continue
 
-            print(f"\n⚠ Impossible de rééquilibrer {self.config[site_under]['name']} "
-                  f"(reste à {majorelle_friday_count[site_under]} vendredis)")
+            print(f"\n⚠ Impossible de rééquilibrer {self.sites.names[site_under]} "
+                  f"(reste à {self._day_index.friday_count(site_under)} vendredis)")
             break
 
-    def _try_rebalance_with_non_majorelle(self, site_under: str,
-                                          majorelle_friday_count: Dict[str, int]) -> bool:
-        non_majorelle_sites = [s for s in self.config.keys()
-                               if s not in self.majorelle_sites]
+    def _try_rebalance_with_non_majorelle(self, site_under: int, exhausted: Set[int]) -> bool:
+        non_majorelle_sites = [s for s in range(len(self.sites))
+                               if not self.sites.majorelle[s]]
 
         print(f"\n  Tentative d'échange avec des sites NON-Majorelle pour "
-              f"{self.config[site_under]['name']}...")
+              f"{self.sites.names[site_under]}...")
 
         for donor_site in non_majorelle_sites:
-            if self._execute_rebalance_exchange(site_under, donor_site,
-                                                majorelle_friday_count, False):
+            if self._execute_rebalance_exchange(site_under, donor_site, exhausted, False):
                 return True
         return False
 
-    def _try_rebalance_with_majorelle(self, site_under: str,
-                                      majorelle_friday_count: Dict[str, int]) -> bool:
+    def _try_rebalance_with_majorelle(self, site_under: int, exhausted: Set[int]) -> bool:
         print(f"\n  Pas d'échange trouvé avec les NON-Majorelle, "
               f"tentative avec les sites Majorelle...")
 
+        friday_count = self._day_index.friday_count
         donor_candidates = [s for s in self.majorelle_sites
-                            if majorelle_friday_count[s] >= 3 and s != site_under]
-        donor_candidates.sort(key=lambda s: -majorelle_friday_count[s])
+                            if friday_count(s) >= 3 and s != site_under]
+        donor_candidates.sort(key=lambda s: -friday_count(s))
 
         for donor_site in donor_candidates:
-            if self._execute_rebalance_exchange(site_under, donor_site,
-                                                majorelle_friday_count, True):
+            if self._execute_rebalance_exchange(site_under, donor_site, exhausted, True):
                 return True
         return False
 
-    def _execute_rebalance_exchange(self, receiver_site: str, donor_site: str,
-                                    majorelle_friday_count: Dict[str, int],
-                                    is_majorelle_donor: bool) -> bool:
-        for day in self.working_days:
-            if day.weekday() != 4:
-                continue
-
-            if self.config[donor_site]['name'] not in self.schedule[day]:
-                continue
+    def _execute_rebalance_exchange(self, receiver_site: int, donor_site: int,
+                                    exhausted: Set[int], is_majorelle_donor: bool) -> bool:
+        if donor_site in exhausted:
+            return False
 
-            donor_slot = self.schedule[day].index(self.config[donor_site]['name'])
+        days = self.schedule.days
+        is_available = self.constraint_validator.is_available
+        donor_fridays = [row for row in sorted(self._day_index.fridays[donor_site])
+                         if is_available(receiver_site, days[row])]
+        receiver_days = [row for row in sorted(self._day_index.others[receiver_site])
+                         if is_available(donor_site, days[row])]
 
-            for swap_day in self.working_days:
-                if swap_day.weekday() == 4:
-                    continue
+        for friday_row in donor_fridays:
+            donor_slot = self.schedule.first_slot(friday_row, donor_site)
 
-                if self.config[receiver_site]['name'] not in self.schedule[swap_day]:
-                    continue
-
-                receiver_slot = self.schedule[swap_day].index(
-                    self.config[receiver_site]['name']
-                )
+            for swap_row in receiver_days:
+                receiver_slot = self.schedule.first_slot(swap_row, receiver_site)
 
                 if not self._validate_rebalance_exchange(
-                        receiver_site, donor_site, day, swap_day,
+                        receiver_site, donor_site, friday_row, swap_row,
                         donor_slot, receiver_slot
                 ):
                     continue
 
                 self._perform_rebalance_exchange(
-                    receiver_site, donor_site, day, swap_day,
-                    donor_slot, receiver_slot, majorelle_friday_count,
-                    is_majorelle_donor
+                    receiver_site, donor_site, friday_row, swap_row,
+                    donor_slot, receiver_slot, is_majorelle_donor
                 )
+                exhausted.difference_update(self.schedule.slots[friday_row].tolist())
                 return True
 
+        exhausted.add(donor_site)
         return False
 
-    def _validate_rebalance_exchange(self, receiver_site: str, donor_site: str,
-                                     friday: date, swap_day: date,
+    def _validate_rebalance_exchange(self, receiver_site: int, donor_site: int,
+                                     friday_row: int, swap_row: int,
                                      donor_slot: int, receiver_slot: int) -> bool:
-        if not self.constraint_validator.is_available(receiver_site, friday):
+        if not self.constraint_validator.is_available(receiver_site, self.schedule.days[friday_row]):
             return False
-        if not self.constraint_validator.is_available(donor_site, swap_day):
+        if not self.constraint_validator.is_available(donor_site, self.schedule.days[swap_row]):
             return False
 
+        # The receiver takes the donor's Friday slot, the donor moves to the receiver's day
         return self.constraint_validator.validate_swap(
-            receiver_site, self.config[donor_site]['name'],
-            self.schedule[friday], self.schedule[swap_day],
+            donor_site, receiver_site,
+            self.schedule.slots[friday_row], self.schedule.slots[swap_row],
             donor_slot, receiver_slot
         )
 
-    def _perform_rebalance_exchange(self, receiver_site: str, donor_site: str,
-                                    friday: date, swap_day: date,
+    def _perform_rebalance_exchange(self, receiver_site: int, donor_site: int,
+                                    friday_row: int, swap_row: int,
                                     donor_slot: int, receiver_slot: int,
-                                    majorelle_friday_count: Dict[str, int],
                                     is_majorelle_donor: bool):
+        friday = self.schedule.days[friday_row]
+        swap_day = self.schedule.days[swap_row]
+        friday_count = self._day_index.friday_count
         donor_type = "Majorelle" if is_majorelle_donor else "NON-Majorelle"
 
         print(f"\n✓ Rééquilibrage trouvé avec site {donor_type}:")
-        print(f"  {self.config[donor_site]['name']} ({donor_type})")
+        print(f"  {self.sites.names[donor_site]} ({donor_type})")
 
         if is_majorelle_donor:
-            print(f"    avec {majorelle_friday_count[donor_site]} vendredis")
+            print(f"    avec {friday_count(donor_site)} vendredis")
 
         print(f"    passe du vendredi {friday.strftime('%Y-%m-%d')} au "
               f"{swap_day.strftime('%Y-%m-%d')}")
-        print(f"  {self.config[receiver_site]['name']} (Majorelle avec "
-              f"{majorelle_friday_count[receiver_site]} vendredis)")
+        print(f"  {self.sites.names[receiver_site]} (Majorelle avec "
+              f"{friday_count(receiver_site)} vendredis)")
         print(f"    passe du {swap_day.strftime('%Y-%m-%d')} au vendredi "
               f"{friday.strftime('%Y-%m-%d')}")
 
-        self.schedule[friday][donor_slot] = self.config[receiver_site]['name']
-        self.schedule[swap_day][receiver_slot] = self.config[donor_site]['name']
-
-        if is_majorelle_donor:
-            majorelle_friday_count[donor_site] -= 1
-        majorelle_friday_count[receiver_site] += 1
+        self.schedule.swap(friday_row, donor_slot, swap_row, receiver_slot)
+        self._day_index.refresh(friday_row, (donor_site, receiver_site))
+        self._day_index.refresh(swap_row, (donor_site, receiver_site))
 
         print(f"  Nouveau compte: ", end="")
         if is_majorelle_donor:
-            print(f"{self.config[donor_site]['name']}={majorelle_friday_count[donor_site]}, ",
+            print(f"{self.sites.names[donor_site]}={friday_count(donor_site)}, ",
                   end="")
-        print(f"{self.config[receiver_site]['name']}={majorelle_friday_count[receiver_site]}")
+        print(f"{self.sites.names[receiver_site]}={friday_count(receiver_site)}")
 
     def _print_final_friday_verification(self):
         print("\n=== Vérification finale des vendredis Majorelle ===")
         print("Objectif: 3 vendredis par site (flexibilité 2-4 acceptée si nécessaire)")
 
-        final_counts = self._count_majorelle_fridays()
-
         for site in self.majorelle_sites:
-            count = final_counts[site]
+            count = self._day_index.friday_count(site)
             if count == 3:
                 status = "✓ Objectif atteint"
             elif count in [2, 4]:
                 status = "⚠ Acceptable (flexibilité)"
             else:
                 status = "✗ Hors limites"
-            print(f"{self.config[site]['name']}: {count} vendredis {status}")
+            print(f"{self.sites.names[site]}: {count} vendredis {status}")
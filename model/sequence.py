@@ -1,65 +1,166 @@
-from math import floor
-from typing import Dict, List
+import heapq
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from model.site_table import SiteTable
+
+# Largest change of a site's share, as a fraction of it, made in one quarter to make up past deviation
+MAX_HISTORY_SHIFT = 0.25
 
 
 class SequenceGenerator:
     """Compute quotas for each site and create the allocation sequence of sites with SWRR"""
 
     @staticmethod
-    def calculate_quotas(config: Dict, total_slots: int) -> Dict[str, int]:
-        """Compute quotas for each site depending on their weight with the Largest Remainder Method"""
-        weights = {k: max(0, int(v.get('nb_radiologists', 0))) for k, v in config.items()}
-        total_w = sum(weights.values())
+    def _water_fill(weights: np.ndarray, caps: np.ndarray, total: float) -> np.ndarray:
+        """Split total by weights, capping each share at caps and spreading the excess over the others"""
+        raw = np.zeros(len(weights))
+        free = weights > 0
+        left = float(total)
+        # Each round caps the shares over their capacity, at most one round per share
+        while free.any() and left > 0:
+            share = np.zeros(len(weights))
+            share[free] = weights[free] / weights[free].sum() * left
+            over = free & (share > caps)
+            if not over.any():
+                raw[free] = share[free]
+                break
+            raw[over] = caps[over]
+            left -= caps[over].sum()
+            free &= ~over
+        return raw
 
-        if total_w == 0:
+    @staticmethod
+    def calculate_quotas(sites: SiteTable, total_slots: int, availability: Optional[np.ndarray] = None,
+                         nb_vacations: int = 2, history_offsets: Optional[np.ndarray] = None) -> Dict[int, int]:
+        """
+        Compute quotas for each site depending on their weight with the Largest Remainder Method.
+        With the (sites, days) availability matrix, a site never gets more slots than its
+        available days, and a family more than the days one of its sites is available (one
+        slot per day, all of them for paired sites): what they cannot take is spread over
+        the other sites by weight.
+        history_offsets[site] are the slots the site got above (+) or below (-) its share in
+        past quarters: its share is lowered or raised by as much, within MAX_HISTORY_SHIFT.
+        """
+        site_ids = range(len(sites))
+        weights = np.array(sites.nb_radiologists, dtype=np.float64)
+
+        if weights.sum() == 0:
             return {}
 
-        raw = {k: weights[k] / total_w * total_slots for k in config}
-        base = {k: floor(raw[k]) for k in config}
-        remainder = total_slots - sum(base.values())
-
-        for k, _ in sorted(((k, raw[k] - base[k]) for k in config),
-                           key=lambda x: (-x[1], x[0])):
+        if history_offsets is not None:
+            # The splits below only use the proportions of the weights: the shifted shares serve as weights
+            share = weights / weights.sum() * total_slots
+            weights = np.clip(share - history_offsets, share * (1 - MAX_HISTORY_SHIFT),
+                              share * (1 + MAX_HISTORY_SHIFT))
+
+        if availability is None:
+            caps = np.full(len(sites), np.inf)
+            raw = weights / weights.sum() * total_slots
+        else:
+            per_day = np.where(sites.paired, nb_vacations, 1)
+            caps = (availability.sum(axis=1) * per_day).astype(np.float64)
+            family = np.array(sites.family)
+            nb_families = int(family.max()) + 1
+
+            family_weights = np.bincount(family, weights=weights, minlength=nb_families)
+            family_caps = np.zeros(nb_families)
+            for fam in range(nb_families):
+                members = family == fam
+                family_caps[fam] = availability[members].any(axis=0).sum() * per_day[members].max()
+            family_raw = SequenceGenerator._water_fill(family_weights, family_caps, total_slots)
+
+            raw = np.zeros(len(sites))
+            for fam in np.flatnonzero(family_raw > 0):
+                members = np.flatnonzero(family == fam)
+                raw[members] = SequenceGenerator._water_fill(weights[members], caps[members], family_raw[fam])
+
+        base = np.floor(raw).astype(np.int64)
+        remainder = int(round(raw.sum())) - int(base.sum())
+
+        for k in sorted(site_ids, key=lambda k: (-(raw[k] - base[k]), sites.keys[k])):
             if remainder <= 0:
                 break
-            base[k] += 1
-            remainder -= 1
+            if base[k] < caps[k]:
+                base[k] += 1
+                remainder -= 1
 
-        return base
+        return {k: int(base[k]) for k in site_ids}
 
     @staticmethod
-    def adjust_for_paired_sites(quotas: Dict[str, int], config: Dict,
-                                total_slots: int) -> Dict[str, int]:
+    def _fills_short_day(sites: SiteTable, availability: np.ndarray, nb_vacations: int) -> np.ndarray:
+        """Sites available on a day that the other families cannot fill, one site of a family per day"""
+        per_day = np.where(sites.paired, nb_vacations, 1)
+        family = np.array(sites.family)
+        supply = np.zeros(availability.shape[1], dtype=np.int64)
+        family_supply = {}
+        for fam in np.unique(family):
+            members = family == fam
+            family_supply[fam] = availability[members].any(axis=0) * int(per_day[members].max())
+            supply += family_supply[fam]
+        return np.array([(availability[site] & (supply - family_supply[family[site]] < nb_vacations)).any()
+                         for site in range(len(sites))])
+
+    @staticmethod
+    def adjust_for_paired_sites(quotas: Dict[int, int], sites: SiteTable, total_slots: int,
+                                availability: Optional[np.ndarray] = None,
+                                nb_vacations: int = 2) -> Dict[int, int]:
+        """
+        Round the quotas of paired sites to whole days (multiples of nb_vacations), down when
+        the site cannot take one more day, and give or take the difference from the other
+        non-Majorelle sites, the most served (quota per radiologist) first when taking. The
+        slots lost by rounding down are only given to a site with spare capacity on a day the
+        other families cannot fill, the least served first: elsewhere they are left to the
+        backfilling.
+        """
         adjusted = quotas.copy()
-        list_paired_sites = [site for site in config if config[site]['pair_same_day']]
-
-        for site in list_paired_sites:
-            if adjusted[site] % 2 == 1:
-                adjusted[site] += 1
-
-        lost_slots = sum(adjusted.values()) - total_slots
-        non_pair_sites = [site for site in config
-                          if not config[site].get("pair_same_day", False)
-                          and adjusted[site] % 2 == 0
-                          and not site.lower().startswith("majo")
-                          ]
-
-        i = 0
-        while lost_slots > 0 and non_pair_sites:
-            if adjusted[non_pair_sites[i % len(non_pair_sites)]] > 1:
-                adjusted[non_pair_sites[i % len(non_pair_sites)]] -= 1
-                lost_slots -= 1
-            i += 1
-            if i > len(non_pair_sites) * 10:
+        capacity = None
+        if availability is not None:
+            capacity = availability.sum(axis=1) * np.where(sites.paired, nb_vacations, 1)
+        for site in adjusted:
+            remainder = adjusted[site] % nb_vacations
+            if sites.paired[site] and remainder:
+                missing = nb_vacations - remainder
+                fits = capacity is None or adjusted[site] + missing <= capacity[site]
+                adjusted[site] += missing if fits else -remainder
+
+        others = [site for site in adjusted
+                  if not sites.paired[site] and not sites.majorelle[site] and sites.nb_radiologists[site] > 0]
+
+        def served(site: int) -> float:
+            return adjusted[site] / sites.nb_radiologists[site]
+
+        excess = sum(adjusted.values()) - total_slots
+        while excess > 0:
+            candidates = [site for site in others if adjusted[site] > 1]
+            if not candidates:
+                break
+            site = max(candidates, key=lambda k: (served(k), sites.keys[k]))
+            adjusted[site] -= 1
+            excess -= 1
+        if excess < 0 and availability is not None:
+            needed = SequenceGenerator._fills_short_day(sites, availability, nb_vacations)
+            others = [site for site in others if adjusted[site] < capacity[site] and needed[site]]
+        while excess < 0:
+            candidates = [site for site in others if capacity is None or adjusted[site] < capacity[site]]
+            if not candidates:
                 break
+            site = min(candidates, key=lambda k: (served(k), sites.keys[k]))
+            adjusted[site] += 1
+            excess += 1
 
         return adjusted
 
     @staticmethod
-    def generate_sequence(quotas: Dict[str, int], config: Dict) -> List[str]:
+    def generate_sequence(quotas: Dict[int, int], sites: SiteTable,
+                          tie_break: Optional[List] = None) -> List[int]:
+        """SWRR sequence; equal weights are broken by tie_break[site] (the site key by default)"""
+        tie_break = tie_break if tie_break is not None else sites.keys
         eff_w = quotas.copy()
         total_eff_w = sum(eff_w.values())
-        current = {k: 0 for k in config}
+        current = {k: 0 for k in range(len(sites))}
         remaining = quotas.copy()
         seq = []
 
@@ -72,9 +173,77 @@ class SequenceGenerator:
             if not cands:
                 break
 
-            best = max(cands, key=lambda k: (current[k], k))
+            best = max(cands, key=lambda k: (current[k], tie_break[k]))
             current[best] -= total_eff_w
             remaining[best] -= 1
             seq.append(best)
 
         return seq
+
+
+class SiteQueue:
+    """
+    Allocation sequence as one deque of positions per site, plus a heap of each site's
+    next position. The first site of the sequence passing a test is found by popping the
+    heads in sequence order, each site tested once: O(sites log sites) at worst instead of
+    a scan of the whole sequence, and taking a site is O(log sites) instead of a list pop.
+    """
+
+    def __init__(self, seq: List[int]):
+        self._positions: Dict[int, deque] = {}
+        for position, site in enumerate(seq):
+            self._positions.setdefault(site, deque()).append(position)
+        # (next position, site); an entry is stale once its position is no longer the site's head
+        self._heap = [(positions[0], site) for site, positions in self._positions.items()]
+        heapq.heapify(self._heap)
+        self._size = len(seq)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def count(self, site: int) -> int:
+        positions = self._positions.get(site)
+        return len(positions) if positions else 0
+
+    def __contains__(self, site: int) -> bool:
+        return self.count(site) > 0
+
+    def _consume(self, site: int):
+        positions = self._positions[site]
+        positions.popleft()
+        self._size -= 1
+        if positions:
+            heapq.heappush(self._heap, (positions[0], site))
+
+    def take(self, site: int) -> bool:
+        """Remove the next occurrence of site, False when it has none left"""
+        if site not in self:
+            return False
+        self._consume(site)
+        return True
+
+    def take_first(self, accept: Callable[[int], bool]) -> Optional[int]:
+        """Remove and return the first site of the sequence for which accept(site) holds"""
+        skipped = []
+        found = None
+        while self._heap:
+            position, site = heapq.heappop(self._heap)
+            positions = self._positions[site]
+            if not positions or positions[0] != position:
+                continue
+            if accept(site):
+                found = site
+                break
+            skipped.append((position, site))
+
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        if found is not None:
+            self._consume(found)
+        return found
+
+    def to_list(self) -> List[int]:
+        """Remaining sites in sequence order"""
+        entries = sorted((position, site) for site, positions in self._positions.items()
+                         for position in positions)
+        return [site for _, site in entries]
@@ -0,0 +1,69 @@
+from datetime import date
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from model.leave import LeaveCalendar
+
+ALL_WEEKDAYS_MASK = 0b1111111
+
+
+class SiteTable:
+    """Config compiled once into integer-indexed site attributes for the allocation hot paths"""
+
+    __slots__ = ('keys', 'names', 'key_to_id', 'name_to_id', 'family', 'paired',
+                 'majorelle', 'weekday_mask', 'holidays', 'nb_radiologists')
+
+    def __init__(self, config: Dict):
+        self.keys: List[str] = list(config)
+        self.names: List[str] = [config[k]['name'] for k in self.keys]
+        self.key_to_id: Dict[str, int] = {k: i for i, k in enumerate(self.keys)}
+        # First occurrence wins when two sites share a name
+        self.name_to_id: Dict[str, int] = {}
+        for i, name in enumerate(self.names):
+            self.name_to_id.setdefault(name, i)
+
+        # Sites sharing the same 9-char key prefix (e.g. 'majorelle') belong to one family
+        family_ids: Dict[str, int] = {}
+        self.family: List[int] = [family_ids.setdefault(k[:9], len(family_ids)) for k in self.keys]
+        self.paired: List[bool] = [bool(config[k].get('pair_same_day', False)) for k in self.keys]
+        self.majorelle: List[bool] = [k.startswith('majorelle_') for k in self.keys]
+        self.nb_radiologists: List[int] = [max(0, int(config[k].get('nb_radiologists', 0)))
+                                           for k in self.keys]
+
+        self.weekday_mask: List[int] = []
+        self.holidays: List[LeaveCalendar] = []
+        for k in self.keys:
+            weekdays = config[k].get('available_weekdays', [])
+            if not weekdays:
+                # No weekday restriction means the site is always available
+                self.weekday_mask.append(ALL_WEEKDAYS_MASK)
+                self.holidays.append(LeaveCalendar())
+                continue
+            mask = 0
+            for weekday in weekdays:
+                mask |= 1 << int(weekday)
+            self.weekday_mask.append(mask)
+            self.holidays.append(LeaveCalendar.from_config(config[k].get('holidays', [])))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def majorelle_ids(self) -> List[int]:
+        return [i for i, is_majo in enumerate(self.majorelle) if is_majo]
+
+    def is_available(self, site_id: int, day: date) -> bool:
+        return bool(self.weekday_mask[site_id] >> day.weekday() & 1) and day not in self.holidays[site_id]
+
+    def availability(self, days: Sequence[date]) -> np.ndarray:
+        """(sites, days) boolean matrix of is_available"""
+        weekdays = np.array([day.weekday() for day in days], dtype=np.int64)
+        masks = np.array(self.weekday_mask, dtype=np.int64)
+        matrix = (masks[:, None] >> weekdays[None, :]) & 1 == 1
+        for site, holidays in enumerate(self.holidays):
+            if holidays:
+                matrix[site] &= ~holidays.mask(days)
+        return matrix
+
+    def same_family(self, site_a: int, site_b: int) -> bool:
+        return self.family[site_a] == self.family[site_b]
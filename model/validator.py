@@ -1,96 +1,82 @@
-from typing import Dict, List
+from typing import List, Set
 from datetime import date
-from utils.tools import get_site_key_from_name
+
+import numpy as np
+
+from model.schedule_grid import EMPTY
+from model.site_table import SiteTable
 
 
 class ScheduleValidator:
     """Validate constraints"""
 
-    def __init__(self, config: Dict):
-        self.config = config
-        self.paired_sites = [site for site in config if config[site]['pair_same_day']]
+    def __init__(self, sites: SiteTable):
+        self.sites = sites
 
-    def is_available(self, site_key: str, day: date) -> bool:
+    def is_available(self, site_id: int, day: date) -> bool:
         """Check sites availability"""
-        cfg = self.config[site_key]
-
-        if not cfg.get("available_weekdays", []):
-            return True
-
-        weekday = day.weekday()
-        available_weekdays = cfg.get('available_weekdays', list(range(5)))
-        day_str = day.strftime("%Y-%m-%d")
-        holidays = cfg.get('holidays', [])
-
-        return weekday in available_weekdays and day_str not in holidays
-
-    def validate_second_site(self, first_site: str, second_site: str) -> bool:
-        if not second_site or not first_site:
+        return self.sites.is_available(site_id, day)
+
+    def validate_next_site(self, first_site: int, day_families: Set[int], site: int) -> bool:
+        """
+        Whether site can take a free slot of a day whose first slot holds first_site, the
+        sites already placed that day belonging to day_families: O(1) whatever the number
+        of slots. A paired site fills every slot of its day alone.
+        """
+        if self.sites.paired[first_site]:
+            return site == first_site
+        if self.sites.paired[site]:
             return False
+        return self.sites.family[site] not in day_families
 
-        if self.config[first_site].get("pair_same_day", False):
-            return second_site == first_site
-
-        if second_site == first_site:
-            return False
-        if second_site[:9] == first_site[:9]:
-            return False
-        if second_site in self.paired_sites:
-            return False
-
-        return True
-
-    def validate_swap(self, site_to_place: str, site_to_swap: str,
-                      problem_day_schedule: List[str], swap_day_schedule: List[str],
+    def validate_swap(self, site_to_place: int, site_to_swap: int,
+                      problem_day_schedule: np.ndarray,
+                      swap_day_schedule: np.ndarray,
                       slot_idx: int, swap_slot_idx: int) -> bool:
-        """Check if a swap is possible between 2 days"""
-        other_slot_idx = 1 - slot_idx
-        other_site_name = problem_day_schedule[other_slot_idx]
-
-        if not self._validate_site_on_day(site_to_swap, other_site_name,
-                                          problem_day_schedule):
+        """
+        Check if a swap is possible between 2 days: site_to_swap takes slot_idx of the
+        problem day and site_to_place takes swap_slot_idx of the swap day, the other slots
+        of both days unchanged
+        """
+        problem_others = self._other_sites(problem_day_schedule, slot_idx)
+        if not self._validate_site_on_day(site_to_swap, problem_others, problem_day_schedule):
             return False
 
-        swap_other_slot = 1 - swap_slot_idx
-        swap_other_site = swap_day_schedule[swap_other_slot]
-
-        if not self._validate_site_on_day_by_key(site_to_place, swap_other_site):
+        swap_others = self._other_sites(swap_day_schedule, swap_slot_idx)
+        if not self._validate_site_on_day_by_key(site_to_place, swap_others):
             return False
 
         return True
 
-    def _validate_site_on_day(self, site_name: str, other_site_name: str,
-                              day_schedule: List[str]) -> bool:
-        site_key = get_site_key_from_name(self.config, site_name)
-        if not site_key:
-            return False
+    @staticmethod
+    def _other_sites(day_schedule: np.ndarray, slot_idx: int) -> List[int]:
+        day_sites = day_schedule.tolist()
+        del day_sites[slot_idx]
+        return day_sites
 
-        if self.config[site_key].get("pair_same_day", False):
-            if day_schedule.count(site_name) == 2:
-                return True
-            if other_site_name == site_name or other_site_name is None:
+    def _validate_site_on_day(self, site_id: int, other_sites: List[int],
+                              day_schedule: np.ndarray) -> bool:
+        if self.sites.paired[site_id]:
+            if np.count_nonzero(day_schedule == site_id) == len(day_schedule):
                 return True
-            return False
-        else:
-            if other_site_name == site_name:
-                return False
-            other_site_key = get_site_key_from_name(self.config, other_site_name) if other_site_name else None
-            if other_site_key and site_key[:9] == other_site_key[:9]:
-                return False
+            # Free slots may be completed later by the paired site
+            for other in other_sites:
+                if other != site_id and other != EMPTY:
+                    return False
+            return True
 
-        return True
+        return self._no_family_conflict(site_id, other_sites)
 
-    def _validate_site_on_day_by_key(self, site_key: str, other_site_name: str) -> bool:
-        site_name = self.config[site_key]['name']
+    def _validate_site_on_day_by_key(self, site_id: int, other_sites: List[int]) -> bool:
+        if self.sites.paired[site_id]:
+            return other_sites.count(site_id) == len(other_sites)
 
-        if self.config[site_key].get("pair_same_day", False):
-            if other_site_name != site_name:
-                return False
-        else:
-            if other_site_name == site_name:
-                return False
-            other_site_key = get_site_key_from_name(self.config, other_site_name) if other_site_name else None
-            if other_site_key and site_key[:9] == other_site_key[:9]:
-                return False
+        return self._no_family_conflict(site_id, other_sites)
 
+    def _no_family_conflict(self, site_id: int, other_sites: List[int]) -> bool:
+        family = self.sites.family
+        site_family = family[site_id]
+        for other in other_sites:
+            if other != EMPTY and family[other] == site_family:
+                return False
         return True
@@ -2,6 +2,7 @@ import streamlit as st
 import yaml
 import copy
 from utils.storage.github_sync import GitHubSync
+from utils.profiling import finish_rerun_profile, start_rerun_profile
 from utils.tools import load_config
 
 
@@ -50,6 +51,8 @@ st.set_page_config(
     layout="wide"
 )
 
+start_rerun_profile("configuration")
+
 st.title("⚙️ Configuration des Sites")
 
 # Load current configuration
@@ -60,76 +63,89 @@ config = config_full.get('sites', {})
 if 'config_modified' not in st.session_state:
     st.session_state.config_modified = copy.deepcopy(config)
 
-if 'new_site_key' not in st.session_state:
-    st.session_state.new_site_key = ""
+# Widget keys of the site forms, followed by the site key
+SITE_WIDGET_PREFIXES = ('name_', 'nb_doctors_', 'day_', 'advanced_', 'pair_', 'display_name_', 'remove_')
 
-if 'new_site_name' not in st.session_state:
-    st.session_state.new_site_name = ""
 
 # Function to add a new site
-def add_new_site():
-    if st.session_state.new_site_key and st.session_state.new_site_name:
-        if st.session_state.new_site_key not in st.session_state.config_modified:
-            st.session_state.config_modified[st.session_state.new_site_key] = {
-                'name': st.session_state.new_site_name,
+def add_new_site(site_key: str, site_name: str):
+    if site_key and site_name:
+        if site_key not in st.session_state.config_modified:
+            st.session_state.config_modified[site_key] = {
+                'name': site_name,
                 'advanced_split': False,
                 'nb_radiologists': 1,
                 'available_weekdays': [0, 1, 2, 3, 4],  # Monday to Friday by default
                 'pair_same_day': False
             }
-            st.success(f"Site '{st.session_state.new_site_name}' ajouté avec succès!")
-            # Reset the input fields
-            st.session_state.new_site_key = ""
-            st.session_state.new_site_name = ""
+            st.success(f"Site '{site_name}' ajouté avec succès!")
         else:
-            st.error(f"La clé '{st.session_state.new_site_key}' existe déjà!")
+            st.error(f"La clé '{site_key}' existe déjà!")
+
+
+# Forms batch the edits: the page only reruns when a form is submitted, not on every
+# keystroke or checkbox, so its cost does not grow with the number of sites being edited
 
 # Section to add new site
 st.markdown("### ➕ Ajouter un nouveau site")
 with st.expander("Ajouter un site", expanded=False):
-    col1, col2, col3 = st.columns([2, 2, 1])
-    
-    with col1:
-        new_site_key = st.text_input(
-            "Clé du site",
-            value=st.session_state.new_site_key,
-            key="input_new_site_key",
-            help="Ex: nouveau_site, clinique_x, etc. (sans espaces, minuscules)"
-        )
-        st.session_state.new_site_key = new_site_key
-    
-    with col2:
-        new_site_name = st.text_input(
-            "Nom affiché du site",
-            value=st.session_state.new_site_name,
-            key="input_new_site_name",
-            help="Nom qui apparaîtra dans l'application"
-        )
-        st.session_state.new_site_name = new_site_name
-    
-    with col3:
-        if st.button("Ajouter", type="primary"):
-            add_new_site()
+    with st.form("add_site_form", clear_on_submit=True, border=False):
+        col1, col2, col3 = st.columns([2, 2, 1], vertical_alignment="bottom")
+
+        with col1:
+            new_site_key = st.text_input(
+                "Clé du site",
+                key="input_new_site_key",
+                help="Ex: nouveau_site, clinique_x, etc. (sans espaces, minuscules)"
+            )
+
+        with col2:
+            new_site_name = st.text_input(
+                "Nom affiché du site",
+                key="input_new_site_name",
+                help="Nom qui apparaîtra dans l'application"
+            )
+
+        with col3:
+            if st.form_submit_button("Ajouter", type="primary"):
+                add_new_site(new_site_key.strip(), new_site_name.strip())
 
 # Display and edit existing sites
 st.markdown("### 📝 Modifier les sites existants")
 
-# List of sites to remove
-sites_to_remove = []
 
-for site_key, site_config in st.session_state.config_modified.items():
-    with st.expander(f"**{site_config['name']}** ({site_key})", expanded=False):
-        col1, col2 = st.columns([3, 1])
-        
-        with col1:
+def apply_site_edits(site_edits):
+    """Write the submitted values of the site editors into config_modified, drop the sites marked for deletion"""
+    for site_key, (values, remove) in site_edits.items():
+        site_config = st.session_state.config_modified[site_key]
+        if remove:
+            del st.session_state.config_modified[site_key]
+            # A site added again later under this key starts from blank widgets
+            for key in list(st.session_state):
+                if key in {prefix + site_key for prefix in SITE_WIDGET_PREFIXES} or key.startswith(f"day_{site_key}_"):
+                    del st.session_state[key]
+            continue
+        display_name = values.pop('display_name')
+        site_config.update(values)
+        if display_name:
+            site_config['display_name'] = display_name
+        elif 'display_name' in site_config:
+            del site_config['display_name']
+
+
+# One form for every site: "Sauvegarder" submits the values being edited along with the
+# applied ones, so no edit is lost for not having clicked "Appliquer" first
+site_edits = {}
+with st.form("sites_form", border=False):
+    for site_key, site_config in st.session_state.config_modified.items():
+        with st.expander(f"**{site_config['name']}** ({site_key})", expanded=False):
             # Site name
             new_name = st.text_input(
                 "Nom affiché",
                 value=site_config['name'],
                 key=f"name_{site_key}"
             )
-            st.session_state.config_modified[site_key]['name'] = new_name
-            
+
             # Number of doctors
             nb_doctors = st.number_input(
                 "Nombre de radiologues",
@@ -138,24 +154,21 @@ for site_key, site_config in st.session_state.config_modified.items():
                 value=site_config.get('nb_radiologists', 1),
                 key=f"nb_doctors_{site_key}"
             )
-            st.session_state.config_modified[site_key]['nb_radiologists'] = nb_doctors
-            
+
             # Available weekdays (only Monday to Friday)
             st.markdown("**Jours disponibles**")
             available_days = site_config.get('available_weekdays', [0, 1, 2, 3, 4])
-            
+
             # Create checkboxes for weekdays only (Monday to Friday)
             day_cols = st.columns(5)
             new_available_days = []
-            
+
             for i, day_name in enumerate(['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi']):
                 with day_cols[i]:
                     is_checked = i in available_days
                     if st.checkbox(day_name.capitalize(), value=is_checked, key=f"day_{site_key}_{i}"):
                         new_available_days.append(i)
-            
-            st.session_state.config_modified[site_key]['available_weekdays'] = new_available_days
-            
+
             # Advanced split
             advanced_split = st.checkbox(
                 "Permettre la gestion des congés",
@@ -163,15 +176,13 @@ for site_key, site_config in st.session_state.config_modified.items():
                 key=f"advanced_{site_key}",
                 help="Active la gestion détaillée des congés pour ce site"
             )
-            st.session_state.config_modified[site_key]['advanced_split'] = advanced_split
-            
+
             # Pair same day
             pair_same_day = st.checkbox(
-                "Forcer le même site sur 2 créneaux le même jour",
+                "Forcer le même site sur tous les créneaux du jour",
                 value=site_config.get('pair_same_day', False),
                 key=f"pair_{site_key}"
             )
-            st.session_state.config_modified[site_key]['pair_same_day'] = pair_same_day
 
             # Display name for Excel export
             display_name = st.text_input(
@@ -180,58 +191,63 @@ for site_key, site_config in st.session_state.config_modified.items():
                 key=f"display_name_{site_key}",
                 help="Nom du médecin affiché dans les colonnes de l'export Excel"
             )
-            if display_name.strip():
-                st.session_state.config_modified[site_key]['display_name'] = display_name.strip()
-            elif 'display_name' in st.session_state.config_modified[site_key]:
-                del st.session_state.config_modified[site_key]['display_name']
-        
-        with col2:
-            st.markdown("**Actions**")
-            if st.button(f"🗑️ Supprimer", key=f"remove_{site_key}", type="secondary"):
-                sites_to_remove.append(site_key)
-
-# Remove sites marked for deletion
-for site_key in sites_to_remove:
-    if site_key in st.session_state.config_modified:
-        site_name = st.session_state.config_modified[site_key]['name']
-        del st.session_state.config_modified[site_key]
-        st.success(f"Site '{site_name}' supprimé!")
-
-
-
-# Save buttons
-st.markdown("### 💾 Sauvegarde")
-col1, col2 = st.columns([1, 1])
-
-with col1:
-    if st.button("💾 Sauvegarder", type="primary"):
-        # First save locally
-        config_to_save = {'sites': st.session_state.config_modified, 'nb_vacations': config_full.get('nb_vacations', 2)}
-        if save_config(config_to_save):
-            try:
-                sync = GitHubSync()
-                if sync.enabled:
-                    # Push the config file to GitHub
-                    success = sync.push_file(
-                        file_path="config/config.yml",
-                        commit_message=f"Update site configuration - {len(st.session_state.config_modified)} sites configured"
-                    )
-                    if success:
-                        st.success("✅ Configuration sauvegardée sur GitHub!")
-                    else:
-                        st.error("❌ Erreur lors de la sauvegarde sur GitHub")
+
+            remove = st.checkbox("🗑️ Supprimer ce site", key=f"remove_{site_key}")
+
+            site_edits[site_key] = ({
+                'name': new_name,
+                'nb_radiologists': nb_doctors,
+                'available_weekdays': new_available_days,
+                'advanced_split': advanced_split,
+                'pair_same_day': pair_same_day,
+                'display_name': display_name.strip(),
+            }, remove)
+
+    # Save buttons
+    st.markdown("### 💾 Sauvegarde")
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        apply_clicked = st.form_submit_button("Appliquer")
+    with col2:
+        save_clicked = st.form_submit_button("💾 Sauvegarder", type="primary")
+
+if apply_clicked or save_clicked:
+    apply_site_edits(site_edits)
+
+if apply_clicked:
+    st.rerun()
+
+if save_clicked:
+    # First save locally
+    config_to_save = {'sites': st.session_state.config_modified, 'nb_vacations': config_full.get('nb_vacations', 2)}
+    if save_config(config_to_save):
+        try:
+            sync = GitHubSync()
+            if sync.enabled:
+                # Push the config file to GitHub
+                success = sync.push_file(
+                    file_path="config/config.yml",
+                    commit_message=f"Update site configuration - {len(st.session_state.config_modified)} sites configured"
+                )
+                if success:
+                    st.success("✅ Configuration sauvegardée sur GitHub!")
                 else:
-                    st.error("❌ GitHub non configuré (vérifiez les secrets)")
-            except Exception as e:
-                st.error(f"❌ Erreur GitHub: {e}")
-        else:
-            st.error("❌ Erreur lors de la sauvegarde locale")
+                    st.error("❌ Erreur lors de la sauvegarde sur GitHub")
+            else:
+                st.error("❌ GitHub non configuré (vérifiez les secrets)")
+        except Exception as e:
+            st.error(f"❌ Erreur GitHub: {e}")
+    else:
+        st.error("❌ Erreur lors de la sauvegarde locale")
 
-with col2:
-    if st.button("🔄 Réinitialiser les modifications"):
-        st.session_state.config_modified = copy.deepcopy(config)
-        st.success("Configuration réinitialisée!")
-        st.rerun()
+if st.button("🔄 Réinitialiser les modifications"):
+    st.session_state.config_modified = copy.deepcopy(config)
+    # The site forms keep their widget state: drop it so they show the reset values
+    for key in list(st.session_state):
+        if key.startswith(SITE_WIDGET_PREFIXES):
+            del st.session_state[key]
+    st.success("Configuration réinitialisée!")
+    st.rerun()
 
 # Warning about changes
 if st.session_state.config_modified != config:
@@ -256,4 +272,6 @@ if summary_data:
     df_summary = pd.DataFrame(summary_data)
     st.dataframe(df_summary, width='stretch', hide_index=True)
 else:
-    st.info("Aucun site configuré")
\ No newline at end of file
+    st.info("Aucun site configuré")
+
+finish_rerun_profile()
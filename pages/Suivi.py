@@ -2,8 +2,12 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 
+from model.auditor import audit_schedules
+from model.site_table import SiteTable
 from utils.storage.storage import ScheduleStorage
 from utils.storage.github_sync import GitHubSync
+from utils.profiling import finish_rerun_profile, profile_section, start_rerun_profile
+from utils.tools import load_config
 
 # Configuration de la page
 st.set_page_config(
@@ -11,6 +15,8 @@ st.set_page_config(
     page_icon="📊",
 )
 
+start_rerun_profile("suivi")
+
 
 # Stockage init
 @st.cache_resource
@@ -18,6 +24,17 @@ def get_storage():
     return ScheduleStorage()
 
 
+# Connecting to the repository is a network round trip: once per server, not per rerun
+@st.cache_resource
+def get_sync():
+    return GitHubSync()
+
+
+@st.cache_data(ttl=300)
+def get_last_commit_info():
+    return get_sync().get_last_commit_info()
+
+
 storage = get_storage()
 
 st.title("Suivi des plannings")
@@ -60,8 +77,8 @@ else:
                 storage.delete(selected_schedule)
 
                 # Sync avec GitHub
-                sync = GitHubSync()
-                sync.push_file(commit_message=f"Delete planning {selected_schedule}")
+                get_sync().push_file(commit_message=f"Delete planning {selected_schedule}")
+                get_last_commit_info.clear()
 
                 st.session_state['delete_success'] = f"Planning {selected_schedule} supprimé"
                 del st.session_state['confirm_delete']
@@ -129,7 +146,7 @@ else:
         df_stats = storage.get_statistics(filtered_ids)
 
         if not df_stats.empty:
-            tab1, tab2 = st.tabs(["📊 Détaillé", "📊 Simplifié (Majo)"])
+            tab1, tab2, tab3 = st.tabs(["📊 Détaillé", "📊 Simplifié (Majo)", "📅 Vendredis"])
 
             with tab1:
                 st.dataframe(df_stats, width='stretch')
@@ -152,6 +169,23 @@ else:
                     df_stats_simplified = df_stats_simplified.sort_values('Total', ascending=False)
 
                 st.dataframe(df_stats_simplified, width='stretch')
+
+            with tab3:
+                st.dataframe(storage.get_friday_statistics(filtered_ids), width='stretch')
+
+            # Saved schedules may have been edited by hand: check them against the current config
+            with profile_section("audit"):
+                violations = audit_schedules(storage.load_many(filtered_ids),
+                                             SiteTable(load_config('config/config.yml')['sites']))
+            if violations.empty:
+                st.success("✅ Les trimestres sélectionnés respectent les contraintes des sites")
+            else:
+                with st.expander(f"⚠️ {len(violations)} contrainte(s) non respectée(s)"):
+                    st.caption("Contrôle avec la configuration actuelle des sites")
+                    st.dataframe(violations[['schedule_id', 'date', 'site', 'message']].rename(
+                        columns={'schedule_id': 'Trimestre', 'date': 'Date', 'site': 'Site',
+                                 'message': 'Problème'}),
+                        hide_index=True, width='stretch')
         else:
             st.warning("Aucune donnée disponible pour générer des statistiques")
     else:
@@ -179,21 +213,21 @@ else:
 
     if export_selected:
         col_dl1, col_dl2 = st.columns(2)
+        # The workbooks are built on click (xlsxwriter included), not on every rerun
         with col_dl1:
-            excel_data = storage.export_to_excel(export_year, schedule_ids=export_selected)
             st.download_button(
                 label="📥 Excel détaillé",
-                data=excel_data,
+                data=lambda: storage.export_to_excel(export_year, schedule_ids=export_selected),
                 file_name=f"planning_{export_year}_complet.xlsx",
-                use_container_width=True,
+                width='stretch',
             )
         with col_dl2:
-            excel_data_grouped = storage.export_to_excel(export_year, grouped_majo=True, schedule_ids=export_selected)
             st.download_button(
                 label="📥 Excel Majo groupé",
-                data=excel_data_grouped,
+                data=lambda: storage.export_to_excel(export_year, grouped_majo=True,
+                                                     schedule_ids=export_selected),
                 file_name=f"planning_{export_year}.xlsx",
-                use_container_width=True,
+                width='stretch',
             )
     else:
         st.warning("⚠️ Veuillez sélectionner au moins un trimestre à exporter")
@@ -201,12 +235,10 @@ else:
 # ===== SIDEBAR : INFO GITHUB =====
 with st.sidebar:
     st.markdown("### 🔄 Synchronisation GitHub")
-    sync = GitHubSync()
-
-    if sync.enabled:
+    if get_sync().enabled:
         st.success("✅ Activée")
 
-        commit_info = sync.get_last_commit_info()
+        commit_info = get_last_commit_info()
         if commit_info:
             st.caption("**Dernier commit:**")
             st.caption(f"📅 {commit_info['date']}")
@@ -225,3 +257,5 @@ with st.sidebar:
             repo = "username/repo"
             ```
             """)
+
+finish_rerun_profile()
@@ -3,6 +3,9 @@ from dateutil.relativedelta import relativedelta as rd
 import pandas as pd
 from datetime import datetime
 
+from model.schedule_grid import slot_columns
+from utils.profiling import profiled
+
 
 def continuous_week(date_obj):
     _, iso_week, _ = date_obj.isocalendar()
@@ -13,34 +16,31 @@ def continuous_week(date_obj):
     return iso_week
 
 
-def format_schedule_for_visual(schedule):
-    schedule["Date"] = pd.to_datetime(schedule["Date"])
-    schedule = schedule[schedule["Date"].dt.weekday < 5]
-
-    result = {}
-    for _, row in schedule.iterrows():
-        date = row["Date"]
-        month_label = date.strftime('%B %Y')
-        month_key = date.replace(day=1).date()
-        weekday = date.strftime('%A')
-        day_fr = {
-            'Monday': 'Lundi',
-            'Tuesday': 'Mardi',
-            'Wednesday': 'Mercredi',
-            'Thursday': 'Jeudi',
-            'Friday': 'Vendredi'
-        }[weekday]
-
-        display = {
-            "date": date.strftime('%d/%m'),
-            "aff1": row.get("Affectation 1", ""),
-            "aff2": row.get("Affectation 2", "")
-        }
+DAY_NAMES_FR = {
+    'Monday': 'Lundi',
+    'Tuesday': 'Mardi',
+    'Wednesday': 'Mercredi',
+    'Thursday': 'Jeudi',
+    'Friday': 'Vendredi'
+}
 
-        week_num = continuous_week(date.date())
-        result.setdefault((month_key, month_label), {}).setdefault(week_num, {})[day_fr] = display
 
-    return result
+def visual_cell(day, *sites):
+    """
+    Place of a schedule row (its date then the site of each slot) in the visual calendar:
+    ((month_key, month_label), week, day name, display), or None for a weekend day or a
+    missing date.
+    """
+    date = pd.to_datetime(day, errors='coerce')
+    if pd.isna(date) or date.weekday() >= 5:
+        return None
+    month_label = date.strftime('%B %Y')
+    month_key = date.replace(day=1).date()
+    display = {
+        "date": date.strftime('%d/%m'),
+        "sites": list(sites)
+    }
+    return (month_key, month_label), continuous_week(date.date()), DAY_NAMES_FR[date.strftime('%A')], display
 
 
 def get_start_date():
@@ -116,15 +116,16 @@ def dynamic_input_data_editor(data, key, **_kwargs):
     return st.data_editor(**__kwargs)
 
 
+@profiled('calendar')
 def create_calendar_editor(source, simplified=False):
     df = source.copy(deep=True)
-    df = df[["Date", "Affectation 1", "Affectation 2"]]
+    columns = slot_columns(df.columns)
+    df = df[["Date"] + columns]
     if simplified:
-        df["Affectation 1"] = df["Affectation 1"].str.replace(r"^majo.*", "Majo", case=False, regex=True)
-        df["Affectation 2"] = df["Affectation 2"].str.replace(r"^majo.*", "Majo", case=False, regex=True)
-        column_config = {"Date": st.column_config.DateColumn(disabled=True),
-                         "Affectation 1": st.column_config.TextColumn(disabled=True),
-                         "Affectation 2": st.column_config.TextColumn(disabled=True)}
+        column_config = {"Date": st.column_config.DateColumn(disabled=True)}
+        for column in columns:
+            df[column] = df[column].str.replace(r"^majo.*", "Majo", case=False, regex=True)
+            column_config[column] = st.column_config.TextColumn(disabled=True)
     else:
         column_config = {"Date": st.column_config.DateColumn(disabled=True)}
     edited_df = dynamic_input_data_editor(
@@ -137,12 +138,9 @@ def create_calendar_editor(source, simplified=False):
     return edited_df
 
 
-def create_visual_calendar(source, simplified=False):
-    df = source.copy(deep=True)
-    if simplified:
-        df["Affectation 1"] = df["Affectation 1"].str.replace(r"^majo.*", "Majo", case=False, regex=True)
-        df["Affectation 2"] = df["Affectation 2"].str.replace(r"^majo.*", "Majo", case=False, regex=True)
-    calendar = format_schedule_for_visual(df)
+@profiled('calendar')
+def render_visual_calendar(calendar):
+    """Draw the months of ScheduleViews.calendar: {(month_key, month_label): {week: {day name: display}}}"""
     day_labels = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi']
 
     for (_, month_label), weeks in sorted(calendar.items()):
@@ -159,6 +157,14 @@ def create_visual_calendar(source, simplified=False):
             for idx, day in enumerate(day_labels):
                 with cols[idx]:
                     if day in days:
+                        # One line per slot, the first one further from the date
+                        site_lines = "".join(
+                            f"""
+                                    <div style='margin-top: {4 if slot == 0 else 2}px; font-size: 15px'>
+                                        {site}
+                                    </div>"""
+                            for slot, site in enumerate(days[day]['sites'])
+                        )
                         st.markdown(
                             f"""
                                 <div style="
@@ -171,13 +177,7 @@ def create_visual_calendar(source, simplified=False):
                                 ">
                                     <div style='font-size: 12px; color: gray; font-style: italic'>
                                         {days[day]['date']}
-                                    </div>
-                                    <div style='margin-top: 4px; font-size: 15px'>
-                                        {days[day]['aff1']}
-                                    </div>
-                                    <div style='margin-top: 2px; font-size: 15px'>
-                                        {days[day]['aff2']}
-                                    </div>
+                                    </div>{site_lines}
                                 </div>
                                 """,
                             unsafe_allow_html=True
@@ -0,0 +1,131 @@
+import copy
+import threading
+from concurrent.futures import Executor, Future
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from model.metrics import evaluate_schedule
+from model.multistart import allocate_best_of
+from model.schedule_grid import ScheduleGrid
+from model.scheduler import ALGORITHM_VERSION, PHASES, ProgressCallback, ScheduleAllocator
+from utils.storage.result_cache import ResultCache
+
+PHASE_LABELS = {
+    'queued': "En attente",
+    'cache': "Recherche d'un planning déjà calculé",
+    'fridays': "Pré-allocation des vendredis Majorelle",
+    'sequence': "Calcul des quotas",
+    'main_allocation': "Allocation principale",
+    'backfilling': "Remplissage des créneaux vides",
+    'rebalance': "Rééquilibrage des vendredis",
+    'optimize': "Optimisation locale",
+    'multistart': "Calcul des essais en parallèle",
+}
+
+
+class GenerationCancelled(Exception):
+    """Raised from the progress callback when the user cancels a generation"""
+
+
+def generate_schedule(config: Dict, working_days: List[date], options: Dict,
+                      cache: Optional[ResultCache] = None,
+                      progress_callback: Optional[ProgressCallback] = None
+                      ) -> Tuple[ScheduleGrid, Dict[str, float], Dict]:
+    """
+    Generate a schedule, from the result cache when the same inputs were already computed.
+    options: nb_starts, time_budget (multi-start only) and optimize_time.
+
+    Returns:
+        (schedule, metrics, info) where info tells whether the cache was used
+        and how many multi-start runs finished
+    """
+    nb_starts = int(options.get('nb_starts', 1))
+    optimize_time = float(options.get('optimize_time', 0))
+    key_options = {'nb_starts': nb_starts, 'optimize_time': optimize_time}
+    if nb_starts > 1:
+        key_options['time_budget'] = float(options.get('time_budget', 0))
+
+    if progress_callback is not None:
+        progress_callback('cache', 0.0)
+
+    cache_key = None
+    if cache is not None:
+        cache_key = ResultCache.make_key(config, working_days, ALGORITHM_VERSION, key_options)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            schedule, metrics = cached
+            return schedule, metrics, {'cached': True}
+
+    info = {'cached': False}
+    if nb_starts > 1:
+        schedule, metrics, all_metrics = allocate_best_of(
+            config, working_days, nb_starts, time_budget=key_options['time_budget'] or None,
+            optimize_time=optimize_time, progress_callback=progress_callback
+        )
+        info['finished_starts'] = len(all_metrics)
+    else:
+        allocator = ScheduleAllocator(config, working_days, optimize_time=optimize_time,
+                                      progress_callback=progress_callback)
+        schedule = allocator.allocate()
+        metrics = evaluate_schedule(schedule, allocator.sites, allocator.quotas)
+
+    # A run cut short by time_budget is not the result of these inputs: a later one may finish
+    if cache is not None and info.get('finished_starts', nb_starts) == nb_starts:
+        cache.put(cache_key, (schedule, metrics))
+    return schedule, metrics, info
+
+
+class GenerationJob:
+    """Generation running on a shared executor, with progress and cancellation for the UI"""
+
+    def __init__(self, context: Optional[Dict] = None):
+        # Free-form data the page needs once the job is done (dates, public holidays...)
+        self.context = context or {}
+        self.phase = 'queued'
+        self.fraction = 0.0
+        self.future: Optional[Future] = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def report(self, phase: str, fraction: float):
+        """Progress callback given to the allocator, raises once the job is cancelled"""
+        if self._cancel_event.is_set():
+            raise GenerationCancelled()
+        with self._lock:
+            self.phase = phase
+            self.fraction = fraction
+
+    def cancel(self):
+        self._cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    def progress(self) -> Tuple[float, str]:
+        """Overall fraction done (0 to 1) and the label of the current phase"""
+        with self._lock:
+            phase, fraction = self.phase, self.fraction
+        if phase in PHASES:
+            # Each allocation phase gets an equal share of the bar
+            overall = (PHASES.index(phase) + fraction) / len(PHASES)
+        elif phase == 'multistart':
+            overall = fraction
+        else:
+            overall = 0.0
+        return min(max(overall, 0.0), 1.0), PHASE_LABELS.get(phase, phase)
+
+
+def start_generation(executor: Executor, config: Dict, working_days: List[date], options: Dict,
+                     cache: Optional[ResultCache] = None, context: Optional[Dict] = None) -> GenerationJob:
+    """Submit generate_schedule to the executor and return the job tracking it"""
+    job = GenerationJob(context)
+    # The page keeps mutating its config on reruns: the job works on its own copy
+    job.future = executor.submit(generate_schedule, copy.deepcopy(config), list(working_days),
+                                 dict(options), cache, job.report)
+    return job
@@ -0,0 +1,214 @@
+"""
+Opt-in profiling of the page reruns.
+
+Set AGENDA_PROFILE=1 in the environment (every session) or open a page with
+?profile=1 (that session) to profile each script run with cProfile. Every rerun
+writes its pstats dump to output/profiles/<page>-<timestamp>.prof, and summary.json
+keeps the last KEEP_RERUNS reruns: wall time, time spent in the @profiled sections
+(config, storage, calendar...) and the functions with the highest cumulative time.
+
+    python -m pstats output/profiles/planification-20260101-120000-000000.prof
+
+When profiling is off, start_rerun_profile() only reads the switches and the
+@profiled sections call their function directly.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+PROFILE_ENV = "AGENDA_PROFILE"
+PROFILE_DIR = Path("output/profiles")
+SUMMARY_FILE = "summary.json"
+
+# Reruns kept in the summary, and their .prof files on disk
+KEEP_RERUNS = 50
+TOP_FUNCTIONS = 15
+
+# Session state key of the profile of the current rerun
+SESSION_KEY = "_rerun_profile"
+
+# Each session runs its script in its own thread: sections report to the profile of their thread
+_thread_state = threading.local()
+_summary_lock = threading.Lock()
+
+
+def profiling_requested() -> bool:
+    """AGENDA_PROFILE set to anything but 0, or ?profile=1 in the page URL"""
+    if os.environ.get(PROFILE_ENV, "").strip() not in ("", "0"):
+        return True
+    import streamlit as st
+    return st.query_params.get("profile") == "1"
+
+
+def _function_label(key) -> str:
+    filename, line, name = key
+    if filename == '~':
+        # Built-in functions
+        return name
+    try:
+        filename = os.path.relpath(filename)
+    except ValueError:
+        pass
+    return f"{filename}:{line}({name})"
+
+
+class RerunProfile:
+    """cProfile and section timings of one script run"""
+
+    def __init__(self, page: str, directory: Path = PROFILE_DIR):
+        self.page = page
+        self.directory = Path(directory)
+        self.started_at = datetime.now()
+        self.sections: Dict[str, float] = {}
+        self._profiler: Optional[cProfile.Profile] = cProfile.Profile()
+        try:
+            self._profiler.enable()
+        except ValueError:
+            # Python >= 3.12 allows a single profiler at a time: another session holds it,
+            # this rerun only gets its section timings
+            self._profiler = None
+        self._start = time.perf_counter()
+
+    def add_section(self, name: str, seconds: float):
+        self.sections[name] = self.sections.get(name, 0.0) + seconds
+
+    def finish(self, interrupted: bool = False) -> Dict:
+        """Stop profiling, write the .prof dump and add the rerun to the summary"""
+        wall = time.perf_counter() - self._start
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        top = []
+        if self._profiler is not None:
+            self._profiler.disable()
+            stamp = self.started_at.strftime("%Y%m%d-%H%M%S-%f")
+            self._profiler.dump_stats(str(self.directory / f"{self.page}-{stamp}.prof"))
+            stats = pstats.Stats(self._profiler).stats
+            # stats values are (primitive calls, calls, own time, cumulative time, callers)
+            top = sorted(stats.items(), key=lambda item: -item[1][3])[:TOP_FUNCTIONS]
+        entry = {
+            'page': self.page,
+            'started_at': self.started_at.isoformat(timespec='milliseconds'),
+            'wall_s': round(wall, 4),
+            # Ended by st.rerun() or st.stop(): closed at the start of the next run
+            'interrupted': interrupted,
+            'sections_s': {name: round(seconds, 4) for name, seconds in sorted(self.sections.items())},
+            'top_functions': [
+                {'function': _function_label(key), 'calls': value[1],
+                 'own_s': round(value[2], 4), 'cumulative_s': round(value[3], 4)}
+                for key, value in top
+            ],
+        }
+        _update_summary(self.directory, entry)
+        return entry
+
+
+def _update_summary(directory: Path, entry: Dict):
+    summary_path = directory / SUMMARY_FILE
+    with _summary_lock:
+        try:
+            reruns: List[Dict] = json.loads(summary_path.read_text(encoding='utf-8'))['reruns']
+        except (FileNotFoundError, ValueError, KeyError):
+            reruns = []
+        reruns = (reruns + [entry])[-KEEP_RERUNS:]
+
+        summary = {'reruns': reruns, 'pages': _aggregate(reruns)}
+        # Write then rename so that a reader never sees a partial summary
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        os.replace(tmp_path, summary_path)
+
+        dumps = sorted(directory.glob('*.prof'), key=lambda path: path.stat().st_mtime)
+        for path in dumps[:-KEEP_RERUNS]:
+            path.unlink(missing_ok=True)
+
+
+def _aggregate(reruns: List[Dict]) -> Dict[str, Dict]:
+    """Mean wall time and section times per page over the kept reruns"""
+    pages: Dict[str, Dict] = {}
+    for entry in reruns:
+        page = pages.setdefault(entry['page'], {'reruns': 0, 'wall_s': 0.0, 'sections_s': {}})
+        page['reruns'] += 1
+        page['wall_s'] += entry['wall_s']
+        for name, seconds in entry['sections_s'].items():
+            page['sections_s'][name] = page['sections_s'].get(name, 0.0) + seconds
+
+    for page in pages.values():
+        count = page.pop('reruns')
+        page['mean_wall_s'] = round(page.pop('wall_s') / count, 4)
+        page['mean_sections_s'] = {name: round(total / count, 4)
+                                   for name, total in sorted(page.pop('sections_s').items())}
+        page['reruns'] = count
+    return pages
+
+
+def start_rerun_profile(page: str, directory: Path = PROFILE_DIR) -> Optional[RerunProfile]:
+    """
+    Call first thing in a page script. Profiles the rerun when profiling is requested,
+    and closes the profile of the previous rerun if it ended early (st.rerun, st.stop).
+    """
+    import streamlit as st
+
+    pending = st.session_state.pop(SESSION_KEY, None)
+    if pending is not None:
+        pending.finish(interrupted=True)
+    _thread_state.profile = None
+
+    if not profiling_requested():
+        return None
+
+    profile = RerunProfile(page, directory)
+    st.session_state[SESSION_KEY] = profile
+    _thread_state.profile = profile
+    return profile
+
+
+def finish_rerun_profile():
+    """Call last thing in a page script"""
+    import streamlit as st
+
+    profile = st.session_state.pop(SESSION_KEY, None)
+    _thread_state.profile = None
+    if profile is not None:
+        profile.finish()
+
+
+@contextmanager
+def profile_section(name: str):
+    """Add the wall time of the block to the current rerun profile, if any"""
+    profile = getattr(_thread_state, 'profile', None)
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_section(name, time.perf_counter() - start)
+
+
+def profiled(section: str) -> Callable:
+    """Decorator version of profile_section"""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = getattr(_thread_state, 'profile', None)
+            if profile is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.add_section(section, time.perf_counter() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,191 @@
+import copy
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from model.auditor import audit_schedules
+from model.schedule_grid import slot_columns
+from model.site_table import SiteTable
+from utils.create_calendar import visual_cell
+from utils.profiling import profiled
+from utils.tools import majo_name, slot_key, summary_from_counts
+
+MAJO_PATTERN = re.compile(r"^majo.*", re.IGNORECASE)
+
+
+def view_columns(df: pd.DataFrame) -> List[str]:
+    """Date then the slot columns of a schedule table"""
+    return ["Date"] + slot_columns(df.columns)
+
+
+def changed_rows(old: pd.DataFrame, new: pd.DataFrame) -> Optional[np.ndarray]:
+    """Positions of the rows whose Date or Affectation differ, None when rows or slots were added or removed"""
+    columns = view_columns(new)
+    if len(old) != len(new) or not old.index.equals(new.index) or view_columns(old) != columns:
+        return None
+    old_values = old[columns].to_numpy(dtype=object)
+    new_values = new[columns].to_numpy(dtype=object)
+    # Two empty cells (None or NaN) are equal
+    differs = (old_values != new_values) & ~(pd.isna(old_values) & pd.isna(new_values))
+    return np.flatnonzero(differs.any(axis=1))
+
+
+def _is_friday(value) -> bool:
+    """The Date of a row is a Friday: a date, a weekday name or a date string in a usual format"""
+    if isinstance(value, (datetime, pd.Timestamp)):
+        return value.weekday() == 4
+    text = str(value)
+    if 'vendredi' in text.lower() or 'friday' in text.lower():
+        return True
+    if not text.split():
+        return False
+    for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y']:
+        try:
+            return datetime.strptime(text.split()[0], fmt).weekday() == 4
+        except ValueError:
+            continue
+    return False
+
+
+def _simplified(value):
+    """Site name of the simplified views: every Majorelle site is 'Majo'"""
+    return MAJO_PATTERN.sub("Majo", value) if isinstance(value, str) else value
+
+
+class ScheduleViews:
+    """
+    Views derived from the edited schedule: constraint violations, site summaries, Friday
+    counts of the Majorelle sites and visual calendar months. Each row keeps its share of
+    them, so after a cell edit update() only re-validates the changed rows, patches the
+    counters and rebuilds the months they belong to. Adding or removing rows, or another
+    site config, recomputes everything.
+    """
+
+    def __init__(self, df: pd.DataFrame, sites_config: Dict):
+        self._set_sites(sites_config)
+        self._rebuild(df)
+
+    def _set_sites(self, sites_config: Dict):
+        self.sites_config = copy.deepcopy(sites_config)
+        self.sites = SiteTable(sites_config)
+        self.majorelle_names = sorted(cfg['name'] for key, cfg in sites_config.items()
+                                      if key.startswith('majorelle_'))
+
+    @profiled('views')
+    def update(self, df: pd.DataFrame, sites_config: Dict) -> np.ndarray:
+        """Bring the views up to date with df, returns the positions of the rows re-derived"""
+        if sites_config != self.sites_config:
+            self._set_sites(sites_config)
+            return self._rebuild(df)
+        changed = changed_rows(self.df, df)
+        # A new schedule (generated, or rows added or removed) is cheaper to derive again
+        if changed is None or 2 * len(changed) > len(df):
+            return self._rebuild(df)
+        if len(changed):
+            self._patch(df, changed)
+        return changed
+
+    def _rebuild(self, df: pd.DataFrame) -> np.ndarray:
+        self.df = df.copy()
+        self.columns = view_columns(df)
+        self.counts = Counter()
+        self.friday_counts = Counter()
+        self.cells: List[Optional[Tuple]] = []
+        self.rows_friday: List[List[str]] = []
+        for row in range(len(df)):
+            self._derive_row(row)
+        self.violations = audit_schedules(self.df, self.sites)
+        self.months: Dict[Tuple, Set[int]] = {}
+        for row, cell in enumerate(self.cells):
+            if cell is not None:
+                self.months.setdefault(cell[0], set()).add(row)
+        self.calendars = {simplified: {month: self._month(month, simplified) for month in self.months}
+                          for simplified in (False, True)}
+        return np.arange(len(df), dtype=np.int64)
+
+    def _row_values(self, row: int):
+        return self.df.iloc[row][self.columns].tolist()
+
+    def _derive_row(self, row: int):
+        """Add the share of a row of self.df to the counters, at its position in the row lists"""
+        day, *day_sites = self._row_values(row)
+        self.counts.update(slot_key(site) for site in day_sites)
+        friday = []
+        if _is_friday(day):
+            text = ' '.join(str(value) for value in (day, *day_sites))
+            friday = [name for name in self.majorelle_names if name in text]
+            self.friday_counts.update(friday)
+        cell = visual_cell(day, *day_sites)
+        if row < len(self.cells):
+            self.cells[row] = cell
+            self.rows_friday[row] = friday
+        else:
+            self.cells.append(cell)
+            self.rows_friday.append(friday)
+
+    def _patch(self, df: pd.DataFrame, changed: np.ndarray):
+        dirty = set()
+        for row in changed:
+            _, *day_sites = self._row_values(row)
+            self.counts.subtract(slot_key(site) for site in day_sites)
+            self.friday_counts.subtract(self.rows_friday[row])
+            if self.cells[row] is not None:
+                dirty.add(self.cells[row][0])
+                self.months[self.cells[row][0]].discard(row)
+
+        self.df = df.copy()
+        for row in changed:
+            self._derive_row(row)
+            if self.cells[row] is not None:
+                dirty.add(self.cells[row][0])
+                self.months.setdefault(self.cells[row][0], set()).add(row)
+        self.counts = +self.counts
+        self.friday_counts = +self.friday_counts
+
+        for month in dirty:
+            for simplified in (False, True):
+                if self.months.get(month):
+                    self.calendars[simplified][month] = self._month(month, simplified)
+                else:
+                    self.calendars[simplified].pop(month, None)
+        self.months = {month: rows for month, rows in self.months.items() if rows}
+
+        # Only the changed rows are validated, their row numbers mapped back to df
+        kept = self.violations[~self.violations['row'].isin(changed)]
+        found = audit_schedules(self.df.iloc[changed], self.sites)
+        if not found.empty:
+            found['row'] = changed[found['row'].to_numpy()]
+            kept = pd.concat([kept, found], ignore_index=True)
+        self.violations = kept.sort_values(['row', 'slot'], kind='stable').reset_index(drop=True)
+
+    def _month(self, month: Tuple, simplified: bool) -> Dict[int, Dict[str, Dict]]:
+        """Weeks of a month of the visual calendar: {week: {day name: display}}, later rows winning"""
+        weeks: Dict[int, Dict[str, Dict]] = {}
+        for row in sorted(self.months[month]):
+            _, week_num, day_fr, display = self.cells[row]
+            if simplified:
+                display = dict(display, sites=[_simplified(site) for site in display['sites']])
+            weeks.setdefault(week_num, {})[day_fr] = display
+        return weeks
+
+    def calendar(self, simplified: bool = False) -> Dict[Tuple, Dict[int, Dict[str, Dict]]]:
+        """Months of the visual calendar, for render_visual_calendar"""
+        return self.calendars[simplified]
+
+    @profiled('statistics')
+    def summary(self, is_detailed: bool) -> pd.DataFrame:
+        """Slots per site (Lieu, Nombre vacations), the Majorelle sites grouped as 'Majo' when is_detailed"""
+        if not is_detailed:
+            return summary_from_counts(self.counts)
+        grouped = Counter()
+        for name, count in self.counts.items():
+            grouped[majo_name(name)] += count
+        return summary_from_counts(grouped)
+
+    def fridays(self) -> Dict[str, int]:
+        """Friday rows of each Majorelle site name, by name"""
+        return {name: self.friday_counts.get(name, 0) for name in self.majorelle_names}
@@ -1,16 +1,15 @@
 """
-Synchronizing the CSV file with GitHub
+Synchronizing the planning history with GitHub
 """
 
 import streamlit as st
-from github import Github, GithubException
 from pathlib import Path
 import time
 
 
 class GitHubSync:
 
-    """Automatic synchronization of the CSV schedules with GitHub"""
+    """Automatic synchronization of the saved schedules with GitHub"""
 
     def __init__(self):
         self.enabled = False
@@ -18,6 +17,8 @@ class GitHubSync:
             self.github_token = st.secrets["github"]["token"]
             self.repo_name = st.secrets["github"]["repo"]
 
+            # PyGithub is slow to import: only load it once the secrets are there
+            from github import Github
             self.g = Github(self.github_token)
             self.repo = self.g.get_repo(self.repo_name)
             self.enabled = True
@@ -26,11 +27,11 @@ class GitHubSync:
 
     def push_file(
         self,
-        file_path: str = "output/planning_all.csv",
+        file_path: str = "output/planning_all.parquet",
         commit_message: str = None
     ) -> bool:
         """
-        Push any file to GitHub (CSV, YAML, etc.)
+        Push any file to GitHub (Parquet, CSV, YAML, etc.)
 
         Args:
             file_path: Path to the file to push
@@ -44,9 +45,11 @@ class GitHubSync:
             st.error(f"❌ File not found: {file_path}")
             return False
 
+        from github import GithubException
+
         try:
-            with open(path_obj, 'r', encoding='utf-8') as f:
-                content = f.read()
+            # Bytes: the Parquet history is binary
+            content = path_obj.read_bytes()
 
             if commit_message is None:
                 commit_message = f"Update file - {time.strftime('%Y-%m-%d %H:%M:%S')}"
@@ -80,7 +83,7 @@ class GitHubSync:
             st.error(f"Error during the Github push: {e}")
             return False
 
-    def get_last_commit_info(self, file_path: str = "output/planning_all.csv") -> dict:
+    def get_last_commit_info(self, file_path: str = "output/planning_all.parquet") -> dict:
         """
         Retrieve the latest commit information for the specified file
         """
@@ -0,0 +1,161 @@
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+# History rows have one affectation_<n> column per daily slot
+SLOT_FIELD_PATTERN = re.compile(r"^affectation_(\d+)$")
+
+
+def slot_field(slot: int) -> str:
+    """History column of a slot (0-based)"""
+    return f"affectation_{slot + 1}"
+
+
+def slot_fields(columns: Iterable[str]) -> List[str]:
+    """The slot columns among the history columns, in slot order"""
+    numbered = [(int(match.group(1)), column) for column in columns
+                if (match := SLOT_FIELD_PATTERN.match(str(column)))]
+    return [column for _, column in sorted(numbered)]
+
+
+def majo_group(site_name: str) -> str:
+    """All the Majorelle sites ('Majo - xxx') count as 'Majo' in the grouped statistics"""
+    return 'Majo' if site_name.startswith('Majo') else site_name
+
+
+class FairnessLedger:
+    """
+    Slot and Friday counts per quarter and site of the saved schedules, in a JSON file
+    next to the planning history. ScheduleStorage updates the quarter it saves or deletes,
+    so the statistics and the cumulative deviation read O(quarters x sites) counts instead
+    of the whole history. The ledger records the size and mtime of the history file it
+    matches: when the file changed behind its back (GitHub restore, manual edit), it is
+    rebuilt once from read_history().
+    """
+
+    def __init__(self, path: Path, history_path: Path, read_history: Callable[[], pd.DataFrame]):
+        self.path = Path(path)
+        self.history_path = Path(history_path)
+        # Every row of the history: schedule_id, date, affectation_1..n, saved_at
+        self.read_history = read_history
+        self._data: Optional[Dict] = None
+
+    def _signature(self) -> List[int]:
+        stat = self.history_path.stat()
+        return [stat.st_size, stat.st_mtime_ns]
+
+    @staticmethod
+    def quarter_entry(rows: pd.DataFrame) -> Dict:
+        """Counts of one schedule, from its rows (date, affectation_1..n, saved_at)"""
+        dates = pd.to_datetime(rows["date"])
+        fridays = (dates.dt.weekday == 4).to_numpy()
+        slots: Dict[str, int] = {}
+        friday_slots: Dict[str, int] = {}
+        for column in slot_fields(rows.columns):
+            for site_name, is_friday in zip(rows[column].tolist(), fridays):
+                if pd.isna(site_name) or site_name == "":
+                    continue
+                site_name = str(site_name)
+                slots[site_name] = slots.get(site_name, 0) + 1
+                if is_friday:
+                    friday_slots[site_name] = friday_slots.get(site_name, 0) + 1
+        return {
+            "start_date": dates.min().strftime("%Y-%m-%d"),
+            "saved_at": str(rows["saved_at"].max()),
+            "slots": slots,
+            "fridays": friday_slots,
+        }
+
+    def _read(self) -> Dict:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def load(self) -> Dict[str, Dict]:
+        """Entries by schedule id, rebuilt from the history when missing or out of date"""
+        signature = self._signature()
+        if self._data is None or self._data.get("history") != signature:
+            # Another process may have saved: its ledger file is then up to date
+            self._data = self._read()
+        if self._data.get("history") != signature:
+            self.rebuild(signature)
+        return self._data["schedules"]
+
+    def rebuild(self, signature: List[int]):
+        """
+        Recount every schedule of the history. signature is taken before reading it: if the
+        file is replaced meanwhile, the ledger does not match the new one and is rebuilt again.
+        """
+        history = self.read_history()
+        schedules = {
+            schedule_id: self.quarter_entry(rows)
+            for schedule_id, rows in history.groupby("schedule_id")
+        }
+        self._write(schedules, signature)
+
+    def set_quarter(self, schedule_id: str, rows: pd.DataFrame):
+        """Record the counts of a schedule just written: call load() under the lock, before writing"""
+        schedules = dict(self._data["schedules"])
+        schedules[schedule_id] = self.quarter_entry(rows)
+        self._write(schedules, self._signature())
+
+    def remove_quarter(self, schedule_id: str):
+        """Drop a schedule just deleted: call load() under the lock, before writing"""
+        schedules = dict(self._data["schedules"])
+        schedules.pop(schedule_id, None)
+        self._write(schedules, self._signature())
+
+    def _write(self, schedules: Dict[str, Dict], signature: List[int]):
+        self._data = {"history": signature, "schedules": dict(sorted(schedules.items()))}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so that a reader never sees a partial ledger
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self._data))
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def statistics(schedules: Dict[str, Dict], schedule_ids: Optional[Iterable[str]] = None,
+                   grouped_majo: bool = False, counts: str = "slots") -> pd.DataFrame:
+        """
+        site_name x schedule_id table of the counts ('slots' or 'fridays') with a Total
+        column, sorted by Total: the layout of ScheduleStorage.get_statistics.
+        """
+        selected = set(schedule_ids) if schedule_ids else None
+        records = []
+        for schedule_id, entry in schedules.items():
+            if selected is not None and schedule_id not in selected:
+                continue
+            for site_name, count in entry[counts].items():
+                records.append((majo_group(site_name) if grouped_majo else site_name, schedule_id, count))
+
+        table = pd.DataFrame(records, columns=["site_name", "schedule_id", "count"])
+        pivot = table.groupby(["site_name", "schedule_id"])["count"].sum().unstack(fill_value=0).astype(int)
+        pivot["Total"] = pivot.sum(axis=1)
+        return pivot.sort_values("Total", ascending=False)
+
+    @staticmethod
+    def deviation(schedules: Dict[str, Dict], weights: Dict[str, float],
+                  schedule_ids: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """
+        Slots each weighted site got above (+) or below (-) its share over the schedules.
+        In each schedule the share is taken among the weighted sites it has slots for, so
+        a site is only compared over the quarters it appears in, and left out without any.
+        """
+        selected = set(schedule_ids) if schedule_ids is not None else None
+        deviation: Dict[str, float] = {}
+        for schedule_id, entry in schedules.items():
+            if selected is not None and schedule_id not in selected:
+                continue
+            present = {name: count for name, count in entry["slots"].items() if weights.get(name, 0) > 0}
+            total_weight = sum(weights[name] for name in present)
+            given = sum(present.values())
+            for name, count in present.items():
+                deviation[name] = deviation.get(name, 0.0) + count - weights[name] / total_weight * given
+        return deviation
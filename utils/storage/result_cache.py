@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from model.leave import LeaveCalendar
+
+
+def _normalize(value: Any) -> Any:
+    """Canonical form of a config: dates as ISO strings, holidays as merged intervals"""
+    if isinstance(value, dict):
+        normalized = {str(k): _normalize(v) for k, v in value.items()}
+        # The same leave can be written as days or as intervals, in any order
+        if isinstance(value.get('holidays'), list):
+            normalized['holidays'] = LeaveCalendar.from_config(value['holidays']).to_config()
+        return normalized
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class ResultCache:
+    """
+    Content-addressed disk cache of allocation results.
+
+    Entries are pickles named by the hash of the normalized inputs and the algorithm
+    version, so any change of config, holidays, days or allocator invalidates them.
+    The least recently used entries (by file mtime) are evicted above max_entries.
+    """
+
+    def __init__(self, cache_dir: str = "output/cache", max_entries: int = 64):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+
+    @staticmethod
+    def make_key(config: Dict, working_days: List[date], algorithm_version: str,
+                 options: Optional[Dict] = None) -> str:
+        payload = {
+            'config': _normalize(config),
+            'working_days': [day.isoformat() for day in working_days],
+            'algorithm_version': algorithm_version,
+            'options': _normalize(options or {}),
+        }
+        encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pkl"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached result for key, None on a miss or an unreadable entry"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Entry written by an incompatible version or truncated: drop it
+            path.unlink(missing_ok=True)
+            return None
+
+        # Mark as recently used for the eviction, unless a concurrent put or eviction removed it
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return result
+
+    def put(self, key: str, result: Any):
+        # Write then rename so that a concurrent reader never sees a partial pickle
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self.cache_dir.glob('*.pkl'):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries:]:
+            path.unlink(missing_ok=True)
+
+    def clear(self):
+        for path in self.cache_dir.glob('*.pkl'):
+            path.unlink(missing_ok=True)
@@ -1,11 +1,42 @@
 import calendar
+import json
+import os
+import tempfile
+from contextlib import contextmanager
 from io import BytesIO
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import yaml
 from pathlib import Path
 from datetime import datetime, date
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no inter-process lock, the writes stay atomic
+    fcntl = None
+
+from model.schedule_grid import slot_column, slot_columns
+from utils.profiling import profiled
+from utils.storage.ledger import FairnessLedger, slot_field, slot_fields
+
+# Daily slots of the schedules written before nb_vacations could change
+DEFAULT_SLOTS = 2
+
+
+def history_schema(nb_slots: int = DEFAULT_SLOTS) -> pa.Schema:
+    """
+    One row per day, one int16 column per daily slot. Sites are codes in the 'sites' list of
+    the file metadata (null for an empty slot), and the save time of each schedule is in its
+    'saved_at' mapping. A schedule with fewer slots than the widest one has nulls in the others.
+    """
+    return pa.schema([('schedule_id', pa.string()), ('date', pa.date32())]
+                     + [(slot_field(slot), pa.int16()) for slot in range(nb_slots)])
 
 FRENCH_MONTHS = {
     1: 'Janvier', 2: 'Février', 3: 'Mars', 4: 'Avril',
@@ -36,14 +67,122 @@ def _load_display_name_map(config_path: str = None) -> Dict[str, str]:
 
 
 class ScheduleStorage:
+    """
+    Planning history in a Parquet file, sorted by schedule and date. The CSV written by
+    the previous versions (same name, .csv) is imported the first time the Parquet file
+    is missing, and left untouched: the tracked output/planning_all.csv is only kept as
+    that migration input, until the Parquet history has been pushed by GitHubSync.
+    """
+
+    def __init__(self, path: str = "output/planning_all.parquet", ledger_path: Optional[str] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Held by save() and delete() across their read-modify-write of the history
+        self.lock_path = self.path.with_name(f"{self.path.name}.lock")
+        if not self.path.exists():
+            with self._locked():
+                if not self.path.exists():
+                    self._import_csv(self.path.with_suffix('.csv'))
+        # Per quarter counts kept in step with the history by save() and delete()
+        self.ledger = FairnessLedger(ledger_path or self.path.with_name(f"{self.path.stem}_ledger.json"),
+                                     self.path, self._read_rows)
+
+    @contextmanager
+    def _locked(self):
+        """
+        Exclusive lock of the history, between processes and between the sessions of one
+        server. Readers do not take it: the file is replaced in one rename, never rewritten in place.
+        """
+        with open(self.lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Closing the file releases the lock
+            yield
+
+    def _import_csv(self, csv_path: Path):
+        """Write the history file from a CSV of the previous versions, or an empty one"""
+        sites: List[str] = []
+        saved_at: Dict[str, str] = {}
+        tables = [history_schema().empty_table()]
+        if csv_path.exists():
+            for schedule_id, rows in pd.read_csv(csv_path).groupby("schedule_id"):
+                tables.append(self._encode(schedule_id, rows, sites))
+                saved_at[schedule_id] = str(rows["saved_at"].max())
+        self._write(pa.concat_tables(tables, promote_options='default'), sites, saved_at)
 
-    def __init__(self, csv_path: str = "output/planning_all.csv"):
-        self.csv_path = Path(csv_path)
-        self.csv_path.parent.mkdir(parents=True, exist_ok=True)
-        if not self.csv_path.exists():
-            pd.DataFrame(columns=["schedule_id", "date", "affectation_1", "affectation_2", "saved_at"]).to_csv(
-                self.csv_path, index=False
-            )
+    @staticmethod
+    def _encode(schedule_id: str, rows: pd.DataFrame, sites: List[str]) -> pa.Table:
+        """Rows (date, affectation_1..n) as a table of history_schema(n); new site names are appended to sites"""
+        codes = {name: code for code, name in enumerate(sites)}
+        fields = slot_fields(rows.columns)
+        columns = {
+            'schedule_id': pa.array([schedule_id] * len(rows), type=pa.string()),
+            'date': pa.array(pd.to_datetime(rows["date"]).dt.date, type=pa.date32()),
+        }
+        for column in fields:
+            values = []
+            for site_name in rows[column].tolist():
+                if pd.isna(site_name) or site_name == "":
+                    values.append(None)
+                    continue
+                site_name = str(site_name)
+                if site_name not in codes:
+                    codes[site_name] = len(sites)
+                    sites.append(site_name)
+                values.append(codes[site_name])
+            columns[column] = pa.array(values, type=pa.int16())
+        return pa.table(columns, schema=history_schema(len(fields)))
+
+    def _read_table(self, schedule_ids: Optional[List[str]] = None) -> Tuple[pa.Table, List[str], Dict[str, str]]:
+        """Rows of the history, or of some schedules (row groups without them are skipped), with the site list and save times"""
+        filters = [('schedule_id', 'in', schedule_ids)] if schedule_ids is not None else None
+        table = pq.read_table(self.path, filters=filters)
+        metadata = table.schema.metadata or {}
+        return (table, json.loads(metadata.get(b'sites', b'[]')),
+                json.loads(metadata.get(b'saved_at', b'{}')))
+
+    @staticmethod
+    def _decode(table: pa.Table, sites: List[str], saved_at: Dict[str, str]) -> pd.DataFrame:
+        """Rows as site names and ISO dates: schedule_id, date, affectation_1..n, saved_at"""
+        # Code -1 (null) picks the trailing None
+        names = np.array(sites + [None], dtype=object)
+        schedule_ids = table.column('schedule_id').to_numpy(zero_copy_only=False)
+        df = pd.DataFrame({
+            'schedule_id': schedule_ids,
+            'date': np.datetime_as_string(table.column('date').to_numpy(zero_copy_only=False), unit='D'),
+        })
+        fields = slot_fields(table.column_names)
+        # Schedules read without the wider ones of the history keep their own number of slots
+        while len(fields) > DEFAULT_SLOTS and table.column(fields[-1]).null_count == table.num_rows:
+            fields.pop()
+        for column in fields:
+            df[column] = names[table.column(column).fill_null(-1).to_numpy(zero_copy_only=False)]
+        df['saved_at'] = [saved_at.get(schedule_id) for schedule_id in schedule_ids]
+        return df
+
+    def _read_rows(self) -> pd.DataFrame:
+        return self._decode(*self._read_table())
+
+    def _write(self, table: pa.Table, sites: List[str], saved_at: Dict[str, str]):
+        """
+        Write the rows, sorted by schedule and date, to a temporary file then rename it over
+        the history, so that a crash or a reader never sees half a file
+        """
+        schedule_ids = set(table.column('schedule_id').to_pylist())
+        table = table.sort_by([('schedule_id', 'ascending'), ('date', 'ascending')]).replace_schema_metadata({
+            'sites': json.dumps(sites, ensure_ascii=False),
+            'saved_at': json.dumps({sid: saved_at[sid] for sid in sorted(schedule_ids)}),
+        })
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix='.tmp')
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp_path, compression='zstd')
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
 
     @staticmethod
     def _generate_id(date: datetime) -> str:
@@ -52,111 +191,96 @@ class ScheduleStorage:
         quarter = (date.month - 1) // 3 + 1
         return f"T{quarter}_{year}"
 
+    @profiled('storage')
     def save(self, df: pd.DataFrame, quarter_date: datetime) -> str:
-        """Save schedule to the global CSV"""
+        """Save schedule to the history"""
         schedule_id = self._generate_id(quarter_date)
-        all_data = pd.read_csv(self.csv_path)
 
-        # If the semester already exists, we delete it
-        all_data = all_data[all_data["schedule_id"] != schedule_id]
+        columns = slot_columns(df.columns)
+        new_data = df[["Date"] + columns].copy()
+        new_data.columns = ["date"] + [slot_field(slot) for slot in range(len(columns))]
+        saved_now = datetime.now().isoformat()
+        new_data["saved_at"] = saved_now
 
-        new_data = df[["Date", "Affectation 1", "Affectation 2"]].copy()
-        new_data.columns = ["date", "affectation_1", "affectation_2"]
-        new_data["schedule_id"] = schedule_id
-        new_data["saved_at"] = datetime.now().isoformat()
+        # Another session may save another quarter meanwhile: read the history under the lock
+        with self._locked():
+            self.ledger.load()
+            table, sites, saved_at = self._read_table()
 
-        updated = pd.concat([all_data, new_data], ignore_index=True)
-        updated.to_csv(self.csv_path, index=False)
+            # If the quarter already exists, it is replaced
+            kept = table.filter(pc.not_equal(table.column('schedule_id'), schedule_id))
+            new_rows = self._encode(schedule_id, new_data, sites)
+            saved_at[schedule_id] = saved_now
+
+            # A schedule with more slots widens the history, the others get null slots
+            self._write(pa.concat_tables([kept.replace_schema_metadata(), new_rows], promote_options='default'),
+                        sites, saved_at)
+            self.ledger.set_quarter(schedule_id, new_data)
 
         return schedule_id
 
+    @profiled('storage')
+    def load_many(self, schedule_ids: Optional[List[str]] = None) -> pd.DataFrame:
+        """Rows of these schedules (all of them when None), in one read, with the columns of load()"""
+        rows = self._decode(*self._read_table(schedule_ids))
+        columns = {"date": "Date"}
+        columns.update({field: slot_column(slot) for slot, field in enumerate(slot_fields(rows.columns))})
+        return rows.rename(columns=columns)
+
+    @profiled('storage')
     def load(self, schedule_id: str) -> Optional[pd.DataFrame]:
         """Load a specific schedule"""
-        df = pd.read_csv(self.csv_path)
-        result = df[df["schedule_id"] == schedule_id].copy()
+        result = self.load_many([schedule_id])
         if result.empty:
             return None
-        result = result.rename(columns={
-            "date": "Date",
-            "affectation_1": "Affectation 1",
-            "affectation_2": "Affectation 2"
-        })
         return result
 
+    @profiled('storage')
     def delete(self, schedule_id: str):
         """Delete one schedule"""
-        df = pd.read_csv(self.csv_path)
-        df = df[df["schedule_id"] != schedule_id]
-        df.to_csv(self.csv_path, index=False)
-
+        with self._locked():
+            self.ledger.load()
+            table, sites, saved_at = self._read_table()
+            kept = table.filter(pc.not_equal(table.column('schedule_id'), schedule_id))
+            self._write(kept, sites, saved_at)
+            self.ledger.remove_quarter(schedule_id)
+
+    @profiled('storage')
     def get_all(self) -> Dict:
         """Return all schedule metadata"""
-        df = pd.read_csv(self.csv_path)
-        if df.empty:
-            return {}
-        meta = (
-            df.groupby("schedule_id")
-            .agg(start_date=("date", "min"), saved_at=("saved_at", "max"))
-            .reset_index()
-        )
-
         schedules = {}
-        for _, row in meta.iterrows():
-            parts = row["schedule_id"].split("_")
-            quarter = int(parts[0][1:])
-            year = int(parts[1])
-            schedules[row["schedule_id"]] = {
-                "quarter": quarter,
-                "year": year,
-                "start_date": row["start_date"],
-                "saved_at": row["saved_at"],
+        for schedule_id, entry in self.ledger.load().items():
+            parts = schedule_id.split("_")
+            schedules[schedule_id] = {
+                "quarter": int(parts[0][1:]),
+                "year": int(parts[1]),
+                "start_date": entry["start_date"],
+                "saved_at": entry["saved_at"],
             }
-
         return schedules
 
+    @profiled('storage')
     def get_statistics(self, schedule_ids: Optional[List[str]] = None) -> pd.DataFrame:
         """Compute affectation stats"""
-        df = pd.read_csv(self.csv_path)
-        if schedule_ids:
-            df = df[df["schedule_id"].isin(schedule_ids)]
-
-        affectations = pd.concat([
-            df[["schedule_id", "affectation_1"]].rename(columns={"affectation_1": "site_name"}),
-            df[["schedule_id", "affectation_2"]].rename(columns={"affectation_2": "site_name"})
-        ])
-        affectations = affectations.dropna()
-
-        stats = affectations.value_counts().reset_index(name="count")
-        pivot = stats.pivot(index="site_name", columns="schedule_id", values="count").fillna(0).astype(int)
-        pivot["Total"] = pivot.sum(axis=1)
-        pivot = pivot.sort_values("Total", ascending=False)
-        return pivot
+        return FairnessLedger.statistics(self.ledger.load(), schedule_ids)
 
     def _get_statistics_grouped_majo(self, schedule_ids: Optional[List[str]] = None) -> pd.DataFrame:
         """Compute affectation stats with all Majo-xxx sites grouped as 'Majo'"""
-        df = pd.read_csv(self.csv_path)
-        if schedule_ids:
-            df = df[df["schedule_id"].isin(schedule_ids)]
-
-        for col in ['affectation_1', 'affectation_2']:
-            df[col] = df[col].apply(
-                lambda x: 'Majo' if pd.notna(x) and str(x).startswith('Majo') else x
-            )
-
-        affectations = pd.concat([
-            df[["schedule_id", "affectation_1"]].rename(columns={"affectation_1": "site_name"}),
-            df[["schedule_id", "affectation_2"]].rename(columns={"affectation_2": "site_name"})
-        ])
-        affectations = affectations.dropna()
-
-        stats = affectations.value_counts().reset_index(name="count")
-        pivot = stats.pivot(index="site_name", columns="schedule_id", values="count").fillna(0).astype(int)
-        pivot["Total"] = pivot.sum(axis=1)
-        pivot = pivot.sort_values("Total", ascending=False)
-        return pivot
+        return FairnessLedger.statistics(self.ledger.load(), schedule_ids, grouped_majo=True)
+
+    @profiled('storage')
+    def get_friday_statistics(self, schedule_ids: Optional[List[str]] = None) -> pd.DataFrame:
+        """Friday slots per site, same layout as get_statistics"""
+        return FairnessLedger.statistics(self.ledger.load(), schedule_ids, counts="fridays")
+
+    def get_history_deviation(self, weights: Dict[str, float],
+                              schedule_ids: Optional[List[str]] = None) -> Dict[str, float]:
+        """Slots above (+) or below (-) the weighted share of each site over these schedules"""
+        return FairnessLedger.deviation(self.ledger.load(), weights, schedule_ids)
 
     #create_excel_export
 
+    @profiled('export')
     def export_to_excel(self, year: int, grouped_majo: bool = False, schedule_ids: Optional[List[str]] = None) -> BytesIO:
         """
         Create an Excel file with one tab per month and one total statistics tab.
@@ -233,35 +357,28 @@ class ScheduleStorage:
                 buffer.seek(0)
                 return buffer
 
-            # Load all planning data for the year
-            all_planning = []
-            for schedule_id in year_schedules:
-                df_planning = self.load(schedule_id)
-                if df_planning is not None:
-                    all_planning.append(df_planning)
+            # Load all planning data for the year, in one read of the history
+            df_all = self.load_many(list(year_schedules))
 
-            if not all_planning:
+            if df_all.empty:
                 df_empty = pd.DataFrame({'Message': ['Aucune donnée de planning']})
                 df_empty.to_excel(writer, sheet_name='Aucune donnée', index=False)
                 buffer.seek(0)
                 return buffer
 
-            df_all = pd.concat(all_planning, ignore_index=True)
             df_all['Date'] = pd.to_datetime(df_all['Date'])
 
+            columns = slot_columns(df_all.columns)
             if grouped_majo:
-                for col in ['Affectation 1', 'Affectation 2']:
+                for col in columns:
                     df_all[col] = df_all[col].apply(
                         lambda x: 'Majo' if pd.notna(x) and str(x).startswith('Majo') else x
                     )
 
-            # Build a lookup: date -> (aff1, aff2)
+            # Build a lookup: date -> (aff1, ..., affn)
             planning_lookup = {}
             for _, row in df_all.iterrows():
-                planning_lookup[row['Date'].date()] = (
-                    row.get('Affectation 1', ''),
-                    row.get('Affectation 2', '')
-                )
+                planning_lookup[row['Date'].date()] = tuple(row[col] for col in columns)
 
             # Get all months present in the data
             months_in_data = sorted(df_all['Date'].dt.to_period('M').unique())
@@ -279,11 +396,12 @@ class ScheduleStorage:
                 # Row 0: headers
                 worksheet.write(0, 0, f"{month_name} {year_val}", month_title_format)
                 worksheet.write(0, 1, '', header_format)
-                worksheet.write(0, 2, 'Poste 1', header_format)
-                worksheet.write(0, 3, 'Médecin 1', header_format)
-                worksheet.write(0, 4, 'Poste 2', header_format)
-                worksheet.write(0, 5, 'Médecin 2', header_format)
-                worksheet.write(0, 6, 'POSE PRIORITAIRE', red_header_format)
+                # Two columns per slot: Poste n, Médecin n
+                for slot in range(len(columns)):
+                    worksheet.write(0, 2 + 2 * slot, f'Poste {slot + 1}', header_format)
+                    worksheet.write(0, 3 + 2 * slot, f'Médecin {slot + 1}', header_format)
+                priority_col = 2 + 2 * len(columns)
+                worksheet.write(0, priority_col, 'POSE PRIORITAIRE', red_header_format)
 
                 # Rows 1..N: every day of the month
                 num_days = calendar.monthrange(year_val, month_num)[1]
@@ -301,8 +419,8 @@ class ScheduleStorage:
                     worksheet.write(row_idx, 1, day, fmt)
 
                     if date_obj in planning_lookup and not is_weekend:
-                        aff1, aff2 = planning_lookup[date_obj]
-                        for aff, col_place, col_detail in [(aff1, 2, 3), (aff2, 4, 5)]:
+                        for slot, aff in enumerate(planning_lookup[date_obj]):
+                            col_place, col_detail = 2 + 2 * slot, 3 + 2 * slot
                             val = str(aff).strip() if pd.notna(aff) else ''
                             display = display_name_map.get(val, '')
                             if display:
@@ -315,16 +433,16 @@ class ScheduleStorage:
                                 worksheet.write(row_idx, col_place, val, fmt)
                                 worksheet.write(row_idx, col_detail, '', fmt)
                     else:
-                        for c in range(2, 6):
+                        for c in range(2, priority_col):
                             worksheet.write(row_idx, c, '', fmt)
 
-                    worksheet.write(row_idx, 6, '', fmt)
+                    worksheet.write(row_idx, priority_col, '', fmt)
 
                 # Column widths
                 worksheet.set_column(0, 0, 14)
                 worksheet.set_column(1, 1, 6)
-                worksheet.set_column(2, 5, 18)
-                worksheet.set_column(6, 6, 22)
+                worksheet.set_column(2, priority_col - 1, 18)
+                worksheet.set_column(priority_col, priority_col, 22)
 
             # ===== Total statistics tab =====
             sorted_schedules = sorted(year_schedules.items(), key=lambda x: x[1]['quarter'])
@@ -1,11 +1,13 @@
 import yaml
 import datetime
 import pandas as pd
-import holidays
 from collections import Counter
-from typing import Optional
 
+from model.schedule_grid import slot_column
+from utils.profiling import profiled
 
+
+@profiled('config')
 def load_config(yaml_path):
     with open(yaml_path, 'r', encoding='utf-8') as file:
         return yaml.safe_load(file)
@@ -16,14 +18,10 @@ def daterange(start_date, end_date):
         yield start_date + datetime.timedelta(n)
 
 
-def get_site_key_from_name(config: dict, site_name: str) -> Optional[str]:
-    for key, cfg in config.items():
-        if cfg['name'] == site_name:
-            return key
-    return None
-
-
 def get_working_days(start_date, end_date, country='FR'):
+    # Imported here: the pages that never compute working days skip its load time
+    import holidays
+
     fr_holidays = holidays.country_holidays(country)
     working_days, holiday_days = [], []
     for day in daterange(start_date, end_date):
@@ -36,20 +34,29 @@ def get_working_days(start_date, end_date, country='FR'):
 
 
 def schedule_to_dataframe(schedule):
+    """Date then one Affectation column per daily slot, as many as the schedule has"""
+    schedule = sorted(schedule.items())
+    nb_slots = max([1] + [len(assignments) for _, assignments in schedule])
     rows = []
-    for date, assignments in sorted(schedule.items()):
-        rows.append({
-            "Date": date.strftime("%Y-%m-%d"),
-            "Affectation 1": assignments[0] if len(assignments) > 0 else "",
-            "Affectation 2": assignments[1] if len(assignments) > 1 else ""
-        })
-    return pd.DataFrame(rows)
-
-
-def schedule_summary(schedule, is_detailed):
-    affectations = list(schedule["Affectation 1"]) + list(schedule["Affectation 2"])
-    if is_detailed:
-        affectations = ['Majo' if isinstance(aff, str) and aff.lower().startswith('majo') else aff for aff in affectations]
-    count = Counter(affectations)
-    summary = pd.DataFrame(list(count.items()), columns=['Lieu', 'Nombre vacations'])
-    return summary.sort_values(by='Nombre vacations', ascending=False)
+    for date, assignments in schedule:
+        row = {"Date": date.strftime("%Y-%m-%d")}
+        for slot in range(nb_slots):
+            row[slot_column(slot)] = assignments[slot] if len(assignments) > slot else ""
+        rows.append(row)
+    return pd.DataFrame(rows, columns=["Date"] + [slot_column(slot) for slot in range(nb_slots)])
+
+
+def majo_name(site_name):
+    """Every Majorelle site counts as 'Majo' in the grouped summaries"""
+    return 'Majo' if isinstance(site_name, str) and site_name.lower().startswith('majo') else site_name
+
+
+def slot_key(value):
+    """Counter key of a slot: NaN is not equal to itself, so an empty cell (NaN or None) counts as None"""
+    return None if not isinstance(value, str) and pd.isna(value) else value
+
+
+def summary_from_counts(count: Counter) -> pd.DataFrame:
+    """Lieu / Nombre vacations table of slot counts, the most used first (ties by name)"""
+    items = sorted(count.items(), key=lambda item: (-item[1], str(item[0])))
+    return pd.DataFrame(items, columns=['Lieu', 'Nombre vacations'])